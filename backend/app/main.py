@@ -3,14 +3,38 @@ import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import scraper
+from app.routers import scraper, batch
+from app.services.scraper import close_shared_clients
+from app.services import asset_store
+from app.services.images import shutdown_pool as shutdown_image_pool
+from app.services.ai_cascade import escalation_rates
+from app.utils import metrics
+from app.utils.compression import CompressionMiddleware
+from app.utils.background import store, watch_cancellations, keep_leases, fail_lost_jobs, WORKER_MODE
 from app.utils.cleanup import start_cleanup_task
+from app.worker import WorkerPool, WORKER_COUNT, WORKER_AUTOSTART
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Jobs a previous run of this process (or a dead sibling worker) left processing
+    await fail_lost_jobs()
     cleanup_task = asyncio.create_task(start_cleanup_task())
+    cancel_watch_task = asyncio.create_task(watch_cancellations())
+    lease_task = asyncio.create_task(keep_leases()) if WORKER_MODE == "inline" else None
+    worker_pool = supervise_task = None
+    if WORKER_MODE == "process" and WORKER_AUTOSTART:
+        worker_pool = WorkerPool(WORKER_COUNT)
+        supervise_task = asyncio.create_task(worker_pool.supervise())
     yield
     cleanup_task.cancel()
+    cancel_watch_task.cancel()
+    if lease_task:
+        lease_task.cancel()
+    if worker_pool:
+        supervise_task.cancel()
+        await asyncio.to_thread(worker_pool.stop)
+    await close_shared_clients()
+    shutdown_image_pool()
 
 app = FastAPI(title="Product Scraper API", lifespan=lifespan)
 
@@ -22,9 +46,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(scraper.router)
+app.include_router(batch.router)
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+@app.get("/metrics")
+async def get_metrics():
+    job_blobs = await asyncio.to_thread(store.blob_usage)
+    return {**metrics.snapshot(), "ai_cascade": escalation_rates(), "job_blobs": job_blobs, "assets": asset_store.hit_rates()}
@@ -0,0 +1,78 @@
+import json
+import zlib
+from datetime import datetime
+
+from app.models.schemas import ProductResult, ScrapeStatus
+
+FIELDS = tuple(ScrapeStatus.model_fields)  # includes "version"
+
+
+class JobRecord:
+    """Mutable job state held by the job store.
+
+    Updates change fields in place and bump `version`; the (immutable) ProductResult is
+    shared, never copied. ScrapeStatus models are only built at the API boundary.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, job_id: str, status: str, **values):
+        for name in FIELDS:
+            setattr(self, name, values.get(name))
+        self.job_id = job_id
+        self.status = status
+        self.version = values.get("version") or 0
+
+    def apply(self, changes: dict) -> bool:
+        """Set the fields that actually change; bumps the version. False if nothing changed."""
+        changed = False
+        for name, value in changes.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def copy(self, **changes) -> "JobRecord":
+        record = JobRecord.__new__(JobRecord)
+        for name in FIELDS:
+            setattr(record, name, changes.get(name, getattr(self, name)))
+        return record
+
+    def to_dict(self, fields: tuple[str, ...] | None = None) -> dict:
+        """JSON-ready dict of the given fields (all by default)."""
+        data = {}
+        for name in fields or FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, ProductResult):
+                value = value.model_dump(mode="json")
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            data[name] = value
+        return data
+
+    def to_status(self) -> ScrapeStatus:
+        return ScrapeStatus.model_construct(**{name: getattr(self, name) for name in FIELDS})
+
+    def etag(self, fields: tuple[str, ...] | None = None) -> str:
+        return job_etag(self.version, self.queue_position, self.eta_seconds, fields)
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> "JobRecord":
+        values = json.loads(data)
+        if values.get("result") is not None:
+            values["result"] = ProductResult.model_validate(values["result"])
+        if values.get("cached_at"):
+            values["cached_at"] = datetime.fromisoformat(values["cached_at"])
+        return cls(values.pop("job_id"), values.pop("status"), **values)
+
+
+def job_etag(version: int, queue_position: int | None, eta_seconds: int | None,
+             fields: tuple[str, ...] | None = None) -> str:
+    """Weak ETag of a job response — the stored version plus the (unstored) queue overlay and field selection."""
+    selector = zlib.crc32(",".join(fields).encode()) if fields else 0
+    return f'W/"{version}.{queue_position}.{eta_seconds}.{selector:x}"'
@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, HttpUrl
 from typing import Literal
 
@@ -8,6 +9,17 @@ class ScrapeRequest(BaseModel):
     ai_model: str | None = None
     reasoning_effort: str | None = None
     firecrawl_api_key: str | None = None
+    priority: Literal["interactive", "batch"] = "interactive"
+    force_refresh: bool = False  # ignore a cached result
+    check_freshness: bool = False  # revalidate a cached result against the page first
+
+class ProductImage(BaseModel):
+    filename: str  # in the ZIP's images/
+    kind: Literal["main", "gallery"]
+    width: int
+    height: int
+    source_url: str
+    asset: str = ""  # content hash in the shared asset store
 
 class ProductResult(BaseModel):
     product_name: str
@@ -17,6 +29,7 @@ class ProductResult(BaseModel):
     description_html: str
     description_shopline: str = ""
     source_url: str
+    images: list[ProductImage] = []
 
 class ScrapeStatus(BaseModel):
     job_id: str
@@ -24,11 +37,22 @@ class ScrapeStatus(BaseModel):
     progress: str | None = None
     result: ProductResult | None = None
     error: str | None = None
+    queue_position: int | None = None
+    eta_seconds: int | None = None
+    batch_id: str | None = None
+    cached_at: datetime | None = None  # set when the result was served from the result cache
+    version: int = 0  # bumped on every change; the status ETag is derived from it
 
 class ReviewAction(BaseModel):
     action: Literal["confirm", "refine"]
     instructions: str = ""
     description_html: str | None = None
+    shopline_mode: Literal["template", "ai"] = "template"
+
+class ResumeRequest(BaseModel):
+    # Keys are never checkpointed; without them the job's stored keys (if any) are used
+    api_key: str | None = None
+    firecrawl_api_key: str | None = None
 
 class TranslateRequest(BaseModel):
     target_language: Literal["en", "zh-TW"]
@@ -38,3 +62,44 @@ class TranslateRequest(BaseModel):
 class TranslateResponse(BaseModel):
     description_html: str
     description_shopline: str
+
+class BatchItem(BaseModel):
+    url: HttpUrl
+    product_model: str | None = None
+
+class BatchRequest(BaseModel):
+    items: list[BatchItem]
+    api_key: str | None = None
+    ai_model: str | None = None
+    reasoning_effort: str | None = None
+    firecrawl_api_key: str | None = None
+    priority: Literal["interactive", "batch"] = "batch"
+    # Opt-in: AI jobs skip the review pause and are finalized with the template Shopline renderer
+    auto_confirm: bool = False
+    force_refresh: bool = False
+    check_freshness: bool = False
+
+class ExportRequest(BaseModel):
+    # Completed jobs of the batch and/or the listed jobs; others are left out
+    batch_id: str | None = None
+    job_ids: list[str] = []
+    format: Literal["csv", "shopline", "ndjson", "zip"] = "csv"
+
+class BatchItemStatus(BaseModel):
+    url: str
+    product_model: str | None = None
+    job_id: str
+    status: Literal["processing", "awaiting_review", "completed", "failed", "expired"]
+    progress: str | None = None
+    error: str | None = None
+    result: ProductResult | None = None
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    # Once nothing is running: completed (every item), partial (some) or failed (none)
+    status: Literal["processing", "awaiting_review", "completed", "partial", "failed"]
+    total: int
+    counts: dict[str, int]
+    duplicates: int = 0
+    rejected: list[str] = []
+    items: list[BatchItemStatus]
@@ -0,0 +1,241 @@
+import asyncio
+import csv
+import io
+import os
+import uuid
+from collections import Counter
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from app.models.schemas import BatchRequest, BatchItem, BatchStatus, BatchItemStatus, ExportRequest
+from app.routers.scraper import start_scrape_job, client_key, cancel_running_job
+from app.services.exporter import EXPORT_FORMATS
+from app.utils import metrics
+from app.utils.background import create_job, save_batch, store
+from app.utils.responses import FastJSONResponse
+from app.utils.urls import normalize_url
+
+router = APIRouter(prefix="/api", default_response_class=FastJSONResponse)
+
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "1000"))
+MAX_CSV_BYTES = 2 * 1024 * 1024
+
+
+def _dedupe(items: list[BatchItem]) -> tuple[list[BatchItem], int]:
+    """Drop repeated URLs (after normalization); a later row can still supply a missing model override."""
+    unique: dict[str, BatchItem] = {}
+    for item in items:
+        key = normalize_url(str(item.url))
+        existing = unique.get(key)
+        if existing is None:
+            unique[key] = item
+        elif not existing.product_model and item.product_model:
+            unique[key] = existing.model_copy(update={"product_model": item.product_model})
+    return list(unique.values()), len(items) - len(unique)
+
+
+def _parse_csv(content: str) -> tuple[list[BatchItem], list[str]]:
+    """Rows of url[,product_model]; a header row with a "url" column is optional."""
+    rows = [row for row in csv.reader(io.StringIO(content)) if row and any(cell.strip() for cell in row)]
+    url_col, model_col = 0, 1
+    if rows and "url" in [cell.strip().lower() for cell in rows[0]]:
+        header = [cell.strip().lower() for cell in rows.pop(0)]
+        url_col = header.index("url")
+        model_col = next((header.index(h) for h in ("product_model", "model") if h in header), None)
+
+    items, rejected = [], []
+    for line, row in enumerate(rows, start=1):
+        url = row[url_col].strip() if len(row) > url_col else ""
+        model = row[model_col].strip() if model_col is not None and len(row) > model_col else ""
+        try:
+            items.append(BatchItem(url=url, product_model=model or None))
+        except ValidationError:
+            rejected.append(f"row {line}: invalid URL {url!r}")
+    return items, rejected
+
+
+async def _start_batch(request: BatchRequest, client: str, rejected: list[str] | None = None) -> dict:
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch has no valid URLs")
+    items, duplicates = _dedupe(request.items)
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_ITEMS} URLs")
+
+    batch_id = str(uuid.uuid4())
+    records = []
+    for item in items:
+        job_id = str(uuid.uuid4())
+        await create_job(job_id, batch_id=batch_id)
+        records.append({"url": str(item.url), "product_model": item.product_model, "job_id": job_id})
+    await save_batch(batch_id, {"items": records, "duplicates": duplicates, "rejected": rejected or []})
+
+    # All items share one client key, so the scheduler interleaves them fairly with other clients
+    for item, record in zip(items, records):
+        await start_scrape_job(
+            record["job_id"], record["url"], item.product_model,
+            request.api_key, request.ai_model, request.reasoning_effort, request.firecrawl_api_key,
+            client, request.priority, auto_confirm=request.auto_confirm,
+            force_refresh=request.force_refresh, check_freshness=request.check_freshness,
+        )
+    return {"batch_id": batch_id, "total": len(records), "duplicates": duplicates, "rejected": rejected or []}
+
+
+@router.post("/batch")
+async def submit_batch(request: BatchRequest, http_request: Request):
+    return await _start_batch(request, client_key(http_request, request.api_key))
+
+
+@router.post("/batch/csv")
+async def submit_batch_csv(
+    http_request: Request,
+    file: UploadFile = File(...),
+    api_key: str | None = Form(None),
+    ai_model: str | None = Form(None),
+    reasoning_effort: str | None = Form(None),
+    firecrawl_api_key: str | None = Form(None),
+    priority: str = Form("batch"),
+    auto_confirm: bool = Form(False),
+    force_refresh: bool = Form(False),
+    check_freshness: bool = Form(False),
+):
+    raw = await file.read(MAX_CSV_BYTES + 1)
+    if len(raw) > MAX_CSV_BYTES:
+        raise HTTPException(status_code=400, detail="CSV file too large")
+    items, rejected = _parse_csv(raw.decode("utf-8-sig", errors="replace"))
+    try:
+        request = BatchRequest(
+            items=items, api_key=api_key or None, ai_model=ai_model or None,
+            reasoning_effort=reasoning_effort or None, firecrawl_api_key=firecrawl_api_key or None,
+            priority=priority, auto_confirm=auto_confirm,
+            force_refresh=force_refresh, check_freshness=check_freshness,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _start_batch(request, client_key(http_request, api_key), rejected)
+
+
+def _batch_items(batch_id: str, results: bool) -> tuple[dict, list[BatchItemStatus]]:
+    """The batch and its items' current status, read from the store in one pass (run in a thread)."""
+    batch = store.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="批次已過期或伺服器已重啟，請重新提交。")
+    items = []
+    for record in batch["items"]:
+        job = store.get(record["job_id"])
+        if job is None:
+            items.append(BatchItemStatus(**record, status="expired"))
+            continue
+        items.append(BatchItemStatus(
+            **record,
+            status=job.status,
+            progress=job.progress,
+            error=job.error,
+            result=job.result if results else None,
+        ))
+    return batch, items
+
+
+@router.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str, results: bool = True) -> BatchStatus:
+    batch, items = await asyncio.to_thread(_batch_items, batch_id, results)
+
+    counts = Counter(item.status for item in items)
+    if counts["processing"]:
+        status = "processing"
+    elif counts["awaiting_review"]:
+        status = "awaiting_review"
+    elif counts["completed"] == len(items):
+        status = "completed"
+    elif counts["completed"]:
+        status = "partial"  # finished, but some items failed or expired
+    else:
+        status = "failed"
+    return BatchStatus(
+        batch_id=batch_id,
+        status=status,
+        total=len(items),
+        counts=dict(counts),
+        duplicates=batch.get("duplicates", 0),
+        rejected=batch.get("rejected", []),
+        items=items,
+    )
+
+
+def _unfinished_job_ids(batch_id: str) -> list[str]:
+    batch = store.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="批次已過期或伺服器已重啟，請重新提交。")
+    return [
+        record["job_id"] for record in batch["items"]
+        if (head := store.head(record["job_id"])) and head[1] in ("processing", "awaiting_review")
+    ]
+
+
+@router.post("/batch/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    unfinished = await asyncio.to_thread(_unfinished_job_ids, batch_id)
+    await asyncio.gather(*(cancel_running_job(job_id) for job_id in unfinished))
+    return {"status": "cancelled", "cancelled": len(unfinished)}
+
+
+def _export_job_ids(batch_id: str | None, job_ids: list[str]) -> list[str]:
+    """Completed jobs to export, in batch order then request order (store heads only — no results loaded)."""
+    ids = list(job_ids)
+    if batch_id:
+        batch = store.get_batch(batch_id)
+        if not batch:
+            raise HTTPException(status_code=404, detail="批次已過期或伺服器已重啟，請重新提交。")
+        ids = [record["job_id"] for record in batch["items"]] + ids
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Export exceeds {MAX_BATCH_ITEMS} jobs")
+    return [job_id for job_id in ids if (head := store.head(job_id)) and head[1] == "completed"]
+
+
+async def _export(request: ExportRequest) -> StreamingResponse:
+    if not request.batch_id and not request.job_ids:
+        raise HTTPException(status_code=400, detail="Give a batch_id or job_ids")
+    job_ids = await asyncio.to_thread(_export_job_ids, request.batch_id, request.job_ids)
+    if not job_ids:
+        raise HTTPException(status_code=404, detail="沒有已完成的商品可匯出")
+    writer = EXPORT_FORMATS[request.format]()
+
+    def encode(job_id: str) -> bytes:
+        job = store.get(job_id)
+        if job is None or job.result is None:  # expired since the listing
+            return b""
+        return writer.add(job_id, job.result)
+
+    async def body():
+        yield writer.start()
+        # One product loaded and encoded at a time, off the event loop
+        for job_id in job_ids:
+            chunk = await asyncio.to_thread(encode, job_id)
+            if chunk:
+                yield chunk
+        yield writer.finish()
+
+    metrics.incr("export.requests", format=request.format)
+    metrics.incr("export.products", len(job_ids), format=request.format)
+    name = f"batch-{request.batch_id[:8]}" if request.batch_id else f"products-{len(job_ids)}"
+    return StreamingResponse(body(), media_type=writer.media_type, headers={
+        "Content-Disposition": f'attachment; filename="{name}.{writer.extension}"',
+        "X-Export-Count": str(len(job_ids)),
+    })
+
+
+@router.get("/export")
+async def export_products(
+    batch_id: str | None = None,
+    job_id: list[str] = Query([]),
+    format: Literal["csv", "shopline", "ndjson", "zip"] = "csv",
+):
+    """Product CSV, Shopline import CSV, NDJSON or multi-product ZIP of completed jobs, streamed."""
+    return await _export(ExportRequest(batch_id=batch_id, job_ids=job_id, format=format))
+
+
+@router.post("/export")
+async def export_products_post(request: ExportRequest):
+    """Same as GET /export, for job ID lists too long for a query string."""
+    return await _export(request)
@@ -1,34 +1,55 @@
 import gc
+import hashlib
 import re
 import uuid
 import os
 import asyncio
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+import logging
+from datetime import datetime
+from urllib.parse import quote
+from fastapi import APIRouter, HTTPException, Request, Response, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse
 from bs4 import BeautifulSoup
-from app.models.schemas import ScrapeRequest, ScrapeStatus, ProductResult, ReviewAction, TranslateRequest, TranslateResponse
+from app.models.job_record import FIELDS as JOB_FIELDS, JobRecord, job_etag
+from app.models.schemas import ScrapeRequest, ProductResult, ReviewAction, ResumeRequest, TranslateRequest, TranslateResponse
 from app.utils.background import (
-    create_job, get_job, update_job,
-    set_job_internal, get_job_internal, clear_job_internal,
-    set_job_task, get_job_task, clear_job_task,
+    create_job, get_job, get_job_head, update_job,
+    set_job_internal, get_job_internal, get_job_raw_html, clear_job_internal,
+    set_job_task, get_job_task, clear_job_task, cancel_task, request_job_cancel, WORKER_MODE,
 )
 from app.services.scraper import (
-    scrape_product, fetch_with_httpx, fetch_with_firecrawl, fetch_with_playwright,
-    extract_all, detect_spa_heuristic,
+    scrape_product, fetch_page, fetch_with_firecrawl, fetch_with_playwright,
+    parse_all, extract_metadata, extract_description_html, detect_spa_heuristic,
 )
-from app.services.packager import create_package
+from app.services.packager import ZipPackage, build_package, parse_range
+from app.services.images import acquire_images
+from app.services import asset_store
 from app.services.ai_analyzer import analyze_page_structure
 from app.services.ai_cleaner import clean_description_with_ai
 from app.services.ai_extractor import extract_description_with_ai
-from app.services.shopline_formatter import generate_shopline_html
+from app.services.shopline_formatter import generate_shopline_html, render_shopline_html
 from app.services.ai_translator import translate_html
+from app.services import ai_client, result_cache
+from app.utils import metrics, coalesce, checkpoints, expiry
+from app.utils.admission import admission
+from app.utils.scheduler import scheduler
+from app.utils.events import events, job_delta, TERMINAL_STATUSES
+from app.utils.job_queue import get_queue
+from app.utils.pipeline import StageGraph
+from app.utils.responses import FastJSONResponse, dumps
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", default_response_class=FastJSONResponse)
+
+# _execute_with_ai stages worth checkpointing ("parse" holds a soup — re-parsing is cheap)
+CHECKPOINT_STAGES = ("fetch", "analyze", "render", "reanalyze", "describe", "clean", "images")
+PIPELINE_OUTPUTS = ("reanalyze", "render", "parse", "clean", "images")
+CANCEL_WAIT_SECONDS = 5.0  # how long /cancel waits for the job's teardown before answering
+EVENT_POLL_SECONDS = 1.0  # store fallback when the event bus is quiet (job owned by another worker)
+EVENT_KEEPALIVE_SECONDS = 15.0
+EVENT_ETA_STEP_SECONDS = 5  # smaller ETA drifts are not pushed
 
-router = APIRouter(prefix="/api")
-
-JOBS_DIR = "/tmp/scraper_jobs"
-
-# Limit to 1 concurrent scrape to stay within Render free tier 512MB RAM
-_scrape_semaphore = asyncio.Semaphore(1)
 _EFFORT_TIMEOUTS = {"high": 900, "medium": 600}  # seconds
 
 def _get_job_timeout(reasoning_effort: str | None) -> tuple[int, int]:
@@ -36,26 +57,142 @@ def _get_job_timeout(reasoning_effort: str | None) -> tuple[int, int]:
     timeout = _EFFORT_TIMEOUTS.get(reasoning_effort or "", 480)
     return timeout, timeout // 60
 
-async def run_scrape_job(job_id: str, url: str, product_model: str | None, api_key: str | None = None, ai_model: str | None = None, reasoning_effort: str | None = None, firecrawl_api_key: str | None = None):
+def client_key(http_request: Request, api_key: str | None) -> str:
+    """Fair-share identity: explicit X-Client-Id, else the API key (hashed), else the caller's IP."""
+    client_id = http_request.headers.get("x-client-id")
+    if client_id:
+        return f"id:{client_id[:64]}"
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return f"ip:{http_request.client.host if http_request.client else 'unknown'}"
+
+async def run_scrape_job(job_id: str, url: str, product_model: str | None, api_key: str | None = None, ai_model: str | None = None, reasoning_effort: str | None = None, firecrawl_api_key: str | None = None, client: str = "anonymous", priority: str = "interactive", auto_confirm: bool = False, force_refresh: bool = False, check_freshness: bool = False):
     timeout_secs, timeout_mins = _get_job_timeout(reasoning_effort)
+    cache_key = result_cache.cache_key(url, product_model, api_key, ai_model, reasoning_effort, bool(firecrawl_api_key))
+    await set_job_internal(job_id, cache_key=cache_key)
     try:
-        update_job(job_id, progress="Waiting in queue...")
-        async with _scrape_semaphore:
+        if not force_refresh and await _serve_from_cache(job_id, cache_key, url, check_freshness):
+            return
+        await update_job(job_id, progress="Waiting in queue...")
+        async with scheduler.slot(job_id, client, priority, kind="ai" if api_key else "legacy"):
             try:
-                await asyncio.wait_for(
-                    _execute_scrape_job(job_id, url, product_model, api_key, ai_model, reasoning_effort, firecrawl_api_key),
-                    timeout=timeout_secs,
-                )
+                # AI calls clip their timeouts / retries to whatever is left of the job budget
+                with ai_client.deadline(timeout_secs):
+                    await asyncio.wait_for(
+                        _execute_scrape_job(job_id, url, product_model, api_key, ai_model, reasoning_effort, firecrawl_api_key),
+                        timeout=timeout_secs,
+                    )
+                    if auto_confirm:
+                        await _auto_confirm(job_id)
             except asyncio.TimeoutError:
-                update_job(job_id, status="failed", error=f"工作執行超時（超過{timeout_mins}分鐘）", progress=None)
+                await update_job(job_id, status="failed", error=f"工作執行超時（超過{timeout_mins}分鐘）", progress=None)
             except asyncio.CancelledError:
-                update_job(job_id, status="failed", error="工作已取消", progress=None)
+                await update_job(job_id, status="failed", error="工作已取消", progress=None)
     except asyncio.CancelledError:
-        update_job(job_id, status="failed", error="工作已取消", progress=None)
+        await update_job(job_id, status="failed", error="工作已取消", progress=None)
     except Exception as e:
-        update_job(job_id, status="failed", error=str(e), progress=None)
+        await update_job(job_id, status="failed", error=str(e), progress=None)
     finally:
+        await _land_followers(job_id)
         clear_job_task(job_id)
+        job = await get_job(job_id)
+        if job is None or job.status != "failed":
+            # Finished or in review — the scrape stages won't be resumed
+            await asyncio.to_thread(checkpoints.clear, job_id)
+
+async def _serve_from_cache(job_id: str, cache_key: str, url: str, check_freshness: bool) -> bool:
+    """Complete the job from the result cache; False on a miss (or a stale entry when checking freshness)."""
+    cached = result_cache.lookup(cache_key)
+    if cached is None:
+        return False
+    result, stored_at, validators = cached
+    if check_freshness:
+        await update_job(job_id, progress="正在檢查快取結果是否最新...")
+        if not await result_cache.is_fresh(url, validators):
+            metrics.incr("result_cache.stale")
+            return False
+    if result.images and not await asyncio.to_thread(_assets_present, result):
+        # Some images were evicted from the asset store since — fetch them again
+        await update_job(job_id, progress="正在下載及處理圖片...")
+        images = await acquire_images([image.source_url for image in result.images])
+        result = result.model_copy(update={"images": images})
+    await update_job(job_id, status="completed", progress=None, result=result, cached_at=datetime.fromtimestamp(stored_at))
+    return True
+
+def _assets_present(result: ProductResult) -> bool:
+    """Whether the result's images are all still stored (marking them used)."""
+    return all(image.asset and asset_store.by_hash(image.asset) for image in result.images)
+
+async def _cache_result(cache_key: str | None, result: ProductResult, validators: dict | None):
+    """Best effort — a cache failure never fails the job."""
+    if not cache_key:
+        return
+    try:
+        await asyncio.to_thread(result_cache.store, cache_key, result.source_url, result, validators)
+    except Exception as e:
+        logger.warning("Result cache store failed: %s", e)
+
+async def start_scrape_job(job_id: str, url: str, product_model: str | None, api_key: str | None, ai_model: str | None,
+                     reasoning_effort: str | None, firecrawl_api_key: str | None, client: str,
+                     priority: str = "interactive", auto_confirm: bool = False,
+                     force_refresh: bool = False, check_freshness: bool = False):
+    """Run the scrape for job_id, or attach job_id to an identical run that is already in flight.
+
+    force_refresh never joins a run (it may be serving a cached result); it starts its own.
+    In worker mode the job is queued for a worker process; runs are not coalesced
+    there (flights are tracked per process).
+    """
+    # What /resume needs to restart the job (API keys are not written to disk)
+    checkpoints.save(job_id, "params", dict(
+        phase="scrape", url=url, product_model=product_model, ai=bool(api_key), ai_model=ai_model,
+        reasoning_effort=reasoning_effort, priority=priority, auto_confirm=auto_confirm,
+    ))
+    if WORKER_MODE == "process":
+        await update_job(job_id, progress="Waiting in queue...")
+        get_queue().enqueue(job_id, "scrape", dict(
+            job_id=job_id, url=url, product_model=product_model, api_key=api_key, ai_model=ai_model,
+            reasoning_effort=reasoning_effort, firecrawl_api_key=firecrawl_api_key, client=client,
+            priority=priority, auto_confirm=auto_confirm, force_refresh=force_refresh, check_freshness=check_freshness,
+        ), priority, client)
+        return
+    key = coalesce.flight_key(url, product_model, api_key, ai_model, reasoning_effort, firecrawl_api_key, auto_confirm)
+    pipeline_id = None if force_refresh else coalesce.join(key, job_id)
+    if pipeline_id:
+        # Own API key for this job's refine / finalize after the shared run
+        if api_key:
+            await set_job_internal(job_id, api_key=api_key)
+        pipeline_job = await get_job(pipeline_id)
+        if pipeline_job:
+            await update_job(job_id, mirror=False, progress=pipeline_job.progress)
+        return
+    coalesce.start(key, job_id)
+    task = asyncio.create_task(run_scrape_job(job_id, url, product_model, api_key, ai_model, reasoning_effort, firecrawl_api_key, client, priority, auto_confirm, force_refresh, check_freshness))
+    set_job_task(job_id, task)
+
+async def _land_followers(pipeline_id: str):
+    """Hand a finished shared run's outcome (result, review context) to the other jobs in it."""
+    flight = coalesce.finish(pipeline_id)
+    if flight is None:
+        return
+    state = flight.state
+    internal = await get_job_internal(pipeline_id)
+    raw_html = await get_job_raw_html(pipeline_id) if state.get("status") == "awaiting_review" else None
+    for job_id in flight.members:
+        if job_id == pipeline_id:
+            continue
+        if internal:
+            await set_job_internal(job_id, **{**internal, **await get_job_internal(job_id)}, raw_html=raw_html)
+        if state.get("status") == "failed":
+            # Lets each job resume from the shared run's completed stages
+            checkpoints.copy(pipeline_id, job_id, exclude=("params",))
+        await update_job(
+            job_id, mirror=False,
+            status=state.get("status", "failed"), progress=None,
+            result=state.get("result"), error=state.get("error"), cached_at=state.get("cached_at"),
+        )
+    if pipeline_id not in flight.members:
+        # The pipeline job itself was cancelled while others still needed the run
+        await clear_job_internal(pipeline_id)
 
 async def _execute_scrape_job(job_id: str, url: str, product_model: str | None, api_key: str | None = None, ai_model: str | None = None, reasoning_effort: str | None = None, firecrawl_api_key: str | None = None):
     if api_key:
@@ -71,138 +208,219 @@ async def _execute_legacy(job_id: str, url: str, product_model: str | None, fire
 
         # Try Firecrawl first if key provided
         if firecrawl_api_key:
-            update_job(job_id, progress="Firecrawl 正在擷取頁面...")
+            await update_job(job_id, progress="Firecrawl 正在擷取頁面...")
             fc_result = await fetch_with_firecrawl(url, firecrawl_api_key)
             if fc_result:
-                soup = BeautifulSoup(fc_result["html"], 'lxml')
-                raw_data = extract_all(soup, url)
-                raw_data["source_url"] = url
-                del soup
+                raw_data = await parse_all(fc_result["html"], url)
 
         # Fallback to existing scrape_product()
         if raw_data is None:
-            update_job(job_id, progress="Connecting to page...")
+            await update_job(job_id, progress="Connecting to page...")
             raw_data = await scrape_product(url)
             raw_data.pop("_raw_html", None)
+        validators = raw_data.pop("_validators", None)
+
+        await update_job(job_id, progress="正在下載及處理圖片...")
+        images = await acquire_images(raw_data.get("image_urls", []))
 
         model = product_model or raw_data.get("product_model", "product")
+        description_html = raw_data.get("description_html", "")
+        product_name = raw_data.get("product_name", "Unknown")
+        summary = raw_data.get("summary", "")
         result = ProductResult(
-            product_name=raw_data.get("product_name", "Unknown"),
+            product_name=product_name,
             product_model=model,
-            summary=raw_data.get("summary", ""),
+            summary=summary,
             description=raw_data.get("description", ""),
-            description_html=raw_data.get("description_html", ""),
-            description_shopline="",
+            description_html=description_html,
+            description_shopline=render_shopline_html(product_name, model, summary, description_html) if description_html else "",
             source_url=raw_data.get("source_url", url),
+            images=images,
         )
 
-        update_job(job_id, progress="Packaging results...")
-        job_dir = os.path.join(JOBS_DIR, job_id)
-        os.makedirs(job_dir, exist_ok=True)
-        await create_package(result, job_dir)
-        update_job(job_id, status="completed", progress=None, result=result)
+        await update_job(job_id, status="completed", progress=None, result=result)
+        await _cache_result((await get_job_internal(job_id)).get("cache_key"), result, validators)
     except Exception as e:
-        update_job(job_id, status="failed", error=str(e), progress=None)
+        await update_job(job_id, status="failed", error=str(e), progress=None)
+
+
+def _plain_text_length(html: str) -> int:
+    plain_text = re.sub(r'<[^>]+>', ' ', html)
+    return len(re.sub(r'\s+', ' ', plain_text).strip())
+
+
+def _parse_metadata_sync(html: str, url: str) -> dict:
+    soup = BeautifulSoup(html, 'lxml')
+    return {"soup": soup, "meta": extract_metadata(soup, url)}
+
+
+async def _parse_metadata(html: str, url: str) -> dict:
+    """Parse HTML and extract name/model/summary (soup is kept for description_html)."""
+    async with admission.reserve("parse"):
+        return await asyncio.to_thread(_parse_metadata_sync, html, url)
 
 
 async def _execute_with_ai(job_id: str, url: str, product_model: str | None, api_key: str, ai_model: str | None, reasoning_effort: str | None = None, firecrawl_api_key: str | None = None):
-    """AI-guided path — uses AI to analyze page structure and choose optimal strategy."""
-    try:
-        html = None
-        raw_html_for_internal = None
-        extraction_strategy = "rule_based"
-        analysis = None
-        used_firecrawl = False
+    """AI-guided path — uses AI to analyze page structure and choose optimal strategy.
 
-        # Try Firecrawl first if key provided
-        if firecrawl_api_key:
-            update_job(job_id, progress="Firecrawl 正在擷取頁面...")
-            fc_result = await fetch_with_firecrawl(url, firecrawl_api_key)
-            if fc_result:
-                html = fc_result["html"]
-                raw_html_for_internal = fc_result.get("raw_html") or html
-                used_firecrawl = True
-
-        # Fallback: existing httpx → AI Analyzer → Playwright flow
-        if not used_firecrawl:
-            # Step 1: Lightweight httpx fetch
-            update_job(job_id, progress="Connecting to page...")
-            html = await fetch_with_httpx(url)
-
-            # Step 2: AI structure analysis
-            needs_javascript = False
-
-            if html:
-                update_job(job_id, progress="AI 正在分析頁面結構...")
-                analysis = await analyze_page_structure(html, url, api_key, ai_model, reasoning_effort=reasoning_effort)
-
-                if analysis:
-                    needs_javascript = analysis["needs_javascript"]
-                    extraction_strategy = analysis["extraction_strategy"]
-                else:
-                    needs_javascript = detect_spa_heuristic(html)
-            else:
+    Stages run as a dependency graph: rule-based parsing of the httpx HTML overlaps
+    the AI analysis and is cancelled if the page turns out to need JS rendering.
+    Stage outputs are checkpointed; a resumed job restores them instead of re-running.
+    """
+    try:
+        async def checkpoint(stage, value):
+            if stage not in CHECKPOINT_STAGES:
+                return
+            if stage == "render" and value["raw_html"] is value["html"]:
+                value = {k: v for k, v in value.items() if k != "raw_html"}
+            await asyncio.to_thread(checkpoints.save, job_id, stage, value)
+            if stage == "render" and value["rendered"]:
+                # The pre-render parse is moot — a resume needn't refetch for it
+                await asyncio.to_thread(checkpoints.save, job_id, "speculative_parse", None)
+
+        graph = StageGraph("ai_pipeline", checkpoint=checkpoint)
+
+        async def fetch(_):
+            # Try Firecrawl first if key provided
+            if firecrawl_api_key:
+                await update_job(job_id, progress="Firecrawl 正在擷取頁面...")
+                fc_result = await fetch_with_firecrawl(url, firecrawl_api_key)
+                if fc_result:
+                    return {"html": fc_result["html"], "raw_html": fc_result.get("raw_html") or fc_result["html"], "firecrawl": True}
+            # Fallback: httpx → AI Analyzer → Playwright flow
+            await update_job(job_id, progress="Connecting to page...")
+            html, validators = await fetch_page(url)
+            return {"html": html, "firecrawl": False, "validators": validators}
+
+        async def analyze(deps):
+            fetched = deps["fetch"]
+            if fetched["firecrawl"] or not fetched["html"]:
+                return None
+            await update_job(job_id, progress="AI 正在分析頁面結構...")
+            analysis = await analyze_page_structure(fetched["html"], url, api_key, ai_model, reasoning_effort=reasoning_effort)
+            if analysis is None:
+                metrics.incr("ai_analyzer.heuristic_fallback")
+            return analysis
+
+        async def speculative_parse(deps):
+            # Rule-based parse of the fetched HTML while the analyzer is in flight
+            html = deps["fetch"]["html"]
+            if not html:
+                return None
+            return await _parse_metadata(html, url)
+
+        async def render(deps):
+            fetched, analysis = deps["fetch"], deps["analyze"]
+            html = fetched["html"]
+            validators = fetched.get("validators")  # of the fetched document, for the result cache
+            if fetched["firecrawl"]:
+                return {"html": html, "raw_html": fetched["raw_html"], "rendered": False, "validators": validators}
+            if not html:
                 needs_javascript = True
+            elif analysis:
+                needs_javascript = analysis["needs_javascript"]
+            else:
+                needs_javascript = detect_spa_heuristic(html)
+            if not needs_javascript:
+                return {"html": html, "raw_html": html, "rendered": False, "validators": validators}
+
+            # Speculative parse of the pre-render HTML is now irrelevant
+            graph.cancel("speculative_parse")
+            fetched["html"] = None
+            del html
+            gc.collect()
+            await update_job(job_id, progress="啟動瀏覽器渲染頁面...")
+            html = await fetch_with_playwright(url)
+            return {"html": html, "raw_html": html, "rendered": True, "validators": validators}
+
+        async def reanalyze(deps):
+            analysis, rendered = deps["analyze"], deps["render"]
+            if analysis is None and rendered["rendered"] and rendered["html"]:
+                metrics.incr("ai_analyzer.reanalysis")
+                analysis = await analyze_page_structure(rendered["html"], url, api_key, ai_model, reasoning_effort=reasoning_effort)
+            return analysis
+
+        async def parse(deps):
+            rendered, speculative = deps["render"], deps["speculative_parse"]
+            if speculative and not rendered["rendered"]:
+                return speculative
+            return await _parse_metadata(rendered["html"], url)
+
+        async def describe(deps):
+            html, parsed, analysis = deps["render"]["html"], deps["parse"], deps["reanalyze"]
+            product_name = parsed["meta"].get("product_name", "")
+            extraction_strategy = analysis["extraction_strategy"] if analysis else "rule_based"
+
+            if extraction_strategy == "ai_extraction":
+                # Rule-based description_html is only computed if AI extraction fails
+                await update_job(job_id, progress="AI 正在提取產品描述...")
+                ai_desc = await extract_description_with_ai(
+                    html, product_name, api_key, ai_model,
+                    analysis=analysis, reasoning_effort=reasoning_effort,
+                )
+                if ai_desc:
+                    return ai_desc
+                return await asyncio.to_thread(extract_description_html, parsed["soup"], analysis)
 
-            # Step 3: Re-fetch with Playwright if needed
-            if needs_javascript:
-                if html:
-                    del html
-                    gc.collect()
-                update_job(job_id, progress="啟動瀏覽器渲染頁面...")
-                html = await fetch_with_playwright(url)
-
-                if analysis is None and html:
-                    analysis = await analyze_page_structure(html, url, api_key, ai_model, reasoning_effort=reasoning_effort)
-                    if analysis:
-                        extraction_strategy = analysis["extraction_strategy"]
-
-            raw_html_for_internal = html
-
-        # Step 5: Always run rule-based extraction for name/model/summary
-        soup = BeautifulSoup(html, 'lxml')
-        raw_data = extract_all(soup, url, analysis=analysis)
-        del soup
-
-        # Step 6: Description extraction based on strategy
-        if extraction_strategy == "ai_extraction":
-            update_job(job_id, progress="AI 正在提取產品描述...")
-            ai_desc = await extract_description_with_ai(
-                html, raw_data.get("product_name", ""), api_key, ai_model,
-                analysis=analysis, reasoning_effort=reasoning_effort,
-            )
-            if ai_desc:
-                raw_data["description_html"] = ai_desc
-            # If AI extraction failed, keep rule-based description_html as fallback
-        else:
             # rule_based — check if result is sufficient, AI fallback if not
-            desc_html = raw_data.get("description_html", "")
-            plain_text = re.sub(r'<[^>]+>', ' ', desc_html)
-            plain_text = re.sub(r'\s+', ' ', plain_text).strip()
-            if len(plain_text) < 500 and html:
-                update_job(job_id, progress="AI 正在補充提取描述...")
+            desc_html = await asyncio.to_thread(extract_description_html, parsed["soup"], analysis)
+            if _plain_text_length(desc_html) < 500 and html:
+                await update_job(job_id, progress="AI 正在補充提取描述...")
                 ai_desc = await extract_description_with_ai(
-                    html, raw_data.get("product_name", ""), api_key, ai_model,
+                    html, product_name, api_key, ai_model,
                     analysis=analysis, reasoning_effort=reasoning_effort,
                 )
                 if ai_desc:
-                    raw_data["description_html"] = ai_desc
-
-        # Step 7: AI cleaner
-        if raw_data.get("description_html"):
-            update_job(job_id, progress="AI 正在優化內容...")
-            raw_data["description_html"] = await clean_description_with_ai(
-                raw_data["description_html"],
-                raw_data.get("product_name", ""),
+                    return ai_desc
+            return desc_html
+
+        async def clean(deps):
+            description_html, analysis = deps["describe"], deps["reanalyze"]
+            if not description_html:
+                return description_html
+            await update_job(job_id, progress="AI 正在優化內容...")
+            return await clean_description_with_ai(
+                description_html,
+                deps["parse"]["meta"].get("product_name", ""),
                 api_key,
                 ai_model,
                 analysis=analysis, reasoning_effort=reasoning_effort,
             )
 
+        async def images(deps):
+            # Downloads and Pillow work overlap the AI description stages
+            acquired = await acquire_images(deps["parse"]["meta"].get("image_urls", []))
+            return [image.model_dump() for image in acquired]
+
+        graph.add("fetch", fetch)
+        graph.add("analyze", analyze, after=("fetch",))
+        graph.add("speculative_parse", speculative_parse, after=("fetch",))
+        graph.add("render", render, after=("fetch", "analyze"))
+        graph.add("reanalyze", reanalyze, after=("analyze", "render"))
+        graph.add("parse", parse, after=("render", "speculative_parse"))
+        graph.add("describe", describe, after=("render", "parse", "reanalyze"))
+        graph.add("clean", clean, after=("describe", "parse", "reanalyze"))
+        graph.add("images", images, after=("parse",))
+
+        available = await asyncio.to_thread(checkpoints.stages, job_id)
+        restored = await asyncio.to_thread(checkpoints.load_many, job_id, graph.plan(PIPELINE_OUTPUTS, available))
+        if restored.get("render") and "raw_html" not in restored["render"]:
+            restored["render"]["raw_html"] = restored["render"]["html"]
+        if restored:
+            await update_job(job_id, progress="正在從上次完成的步驟繼續...")
+        results = await graph.run(restored, outputs=PIPELINE_OUTPUTS)
+
+        analysis = results["reanalyze"]
+        raw_html_for_internal = results["render"]["raw_html"]
+        validators = results["render"].get("validators")
+        raw_data = {**results["parse"]["meta"], "description_html": results["clean"] or ""}
+        product_images = results["images"]
+        del results
+
         model = product_model or raw_data.get("product_model", "product")
 
-        # Step 8: Pause for user review — store context for refine/finalize
-        set_job_internal(job_id,
+        # Pause for user review — store context for refine/finalize (compressing raw_html off the loop)
+        await set_job_internal(job_id,
             raw_html=raw_html_for_internal,
             api_key=api_key,
             ai_model=ai_model,
@@ -210,8 +428,9 @@ async def _execute_with_ai(job_id: str, url: str, product_model: str | None, api
             analysis=analysis,
             product_name=raw_data.get("product_name", ""),
             product_model=model,
+            validators=validators,
         )
-        del html, raw_html_for_internal
+        del raw_html_for_internal
         gc.collect()
 
         review_result = ProductResult(
@@ -222,25 +441,45 @@ async def _execute_with_ai(job_id: str, url: str, product_model: str | None, api
             description_html=raw_data.get("description_html", ""),
             description_shopline="",
             source_url=raw_data.get("source_url", url),
+            images=product_images,
         )
-        update_job(job_id, status="awaiting_review", progress=None, result=review_result)
+        await update_job(job_id, status="awaiting_review", progress=None, result=review_result)
     except Exception as e:
-        update_job(job_id, status="failed", error=str(e), progress=None)
+        await update_job(job_id, status="failed", error=str(e), progress=None)
 
 async def _finalize_job(job_id: str, description_html: str, product_name: str,
                         product_model: str, summary: str, description: str,
                         source_url: str, api_key: str, ai_model: str | None,
-                        reasoning_effort: str | None = None):
-    """Generate Shopline HTML and package results."""
+                        reasoning_effort: str | None = None, shopline_mode: str = "template",
+                        images: list[dict] | None = None):
+    """Generate Shopline HTML and complete the job (the ZIP is built when downloaded).
+
+    Template mode renders locally; "ai" mode asks the LLM (falls back to the template).
+    The generated HTML is checkpointed, so a resumed finalize doesn't regenerate it.
+    """
     try:
-        update_job(job_id, status="processing", progress="正在生成 Shopline HTML...")
+        await update_job(job_id, status="processing", progress="正在生成 Shopline HTML...")
+        args = dict(
+            description_html=description_html, product_name=product_name, product_model=product_model,
+            summary=summary, description=description, source_url=source_url, ai_model=ai_model,
+            reasoning_effort=reasoning_effort, shopline_mode=shopline_mode, images=images,
+        )
+        await asyncio.to_thread(checkpoints.save, job_id, "params", {"phase": "finalize", "args": args})
         shopline_html = ""
-        if description_html:
+        saved = await asyncio.to_thread(checkpoints.load, job_id, "shopline")
+        if saved and saved["description_html"] == description_html and saved["shopline_mode"] == shopline_mode:
+            shopline_html = saved["html"]
+        elif description_html and (shopline_mode == "template" or not api_key):
+            shopline_html = render_shopline_html(product_name, product_model, summary, description_html)
+        elif description_html:
             shopline_html = await generate_shopline_html(
                 product_name, product_model, summary,
                 description_html, api_key, ai_model,
                 reasoning_effort=reasoning_effort,
             )
+            await asyncio.to_thread(checkpoints.save, job_id, "shopline", dict(
+                description_html=description_html, shopline_mode=shopline_mode, html=shopline_html,
+            ))
 
         result = ProductResult(
             product_name=product_name,
@@ -250,34 +489,34 @@ async def _finalize_job(job_id: str, description_html: str, product_name: str,
             description_html=description_html,
             description_shopline=shopline_html,
             source_url=source_url,
+            images=images or [],
         )
 
-        update_job(job_id, progress="Packaging results...")
-        job_dir = os.path.join(JOBS_DIR, job_id)
-        os.makedirs(job_dir, exist_ok=True)
-        await create_package(result, job_dir)
-        clear_job_internal(job_id)
-        update_job(job_id, status="completed", progress=None, result=result)
+        internal = await get_job_internal(job_id)
+        await clear_job_internal(job_id)
+        await update_job(job_id, status="completed", progress=None, result=result)
+        await asyncio.to_thread(checkpoints.clear, job_id)
+        await _cache_result(internal.get("cache_key"), result, internal.get("validators"))
     except Exception as e:
-        update_job(job_id, status="failed", error=str(e), progress=None)
+        await update_job(job_id, status="failed", error=str(e), progress=None)
 
 
 async def _refine_extraction(job_id: str, instructions: str):
     """Re-run AI extraction with user instructions, then return to review."""
     try:
-        internal = get_job_internal(job_id)
-        raw_html = internal.get("raw_html", "")
+        internal = await get_job_internal(job_id)
         api_key = internal["api_key"]
         ai_model = internal.get("ai_model")
         reasoning_effort = internal.get("reasoning_effort")
         analysis = internal.get("analysis")
         product_name = internal.get("product_name", "")
 
+        raw_html = await get_job_raw_html(job_id)
         if not raw_html:
-            update_job(job_id, status="failed", error="Raw HTML not available for refine", progress=None)
+            await update_job(job_id, status="failed", error="Raw HTML not available for refine", progress=None)
             return
 
-        update_job(job_id, status="processing", progress="AI 正在根據指示重新提取...")
+        await update_job(job_id, status="processing", progress="AI 正在根據指示重新提取...")
         ai_desc = await extract_description_with_ai(
             raw_html, product_name, api_key, ai_model,
             analysis=analysis, extra_instructions=instructions,
@@ -285,58 +524,78 @@ async def _refine_extraction(job_id: str, instructions: str):
         )
 
         if ai_desc:
-            update_job(job_id, progress="AI 正在優化內容...")
+            await update_job(job_id, progress="AI 正在優化內容...")
             ai_desc = await clean_description_with_ai(
                 ai_desc, product_name, api_key, ai_model,
                 analysis=analysis, reasoning_effort=reasoning_effort,
             )
 
         # Update the review result with refined description
-        job = get_job(job_id)
+        job = await get_job(job_id)
         if job and job.result:
             updated_result = job.result.model_copy(update={
                 "description_html": ai_desc or job.result.description_html,
             })
-            update_job(job_id, status="awaiting_review", progress=None, result=updated_result)
+            await update_job(job_id, status="awaiting_review", progress=None, result=updated_result)
         else:
-            update_job(job_id, status="awaiting_review", progress=None)
+            await update_job(job_id, status="awaiting_review", progress=None)
     except Exception as e:
-        update_job(job_id, status="failed", error=str(e), progress=None)
+        await update_job(job_id, status="failed", error=str(e), progress=None)
+
+
+async def _finalize_args(job: JobRecord, description_html: str | None = None, shopline_mode: str = "template") -> dict:
+    """_finalize_job arguments for confirming a job's review result as-is (or with edited HTML)."""
+    internal = await get_job_internal(job.job_id)
+    return dict(
+        description_html=description_html or (job.result.description_html if job.result else ""),
+        product_name=job.result.product_name if job.result else "",
+        product_model=job.result.product_model if job.result else "product",
+        summary=job.result.summary if job.result else "",
+        description=job.result.description if job.result else "",
+        source_url=job.result.source_url if job.result else "",
+        api_key=internal.get("api_key", ""),
+        ai_model=internal.get("ai_model"),
+        reasoning_effort=internal.get("reasoning_effort"),
+        shopline_mode=shopline_mode,
+        images=[image.model_dump() for image in job.result.images] if job.result else [],
+    )
+
+
+async def _auto_confirm(job_id: str):
+    """Batch jobs: finalize without waiting for a user review."""
+    job = await get_job(job_id)
+    if job and job.status == "awaiting_review":
+        await _finalize_job(job_id, **await _finalize_args(job))
 
 
 @router.post("/scrape/{job_id}/review")
 async def submit_review(job_id: str, review: ReviewAction):
-    job = get_job(job_id)
+    job = await get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="工作已過期或伺服器已重啟，請重新提交網址。")
     if job.status != "awaiting_review":
         raise HTTPException(status_code=400, detail="Job is not awaiting review")
 
     if review.action == "confirm":
-        internal = get_job_internal(job_id)
-        asyncio.create_task(_finalize_job(
-            job_id,
-            description_html=review.description_html or (job.result.description_html if job.result else ""),
-            product_name=job.result.product_name if job.result else "",
-            product_model=job.result.product_model if job.result else "product",
-            summary=job.result.summary if job.result else "",
-            description=job.result.description if job.result else "",
-            source_url=job.result.source_url if job.result else "",
-            api_key=internal.get("api_key", ""),
-            ai_model=internal.get("ai_model"),
-            reasoning_effort=internal.get("reasoning_effort"),
-        ))
-        update_job(job_id, status="processing", progress="正在生成 Shopline HTML...")
+        finalize_args = await _finalize_args(job, review.description_html, review.shopline_mode)
+        if WORKER_MODE == "process":
+            get_queue().enqueue(job_id, "finalize", {"job_id": job_id, **finalize_args})
+        else:
+            asyncio.create_task(_finalize_job(job_id, **finalize_args))
+        await update_job(job_id, status="processing", progress="正在生成 Shopline HTML...")
         return {"status": "processing"}
     else:
-        asyncio.create_task(_refine_extraction(job_id, review.instructions))
-        update_job(job_id, status="processing", progress="AI 正在根據指示重新提取...")
+        if WORKER_MODE == "process":
+            get_queue().enqueue(job_id, "refine", {"job_id": job_id, "instructions": review.instructions})
+        else:
+            asyncio.create_task(_refine_extraction(job_id, review.instructions))
+        await update_job(job_id, status="processing", progress="AI 正在根據指示重新提取...")
         return {"status": "processing"}
 
 
 @router.post("/scrape/{job_id}/translate")
 async def translate_job(job_id: str, req: TranslateRequest):
-    job = get_job(job_id)
+    job = await get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="工作已過期或伺服器已重啟，請重新提交網址。")
     if job.status not in ("completed", "awaiting_review"):
@@ -356,55 +615,265 @@ async def translate_job(job_id: str, req: TranslateRequest):
 
 
 @router.post("/scrape")
-async def submit_scrape(request: ScrapeRequest):
+async def submit_scrape(request: ScrapeRequest, http_request: Request):
     job_id = str(uuid.uuid4())
-    create_job(job_id)
-    task = asyncio.create_task(run_scrape_job(job_id, str(request.url), request.product_model, request.api_key, request.ai_model, request.reasoning_effort, request.firecrawl_api_key))
-    set_job_task(job_id, task)
+    await create_job(job_id)
+    client = client_key(http_request, request.api_key)
+    await start_scrape_job(job_id, str(request.url), request.product_model, request.api_key, request.ai_model, request.reasoning_effort, request.firecrawl_api_key, client, request.priority, force_refresh=request.force_refresh, check_freshness=request.check_freshness)
     return {"job_id": job_id, "status": "processing"}
 
 @router.get("/scrape/{job_id}")
-async def get_scrape_status(job_id: str):
-    job = get_job(job_id)
+async def get_scrape_status(job_id: str, fields: str | None = None,
+                            if_none_match: str | None = Header(None)):
+    """Job status. `fields` selects top-level fields (e.g. "status,progress");
+    a matching If-None-Match gets 304 without the record being loaded."""
+    selected = None
+    if fields:
+        selected = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in selected if f not in JOB_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if if_none_match:
+        head = await get_job_head(job_id)
+        if head is not None:
+            version, status = head
+            etag = job_etag(version, *_queue_overlay(job_id, status), selected)
+            if etag in (tag.strip() for tag in if_none_match.split(",")):
+                metrics.incr("status_polls", outcome="not_modified")
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    job = await get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="工作已過期或伺服器已重啟，請重新提交網址。")
-    return job
+    job = _with_queue_position(job)
+    metrics.incr("status_polls", outcome="full")
+    return FastJSONResponse(job.to_dict(selected), headers={"ETag": job.etag(selected), "Cache-Control": "no-cache"})
+
+def _queue_overlay(job_id: str, status: str) -> tuple[int | None, int | None]:
+    """Queue position / ETA of a processing job (not stored — they change continuously)."""
+    if status != "processing":
+        return None, None
+    if WORKER_MODE == "process":
+        return get_queue().position(job_id), None
+    return scheduler.position(coalesce.pipeline_of(job_id))
+
+def _with_queue_position(job: JobRecord) -> JobRecord:
+    """Snapshot of the job with the queue overlay applied."""
+    queue_position, eta_seconds = _queue_overlay(job.job_id, job.status)
+    if queue_position is None and eta_seconds is None:
+        return job.copy()
+    return job.copy(queue_position=queue_position, eta_seconds=eta_seconds)
+
+async def _job_event_stream(job_id: str, last_event_id: int | None):
+    """Events for one subscriber: backlog replay (or a snapshot), then live deltas until the job finishes.
+
+    While the bus is quiet the store is polled, so updates written by another
+    worker process still arrive (as deltas without an event id).
+    """
+    sub, replay, seq = events.subscribe(job_id, last_event_id)
+    try:
+        last = await get_job(job_id)
+        if last is None:
+            yield {"type": "gone", "data": {}}
+            return
+        last = _with_queue_position(last)
+        if replay is None:
+            yield {"id": seq, "type": "snapshot", "data": last.to_dict()}
+        else:
+            for event in replay:
+                yield event
+
+        idle = 0.0
+        while last.status not in TERMINAL_STATUSES or not sub.queue.empty():
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=EVENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                current = await get_job(job_id)
+                if current is None:
+                    yield {"type": "gone", "data": {}}
+                    return
+                current = _with_queue_position(current)
+                if (current.queue_position == last.queue_position and current.eta_seconds is not None
+                        and last.eta_seconds is not None
+                        and abs(current.eta_seconds - last.eta_seconds) < EVENT_ETA_STEP_SECONDS):
+                    current.eta_seconds = last.eta_seconds
+                delta = job_delta(last, current)
+                last = current
+                if delta:
+                    idle = 0.0
+                    yield {"type": "update", "data": delta}
+                else:
+                    idle += EVENT_POLL_SECONDS
+                    if idle >= EVENT_KEEPALIVE_SECONDS:
+                        idle = 0.0
+                        yield {"type": "ping"}
+                continue
+            idle = 0.0
+            yield event
+            # Queue fields are kept as last sent, so the next poll pushes any change to them
+            last = (await get_job(job_id) or last).copy(queue_position=last.queue_position, eta_seconds=last.eta_seconds)
+    finally:
+        events.unsubscribe(sub)
+
+
+def _format_sse(event: dict) -> str:
+    if event["type"] == "ping":
+        return ": ping\n\n"
+    lines = [f"id: {event['id']}"] if "id" in event else []
+    lines.append(f"event: {event['type']}")
+    lines.append("data: " + dumps(event["data"]).decode("utf-8"))
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/scrape/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: int | None = None,
+                            last_event_id_header: str | None = Header(None, alias="Last-Event-ID")):
+    """Server-Sent Events: a snapshot (or replay after Last-Event-ID), then status/progress/result deltas."""
+    if not await get_job(job_id):
+        raise HTTPException(status_code=404, detail="工作已過期或伺服器已重啟，請重新提交網址。")
+    if last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    metrics.incr("events.streams", transport="sse")
+
+    async def body():
+        async for event in _job_event_stream(job_id, last_event_id):
+            yield _format_sse(event)
+
+    return StreamingResponse(
+        body(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/scrape/{job_id}/ws")
+async def job_events_ws(websocket: WebSocket, job_id: str, last_event_id: int | None = None):
+    """WebSocket variant of /events — each message is {"id"?, "type", "data"}."""
+    await websocket.accept()
+    metrics.incr("events.streams", transport="ws")
+    try:
+        async for event in _job_event_stream(job_id, last_event_id):
+            if event["type"] != "ping":
+                await websocket.send_text(dumps(event).decode("utf-8"))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.post("/scrape/{job_id}/resume")
+async def resume_job(job_id: str, req: ResumeRequest, http_request: Request):
+    """Restart a failed (timed-out, cancelled, ...) job from its last completed stage."""
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="工作已過期或伺服器已重啟，請重新提交網址。")
+    if job.status != "failed":
+        raise HTTPException(status_code=400, detail="Only failed jobs can be resumed")
+    params = await asyncio.to_thread(checkpoints.load, job_id, "params")
+    if not params:
+        raise HTTPException(status_code=400, detail="No checkpoint to resume from")
+    internal = await get_job_internal(job_id)
+    api_key = req.api_key or internal.get("api_key")
+    firecrawl_api_key = req.firecrawl_api_key or internal.get("firecrawl_api_key")
+    if params["phase"] == "scrape" and params["ai"] and not api_key:
+        raise HTTPException(status_code=400, detail="api_key is required to resume this job")
+    # Claimed atomically, so a repeated request can't schedule a second run
+    if not await update_job(
+        job_id, mirror=False, expect_status="failed",
+        status="processing", error=None, progress="正在從上次完成的步驟繼續...",
+    ):
+        raise HTTPException(status_code=409, detail="Job is already being resumed")
+    metrics.incr("checkpoints.resumes", phase=params["phase"])
+
+    if params["phase"] == "finalize":
+        finalize_args = {**params["args"], "api_key": api_key or ""}
+        if WORKER_MODE == "process":
+            get_queue().enqueue(job_id, "finalize", {"job_id": job_id, **finalize_args})
+        else:
+            asyncio.create_task(_finalize_job(job_id, **finalize_args))
+    else:
+        # force_refresh: resume this job's own checkpoints rather than joining another run
+        await start_scrape_job(
+            job_id, params["url"], params["product_model"], api_key, params["ai_model"],
+            params["reasoning_effort"], firecrawl_api_key, client_key(http_request, api_key),
+            params["priority"], params["auto_confirm"], force_refresh=True,
+        )
+    return {"job_id": job_id, "status": "processing"}
+
 
 @router.post("/scrape/{job_id}/cancel")
 async def cancel_job(job_id: str):
-    job = get_job(job_id)
+    job = await get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="工作已過期或伺服器已重啟，請重新提交網址。")
     if job.status in ("completed", "failed"):
         raise HTTPException(status_code=400, detail="Job already finished")
+    await cancel_running_job(job_id)
+    return {"status": "cancelled"}
 
-    task = get_job_task(job_id)
-    if task and not task.done():
-        task.cancel()
-        try:
-            await asyncio.wait_for(asyncio.shield(task), timeout=2.0)
-        except (asyncio.CancelledError, asyncio.TimeoutError, Exception):
-            pass
+async def cancel_running_job(job_id: str):
+    """Cancel a job's task (locally or via the shared store) and mark it cancelled.
+
+    A job sharing a coalesced run only detaches from it; the run is cancelled with its last job.
+    """
+    pipeline_id, shared = coalesce.leave(job_id)
+    if not shared:
+        run_id = pipeline_id or job_id
+        task = get_job_task(run_id)
+        if task and not task.done():
+            cancel_task(run_id, task)
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=CANCEL_WAIT_SECONDS)
+            except (asyncio.CancelledError, asyncio.TimeoutError, Exception):
+                pass
+        elif task is None and not (WORKER_MODE == "process" and get_queue().remove_unclaimed(run_id)):
+            # Job may be running in another worker process
+            await request_job_cancel(run_id)
+        clear_job_task(run_id)
 
-    update_job(job_id, status="failed", error="工作已取消", progress=None)
-    clear_job_task(job_id)
-    clear_job_internal(job_id)
-    return {"status": "cancelled"}
+    await update_job(job_id, mirror=False, status="failed", error="工作已取消", progress=None)
+    await clear_job_internal(job_id)
 
 @router.get("/scrape/{job_id}/download")
-async def download_zip(job_id: str, background_tasks: BackgroundTasks):
-    job = get_job(job_id)
-    if not job or job.status != "completed":
+async def download_zip(job_id: str, range_header: str | None = Header(None, alias="Range"),
+                       if_range: str | None = Header(None)):
+    """ZIP of the result, built in memory and streamed. Deterministic bytes, so single
+    Range requests (download resume) are honoured; results stay bounded by the job LRU."""
+    job = await get_job(job_id)
+    if not job or job.status != "completed" or not job.result:
         raise HTTPException(status_code=404, detail="工作已過期或未完成，請重新提交網址。")
-    zip_path = os.path.join(JOBS_DIR, job_id, "result.zip")
-    if not os.path.exists(zip_path):
-        raise HTTPException(status_code=404, detail="ZIP file not found")
-    model_name = job.result.product_model if job.result else "product"
-    # Free result data from memory after download
-    background_tasks.add_task(_clear_job_result, job_id)
-    return FileResponse(zip_path, media_type="application/zip", filename=f"{model_name}.zip")
-
-def _clear_job_result(job_id: str):
-    job = get_job(job_id)
-    if job:
-        job.result = None
+    expiry.completed.touch(job_id)
+    package = await asyncio.to_thread(build_package, job.result)
+    return _zip_response(package, f"{job.result.product_model or 'product'}.zip", range_header, if_range)
+
+@router.get("/scrape/{job_id}/images/{filename}")
+async def get_image(job_id: str, filename: str):
+    job = await get_job(job_id)
+    image = next((image for image in job.result.images if image.filename == filename), None) if job and job.result else None
+    path = asset_store.path(image.asset) if image and image.asset else None
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(path, media_type="image/jpeg")
+
+def _zip_response(package: ZipPackage, filename: str, range_header: str | None, if_range: str | None) -> Response:
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": package.etag,
+        "Content-Disposition": (
+            f'attachment; filename="{filename}"' if quote(filename) == filename
+            else f"attachment; filename*=utf-8''{quote(filename)}"
+        ),
+    }
+    byte_range = None
+    if range_header and (not if_range or if_range == package.etag):
+        try:
+            byte_range = parse_range(range_header, package.size)
+        except ValueError:
+            pass  # unsupported range form — send the whole package
+        else:
+            if byte_range is None:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{package.size}"})
+    if byte_range is None:
+        headers["Content-Length"] = str(package.size)
+        return StreamingResponse(package.iter_range(), media_type="application/zip", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{package.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(package.iter_range(start, end), status_code=206, media_type="application/zip", headers=headers)
@@ -1,11 +1,40 @@
 import json
+import logging
 import re
 
 from bs4 import BeautifulSoup
-from openai import AsyncOpenAI
+from openai import BadRequestError
+
+from app.services.ai_cascade import run_cascade
+from app.services.ai_client import chat_completion
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_MODEL = "z-ai/glm-5"
 
+# JSON schema for structured output (response_format=json_schema) — mirrors ANALYZE_PROMPT
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "needs_javascript": {"type": "boolean"},
+        "extraction_strategy": {"type": "string", "enum": ["rule_based", "ai_extraction"]},
+        "content_selectors": {"type": "array", "items": {"type": "string"}, "maxItems": 5},
+        "noise_selectors": {"type": "array", "items": {"type": "string"}, "maxItems": 5},
+        "content_structure": {"type": "string", "enum": ["semantic", "div_heavy", "mixed"]},
+        "content_language": {"type": "string"},
+    },
+    "required": [
+        "needs_javascript", "extraction_strategy", "content_selectors",
+        "noise_selectors", "content_structure", "content_language",
+    ],
+    "additionalProperties": False,
+}
+
+# Models that rejected response_format — skip structured output for them from then on
+_schema_unsupported: set[str] = set()
+_SCHEMA_ERROR_MARKERS = ("response_format", "json_schema", "structured output", "structured_output")
+
 ANALYZE_PROMPT = """你係一個網頁結構分析器。以下係一個產品頁面嘅 HTML 結構摘要。
 
 分析以下問題，回傳 JSON：
@@ -106,12 +135,127 @@ def _prepare_structural_sample(raw_html: str) -> str:
     return "\n\n".join(parts)
 
 
+def _repair_json(text: str) -> str:
+    """Best-effort repair of truncated / sloppy JSON from an LLM.
+
+    Keeps the first top-level object, closes unterminated strings and brackets,
+    and drops trailing commas and dangling keys.
+    """
+    start = text.find('{')
+    if start < 0:
+        return text
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            if not stack or stack[-1] != ch:
+                continue
+            stack.pop()
+        out.append(ch)
+        if not stack:
+            break
+    repaired = "".join(out)
+    if in_string:
+        repaired += '"'
+    if stack:
+        repaired = repaired.rstrip()
+        if stack[-1] == '}':
+            # Object member cut off before its value: drop `"key"` / `"key":`
+            repaired = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?$', r'\1', repaired)
+        repaired = re.sub(r'[,:]\s*$', '', repaired)
+        repaired += "".join(reversed(stack))
+    repaired = re.sub(r',(\s*[}\]])', r'\1', repaired)
+    repaired = re.sub(r'(:\s*)True\b', r'\1true', repaired)
+    repaired = re.sub(r'(:\s*)False\b', r'\1false', repaired)
+    return repaired
+
+
+def _parse_analysis_json(content: str) -> dict | None:
+    """Parse analyzer output, falling back to partial-JSON repair; records the outcome."""
+    content = content.strip()
+    content = re.sub(r'^```(?:json)?\s*', '', content)
+    content = re.sub(r'\s*```$', '', content)
+    try:
+        result = json.loads(content)
+        metrics.incr("ai_analyzer.parse", outcome="ok")
+        return result
+    except json.JSONDecodeError:
+        pass
+    try:
+        result = json.loads(_repair_json(content))
+        metrics.incr("ai_analyzer.parse", outcome="repaired")
+        return result
+    except json.JSONDecodeError:
+        metrics.incr("ai_analyzer.parse", outcome="failed")
+        logger.warning("Analyzer returned unparseable JSON: %.200s", content)
+        return None
+
+
+def _validate_analysis(result: dict) -> dict | None:
+    """Validate required fields and normalize optional ones (None if invalid)."""
+    if not isinstance(result, dict):
+        return None
+    if not isinstance(result.get("needs_javascript"), bool):
+        return None
+    if result.get("extraction_strategy") not in ("rule_based", "ai_extraction"):
+        return None
+
+    # Normalize new fields with safe defaults
+    if not isinstance(result.get("content_selectors"), list):
+        result["content_selectors"] = []
+    else:
+        result["content_selectors"] = [
+            s for s in result["content_selectors"]
+            if isinstance(s, str) and 0 < len(s) <= 100
+        ][:5]
+
+    if not isinstance(result.get("noise_selectors"), list):
+        result["noise_selectors"] = []
+    else:
+        result["noise_selectors"] = [
+            s for s in result["noise_selectors"]
+            if isinstance(s, str) and 0 < len(s) <= 100
+        ][:5]
+
+    if result.get("content_structure") not in ("semantic", "div_heavy", "mixed"):
+        result["content_structure"] = "mixed"
+
+    if not isinstance(result.get("content_language"), str):
+        result["content_language"] = ""
+
+    return result
+
+
+def _rejects_schema(error: BadRequestError) -> bool:
+    """Whether a 400 is about response_format / json_schema rather than the request as a whole."""
+    text = f"{error.message} {error.body}".lower()
+    return any(marker in text for marker in _SCHEMA_ERROR_MARKERS)
+
+
 async def analyze_page_structure(
     raw_html: str, url: str, api_key: str, model: str | None = None,
     reasoning_effort: str | None = None,
 ) -> dict | None:
     """Analyze page structure with AI to determine fetch method and extraction strategy.
 
+    Uses schema-constrained structured output where the model supports it, with a
+    tolerant JSON repair fallback. Runs through the model cascade: a fast model
+    first, escalating when its JSON does not validate.
     Returns {"needs_javascript": bool, "extraction_strategy": "rule_based"|"ai_extraction"}
     or None if analysis fails (caller should fall back to heuristics).
     """
@@ -120,68 +264,52 @@ async def analyze_page_structure(
         if not structural_sample or len(structural_sample) < 100:
             return None
 
-        client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            timeout=90,
+        prompt = ANALYZE_PROMPT.format(
+            url=url,
+            structural_sample=structural_sample,
         )
-        extra = {}
-        if reasoning_effort:
-            extra["extra_body"] = {"reasoning": {"effort": reasoning_effort}}
-        response = await client.chat.completions.create(
-            model=model or DEFAULT_MODEL,
-            temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": ANALYZE_PROMPT.format(
-                        url=url,
-                        structural_sample=structural_sample,
-                    ),
-                }
-            ],
-            **extra,
-        )
-        content = response.choices[0].message.content
-        if not content:
-            return None
 
-        # Strip markdown code block if present
-        content = content.strip()
-        content = re.sub(r'^```(?:json)?\s*', '', content)
-        content = re.sub(r'\s*```$', '', content)
-
-        result = json.loads(content)
-
-        # Validate required fields (return None if invalid)
-        if not isinstance(result.get("needs_javascript"), bool):
-            return None
-        if result.get("extraction_strategy") not in ("rule_based", "ai_extraction"):
-            return None
-
-        # Normalize new fields with safe defaults
-        if not isinstance(result.get("content_selectors"), list):
-            result["content_selectors"] = []
-        else:
-            result["content_selectors"] = [
-                s for s in result["content_selectors"]
-                if isinstance(s, str) and 0 < len(s) <= 100
-            ][:5]
-
-        if not isinstance(result.get("noise_selectors"), list):
-            result["noise_selectors"] = []
-        else:
-            result["noise_selectors"] = [
-                s for s in result["noise_selectors"]
-                if isinstance(s, str) and 0 < len(s) <= 100
-            ][:5]
-
-        if result.get("content_structure") not in ("semantic", "div_heavy", "mixed"):
-            result["content_structure"] = "mixed"
-
-        if not isinstance(result.get("content_language"), str):
-            result["content_language"] = ""
-
-        return result
+        async def _attempt(tier_model: str, tier_effort: str | None) -> dict | None:
+            content = None
+            if tier_model not in _schema_unsupported:
+                try:
+                    content = await chat_completion(
+                        "analyzer", api_key, tier_model, prompt,
+                        temperature=0, reasoning_effort=tier_effort,
+                        response_format={
+                            "type": "json_schema",
+                            "json_schema": {"name": "page_analysis", "strict": True, "schema": ANALYSIS_SCHEMA},
+                        },
+                    )
+                    metrics.incr("ai_analyzer.structured_output", mode="json_schema")
+                except BadRequestError as e:
+                    # Only a rejection of response_format itself is remembered for the model;
+                    # any other 400 just retries this call as free text
+                    if _rejects_schema(e):
+                        _schema_unsupported.add(tier_model)
+                        logger.info("Structured output unsupported for %s: %s", tier_model, e)
+                    else:
+                        logger.info("Structured request to %s failed, retrying as free text: %s", tier_model, e)
+            if content is None:
+                content = await chat_completion(
+                    "analyzer", api_key, tier_model, prompt,
+                    temperature=0, reasoning_effort=tier_effort,
+                )
+                metrics.incr("ai_analyzer.structured_output", mode="free_text")
+            if not content:
+                return None
+
+            result = _parse_analysis_json(content)
+            if result is None:
+                return None
+            validated = _validate_analysis(result)
+            if validated is None:
+                metrics.incr("ai_analyzer.invalid_schema")
+            return validated
+
+        return await run_cascade(
+            "analyzer", model or DEFAULT_MODEL, reasoning_effort,
+            _attempt, lambda result: result is not None,
+        )
     except Exception:
         return None
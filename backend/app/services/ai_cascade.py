@@ -0,0 +1,115 @@
+import html
+import json
+import logging
+import os
+import re
+from typing import Any, Awaitable, Callable
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cascade policy per AI stage: tiers are tried in order until one passes validation.
+# A tier is [model, effort]; null means "the model / effort requested for the job".
+# Opt-in (AI_CASCADE=on): the cheaper tiers run on models the user didn't pick, billed to their key.
+DEFAULT_POLICY = {
+    "analyzer": [["z-ai/glm-4.5-air", "low"], [None, None]],
+    "extractor": [["z-ai/glm-4.5-air", "low"], [None, None]],
+    "cleaner": [["z-ai/glm-4.5-air", "low"], [None, None]],
+}
+
+CASCADE_ENABLED = os.getenv("AI_CASCADE", "off").lower() in ("on", "1", "true")
+GROUNDING_THRESHOLD = 0.85
+
+
+def _load_policy() -> dict[str, list[list[str | None]]]:
+    policy = {stage: list(tiers) for stage, tiers in DEFAULT_POLICY.items()}
+    raw = os.getenv("AI_CASCADE_POLICY")
+    if raw:
+        try:
+            policy.update(json.loads(raw))
+        except (json.JSONDecodeError, TypeError):
+            logger.warning("Ignoring invalid AI_CASCADE_POLICY")
+    return policy
+
+
+POLICY = _load_policy()
+
+
+def cascade_tiers(stage: str, model: str, reasoning_effort: str | None) -> list[tuple[str, str | None]]:
+    """Resolve the (model, effort) tiers for a stage; the requested tier is always last."""
+    requested = (model, reasoning_effort)
+    if not CASCADE_ENABLED:
+        return [requested]
+    tiers = []
+    for tier_model, tier_effort in POLICY.get(stage, [[None, None]]):
+        tier = (tier_model or model, tier_effort if tier_model else (tier_effort or reasoning_effort))
+        if tier not in tiers:
+            tiers.append(tier)
+    if requested not in tiers:
+        tiers.append(requested)
+    return tiers
+
+
+async def run_cascade(
+    stage: str,
+    model: str,
+    reasoning_effort: str | None,
+    attempt: Callable[[str, str | None], Awaitable[Any]],
+    validate: Callable[[Any], bool],
+) -> Any:
+    """Try each tier of the stage's cascade; return the first result that passes validation.
+
+    Validation only decides whether to escalate: the last tier's result is returned as is
+    (None only if that tier failed too)."""
+    tiers = cascade_tiers(stage, model, reasoning_effort)
+    metrics.incr("ai_cascade.calls", stage=stage)
+    for index, (tier_model, tier_effort) in enumerate(tiers):
+        try:
+            result = await attempt(tier_model, tier_effort)
+        except Exception as e:
+            logger.warning("AI %s tier %d (%s) failed: %s", stage, index, tier_model, e)
+            result = None
+        last = index == len(tiers) - 1
+        if result is not None and validate(result):
+            metrics.incr("ai_cascade.accepted", stage=stage, tier=index)
+            return result
+        if last:
+            if result is not None:
+                metrics.incr("ai_cascade.accepted_unvalidated", stage=stage, tier=index)
+            return result
+        metrics.incr("ai_cascade.rejected", stage=stage, tier=index)
+        metrics.incr("ai_cascade.escalations", stage=stage)
+        logger.info("AI %s escalating from %s to %s", stage, tier_model, tiers[index + 1][0])
+    return None
+
+
+def escalation_rates() -> dict[str, dict]:
+    stats = {}
+    for stage in POLICY:
+        calls = metrics.counter("ai_cascade.calls", stage=stage)
+        escalations = metrics.counter("ai_cascade.escalations", stage=stage)
+        stats[stage] = {
+            "calls": calls,
+            "escalations": escalations,
+            "escalation_rate": round(escalations / calls, 4) if calls else None,
+        }
+    return stats
+
+
+def _shingles(text: str, size: int = 4) -> set[str]:
+    compact = re.sub(r'\s+', '', text).lower()
+    return {compact[i:i + size] for i in range(max(0, len(compact) - size + 1))}
+
+
+def is_grounded(output_html: str, source_text: str, threshold: float = GROUNDING_THRESHOLD) -> bool:
+    """Check that output HTML is non-empty and its text comes from the source (no invented text).
+
+    Compares character 4-gram shingles, which works for both CJK and Latin text.
+    """
+    output_text = html.unescape(re.sub(r'<[^>]+>', ' ', output_html or ""))
+    output = _shingles(output_text)
+    if not output:
+        return False
+    source = _shingles(source_text)
+    return len(output & source) / len(output) >= threshold
@@ -1,4 +1,8 @@
-from openai import AsyncOpenAI
+import html
+import re
+
+from app.services.ai_cascade import is_grounded, run_cascade
+from app.services.ai_client import chat_completion
 
 MAX_HTML_CHARS = 100_000
 
@@ -60,6 +64,7 @@ async def clean_description_with_ai(
 ) -> str:
     """用 OpenRouter AI 清理 description_html，移除重複/無關內容。
 
+    經 model cascade 執行：先用快速 model，輸出空白或者有原文冇嘅字就升級。
     如果 AI call 失敗，return 原本嘅 raw_html（graceful fallback）。
     """
     try:
@@ -68,27 +73,18 @@ async def clean_description_with_ai(
             raw_html=_truncate_html(raw_html),
         )
         prompt_text += _build_cleaner_hints(analysis)
+        source_text = html.unescape(re.sub(r'<[^>]+>', ' ', raw_html))
 
-        client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            timeout=90,
-        )
-        extra = {}
-        if reasoning_effort:
-            extra["extra_body"] = {"reasoning": {"effort": reasoning_effort}}
-        response = await client.chat.completions.create(
-            model=model or DEFAULT_MODEL,
-            temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt_text,
-                }
-            ],
-            **extra,
+        async def _attempt(tier_model: str, tier_effort: str | None) -> str | None:
+            return await chat_completion(
+                "cleaner", api_key, tier_model, prompt_text,
+                temperature=0, reasoning_effort=tier_effort,
+            ) or None
+
+        cleaned = await run_cascade(
+            "cleaner", model or DEFAULT_MODEL, reasoning_effort,
+            _attempt, lambda result: is_grounded(result, source_text),
         )
-        cleaned = response.choices[0].message.content
         if cleaned:
             return cleaned
         return raw_html
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    RateLimitError,
+)
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_TIMEOUT = 90  # seconds, per request
+MIN_CALL_BUDGET = 3  # don't start a request with less budget than this
+
+MAX_ATTEMPTS = max(1, int(os.getenv("AI_MAX_ATTEMPTS", "3")))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 10.0
+
+# Hedging: after the stage's latency percentile is exceeded, race a duplicate request on HEDGE_MODEL
+HEDGE_MODEL = os.getenv("AI_HEDGE_MODEL") or None
+HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = 20
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_MAX_CLIENTS = 32
+
+# Absolute deadline (loop.time()) of the job the current task belongs to
+_deadline: ContextVar[float | None] = ContextVar("ai_deadline", default=None)
+_clients: OrderedDict[str, AsyncOpenAI] = OrderedDict()
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Bound every AI call made in this context (and tasks spawned from it) by a shared budget."""
+    token = _deadline.set(asyncio.get_running_loop().time() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> float | None:
+    value = _deadline.get()
+    if value is None:
+        return None
+    return value - asyncio.get_running_loop().time()
+
+
+def get_client(api_key: str) -> AsyncOpenAI:
+    """Return a pooled OpenRouter client for this API key (connection pool is shared across calls)."""
+    client = _clients.get(api_key)
+    if client is None:
+        client = AsyncOpenAI(base_url=OPENROUTER_BASE_URL, api_key=api_key, timeout=DEFAULT_TIMEOUT, max_retries=0)
+        _clients[api_key] = client
+        while len(_clients) > _MAX_CLIENTS:
+            _clients.popitem(last=False)
+    else:
+        _clients.move_to_end(api_key)
+    return client
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APITimeoutError, APIConnectionError, RateLimitError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in _RETRYABLE_STATUS
+
+
+def _call_timeout() -> float:
+    budget = remaining_budget()
+    if budget is None:
+        return DEFAULT_TIMEOUT
+    if budget < MIN_CALL_BUDGET:
+        raise asyncio.TimeoutError("Job time budget exhausted before AI call")
+    return min(DEFAULT_TIMEOUT, budget - 1)
+
+
+async def _request(stage: str, client: AsyncOpenAI, model: str, messages: list[dict], timeout: float, **kwargs) -> str:
+    start = time.monotonic()
+    response = await client.with_options(timeout=timeout).chat.completions.create(
+        model=model, messages=messages, **kwargs,
+    )
+    metrics.observe("ai.latency", time.monotonic() - start, stage=stage)
+    return response.choices[0].message.content or ""
+
+
+async def _request_hedged(stage: str, client: AsyncOpenAI, model: str, messages: list[dict], timeout: float, **kwargs) -> str:
+    """Send the request; if it outlives the stage's latency percentile, race a copy on HEDGE_MODEL."""
+    delay = None
+    if HEDGE_MODEL and HEDGE_MODEL != model and metrics.sample_count("ai.latency", stage=stage) >= HEDGE_MIN_SAMPLES:
+        delay = metrics.percentile("ai.latency", HEDGE_PERCENTILE, stage=stage)
+    if delay is None or delay >= timeout:
+        return await _request(stage, client, model, messages, timeout, **kwargs)
+
+    primary = asyncio.create_task(_request(stage, client, model, messages, timeout, **kwargs))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if primary in done:
+            return primary.result()
+        metrics.incr("ai.hedges", stage=stage)
+        hedge = asyncio.create_task(_request(stage, client, HEDGE_MODEL, messages, timeout - delay, **kwargs))
+        tasks.add(hedge)
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        metrics.incr("ai.hedge_wins", stage=stage)
+                    return task.result()
+        # Both failed — surface the primary's error
+        return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def chat_completion(
+    stage: str,
+    api_key: str,
+    model: str,
+    prompt: str | list[dict],
+    *,
+    temperature: float = 0,
+    reasoning_effort: str | None = None,
+    **kwargs,
+) -> str:
+    """Shared OpenRouter call: jittered exponential backoff on transient errors,
+    per-request timeout clipped to the job's remaining budget, optional hedging.
+
+    Returns the message content ("" if empty). Non-transient errors (e.g. 400) are raised immediately.
+    """
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+    if reasoning_effort:
+        kwargs["extra_body"] = {**kwargs.get("extra_body", {}), "reasoning": {"effort": reasoning_effort}}
+    client = get_client(api_key)
+
+    for attempt in range(MAX_ATTEMPTS):
+        timeout = _call_timeout()
+        try:
+            return await _request_hedged(stage, client, model, messages, timeout, temperature=temperature, **kwargs)
+        except Exception as e:
+            metrics.incr("ai.errors", stage=stage, error=type(e).__name__)
+            if not _is_retryable(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            backoff = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            budget = remaining_budget()
+            if budget is not None and budget - backoff < MIN_CALL_BUDGET:
+                raise
+            metrics.incr("ai.retries", stage=stage)
+            logger.warning("AI %s call failed (%s), retry %d in %.1fs", stage, e, attempt + 1, backoff)
+            await asyncio.sleep(backoff)
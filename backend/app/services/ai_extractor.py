@@ -1,8 +1,30 @@
-from openai import AsyncOpenAI
-from bs4 import BeautifulSoup
+import asyncio
+import logging
+import os
+import re
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+from app.services.ai_cascade import is_grounded, run_cascade
+from app.services.ai_client import chat_completion
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
 
 MAX_HTML_CHARS = 100_000
 
+# Chunked (map-reduce) mode — used when the cleaned main content exceeds MAX_HTML_CHARS.
+# Every chunk is extracted; a page needing more than MAX_CHUNKS calls is left to the rule-based
+# extraction instead of being truncated.
+CHUNK_CHARS = 40_000
+MAX_CHUNKS = int(os.getenv("AI_MAX_CHUNKS", "8"))
+MAX_CONCURRENT_CHUNKS = 3
+BOUNDARY_NODES = 3  # trailing / leading nodes compared when merging neighbouring chunks
+_HEADING_TAGS = {'h2', 'h3', 'h4'}
+
+# Oversized containers whose children get re-wrapped per chunk (so rows/items keep their parent)
+_REWRAP_TAGS = {'table', 'thead', 'tbody', 'ul', 'ol'}
+
 REMOVE_SELECTORS = [
     'header', 'footer', 'nav',
     '[class*="cookie"]', '[class*="consent"]',
@@ -57,8 +79,8 @@ def _build_analysis_hints(analysis: dict | None) -> str:
     return "\n## 頁面結構提示\n" + "\n".join(f"- {p}" for p in parts)
 
 
-def _prepare_html(raw_html: str, analysis: dict | None = None) -> str:
-    """Clean and truncate raw HTML for AI extraction."""
+def _clean_main(raw_html: str, analysis: dict | None = None) -> Tag:
+    """Strip noise from raw HTML and return the main content element."""
     soup = BeautifulSoup(raw_html, 'lxml')
 
     for selector in REMOVE_SELECTORS:
@@ -74,16 +96,151 @@ def _prepare_html(raw_html: str, analysis: dict | None = None) -> str:
             except Exception:
                 pass
 
-    main = soup.find('main') or soup.find('body') or soup
-    html = str(main)
+    return soup.find('main') or soup.find('body') or soup
+
+
+def _split_blocks(node: Tag, max_chars: int) -> list[str]:
+    """Split a DOM subtree into block-level HTML fragments no longer than max_chars.
+
+    Oversized elements are recursed into; table/list containers re-wrap each group
+    of children so rows and items keep a valid parent.
+    """
+    blocks = []
+    for child in node.children:
+        if isinstance(child, NavigableString):
+            text = str(child)
+            if text.strip():
+                blocks.extend(text[i:i + max_chars] for i in range(0, len(text), max_chars))
+            continue
+        if not isinstance(child, Tag):
+            continue
+        html = str(child)
+        if len(html) <= max_chars:
+            blocks.append(html)
+            continue
+        inner = _split_blocks(child, max_chars)
+        if child.name in _REWRAP_TAGS:
+            wrapper = len(child.name) * 2 + 5
+            inner = [f"<{child.name}>{part}</{child.name}>" for part in _pack_chunks(inner, max_chars - wrapper)]
+        blocks.extend(inner)
+    return blocks
+
+
+def _pack_chunks(blocks: list[str], max_chars: int) -> list[str]:
+    """Greedily pack consecutive blocks into chunks of at most max_chars, keeping order."""
+    chunks = []
+    current = []
+    size = 0
+    for block in blocks:
+        if current and size + len(block) > max_chars:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(block)
+        size += len(block)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def _norm_text(node) -> str:
+    text = node.get_text(" ") if isinstance(node, Tag) else str(node)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _boundary_overlap(previous: list, nodes: list) -> int:
+    """How many leading nodes of a chunk repeat the end of the previous one: the longest run that
+    matches its last nodes, or a re-opened heading of the section the chunk continues."""
+    before = [_norm_text(node) for node in previous[-BOUNDARY_NODES:]]
+    after = [_norm_text(node) for node in nodes[:BOUNDARY_NODES]]
+    for size in range(min(len(before), len(after)), 0, -1):
+        if before[-size:] == after[:size]:
+            return size
+    if nodes and isinstance(nodes[0], Tag) and nodes[0].name in _HEADING_TAGS:
+        last_heading = next((node for node in reversed(previous) if isinstance(node, Tag) and node.name in _HEADING_TAGS), None)
+        if last_heading is not None and _norm_text(last_heading) == after[0]:
+            return 1
+    return 0
+
+
+def _merge_chunk_results(results: list[str]) -> str:
+    """Concatenate per-chunk HTML in order. Only content repeated across a chunk boundary is
+    dropped — blocks that legitimately recur (a "規格" heading per section) are kept."""
+    merged = []
+    for html in results:
+        if not html:
+            continue
+        nodes = [node for node in BeautifulSoup(html, 'html.parser').contents if _norm_text(node)]
+        merged.extend(nodes[_boundary_overlap(merged, nodes):])
+    return "\n".join(str(node).strip() for node in merged)
+
 
-    if len(html) <= MAX_HTML_CHARS:
-        return html
-    truncated = html[:MAX_HTML_CHARS]
-    last_close = truncated.rfind('>')
-    if last_close > MAX_HTML_CHARS * 0.8:
-        truncated = truncated[:last_close + 1]
-    return truncated
+async def _call_extractor(
+    prompt: str,
+    api_key: str,
+    model: str | None,
+    reasoning_effort: str | None,
+) -> str:
+    result = await chat_completion(
+        "extractor", api_key, model or DEFAULT_MODEL, prompt,
+        temperature=0, reasoning_effort=reasoning_effort,
+    )
+    return result.strip()
+
+
+def _build_prompt(
+    product_name: str,
+    html: str,
+    analysis: dict | None,
+    extra_instructions: str,
+    part: tuple[int, int] | None = None,
+) -> str:
+    hints = _build_analysis_hints(analysis)
+    if part:
+        hints += f"\n注意：以下只係頁面第 {part[0]}/{part[1]} 部分，只需提取呢部分嘅產品描述。"
+    prompt = EXTRACT_PROMPT.format(
+        product_name=product_name,
+        analysis_hints=hints,
+        html=html,
+    )
+    if extra_instructions:
+        prompt += f"\n\n## 用戶額外指示\n{extra_instructions}"
+    return prompt
+
+
+async def _extract_chunked(
+    chunks: list[str],
+    product_name: str,
+    api_key: str,
+    model: str | None,
+    analysis: dict | None,
+    extra_instructions: str,
+    reasoning_effort: str | None,
+) -> str | None:
+    """Map-reduce extraction: extract the chunks (split at block boundaries) concurrently, merge in order.
+
+    None if any chunk failed — a merge missing sections would pass for a complete description.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+
+    async def _run(index: int, chunk: str) -> str | None:
+        if len(chunk) < 100:
+            return ""
+        async with semaphore:
+            try:
+                prompt = _build_prompt(
+                    product_name, chunk, analysis, extra_instructions,
+                    part=(index + 1, len(chunks)),
+                )
+                return await _call_extractor(prompt, api_key, model, reasoning_effort)
+            except Exception as e:
+                metrics.incr("ai_extractor.chunk_failures")
+                logger.warning("Extraction of chunk %d/%d failed: %s", index + 1, len(chunks), e)
+                return None
+
+    results = await asyncio.gather(*(_run(i, c) for i, c in enumerate(chunks)))
+    if any(result is None for result in results):
+        return None
+    return _merge_chunk_results(list(results))
 
 
 async def extract_description_with_ai(
@@ -97,41 +254,39 @@ async def extract_description_with_ai(
 ) -> str:
     """用 AI 從 raw HTML 提取產品描述。
 
-    如果 AI call 失敗，return 空 string（caller 會 fall back 用 rule-based 結果）。
+    內容超過 MAX_HTML_CHARS 時改用 chunked mode（分段並行提取再合併），唔會截斷；
+    需要超過 MAX_CHUNKS 段就唔用 AI（return 空 string）。
+    經 model cascade 執行：快速 model 輸出空白或者有原文冇嘅字先升級。
+    如果 AI call（或者 chunked mode 任何一段）失敗，return 空 string（caller 會 fall back 用 rule-based 結果）。
     """
     try:
-        prepared = _prepare_html(raw_html, analysis)
+        main = _clean_main(raw_html, analysis)
+        prepared = str(main)
         if not prepared or len(prepared) < 100:
             return ""
+        source_text = main.get_text(" ")
+        chunks = None
+        if len(prepared) > MAX_HTML_CHARS:
+            chunks = _pack_chunks(_split_blocks(main, CHUNK_CHARS), CHUNK_CHARS)
+            metrics.observe("ai_extractor.chunks", len(chunks))
+            if len(chunks) > MAX_CHUNKS:
+                metrics.incr("ai_extractor.too_large")
+                logger.info("Page needs %d chunks (max %d); leaving it to rule-based extraction", len(chunks), MAX_CHUNKS)
+                return ""
 
-        prompt = EXTRACT_PROMPT.format(
-            product_name=product_name,
-            analysis_hints=_build_analysis_hints(analysis),
-            html=prepared,
-        )
-        if extra_instructions:
-            prompt += f"\n\n## 用戶額外指示\n{extra_instructions}"
+        async def _attempt(tier_model: str, tier_effort: str | None) -> str | None:
+            if chunks is not None:
+                return await _extract_chunked(
+                    chunks, product_name, api_key, tier_model,
+                    analysis, extra_instructions, tier_effort,
+                )
+            prompt = _build_prompt(product_name, prepared, analysis, extra_instructions)
+            return await _call_extractor(prompt, api_key, tier_model, tier_effort)
 
-        client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            timeout=90,
-        )
-        extra = {}
-        if reasoning_effort:
-            extra["extra_body"] = {"reasoning": {"effort": reasoning_effort}}
-        response = await client.chat.completions.create(
-            model=model or DEFAULT_MODEL,
-            temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
-            **extra,
+        result = await run_cascade(
+            "extractor", model or DEFAULT_MODEL, reasoning_effort,
+            _attempt, lambda html: is_grounded(html, source_text),
         )
-        result = response.choices[0].message.content
-        return result.strip() if result else ""
+        return result or ""
     except Exception:
         return ""
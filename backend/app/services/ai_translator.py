@@ -1,36 +1,37 @@
+import asyncio
+import json
 import logging
 import re
 
-from openai import AsyncOpenAI
+from app.services import translation_memory
+from app.services.ai_client import chat_completion
 
 logger = logging.getLogger(__name__)
 
-MAX_HTML_CHARS = 100_000
 DEFAULT_MODEL = "z-ai/glm-5"
 
-TRANSLATE_PROMPT_ZH_TO_EN = """You are a professional translator. Translate the following HTML content from Traditional Chinese (繁體中文) to English.
+# Segments are sent as a JSON array; inline tags are replaced with <tN>/</tN>/<tN/> placeholders
+TRANSLATE_PROMPT_ZH_TO_EN = """You are a professional translator. Translate each string in the JSON array below from Traditional Chinese (繁體中文) to English.
 
 CRITICAL RULES:
-1. Preserve ALL HTML tags, attributes, inline styles, and structure exactly as-is.
-2. Only translate the visible text content between HTML tags.
-3. Do not add, remove, or reorder any HTML elements.
-4. Do not translate content inside HTML attributes (class names, style values, href, src, etc.).
-5. Maintain the same paragraph structure and formatting.
+1. Return a JSON array of strings with exactly the same number of items, in the same order.
+2. Keep every placeholder tag such as <t0>, </t0>, <t1/> exactly as-is, around the corresponding words.
+3. Do not merge, split, drop or reorder items.
+4. Keep numbers, units and model numbers unchanged.
 
-Output the translated HTML directly. Do not wrap in markdown code blocks. Do not add explanations.
+Output the JSON array only. Do not wrap in markdown code blocks. Do not add explanations.
 
 ---
-{html}"""
+{segments}"""
 
-TRANSLATE_PROMPT_EN_TO_ZH = """You are a professional translator. Translate the following HTML content from English to Traditional Chinese (繁體中文).
+TRANSLATE_PROMPT_EN_TO_ZH = """You are a professional translator. Translate each string in the JSON array below from English to Traditional Chinese (繁體中文).
 
 CRITICAL RULES:
-1. Preserve ALL HTML tags, attributes, inline styles, and structure exactly as-is.
-2. Only translate the visible text content between HTML tags.
-3. Do not add, remove, or reorder any HTML elements.
-4. Do not translate content inside HTML attributes (class names, style values, href, src, etc.).
-5. Maintain the same paragraph structure and formatting.
-6. IMPORTANT: Keep the following types of terms in their original English form — do NOT translate them:
+1. Return a JSON array of strings with exactly the same number of items, in the same order.
+2. Keep every placeholder tag such as <t0>, </t0>, <t1/> exactly as-is, around the corresponding words.
+3. Do not merge, split, drop or reorder items.
+4. Keep numbers, units and model numbers unchanged.
+5. IMPORTANT: Keep the following types of terms in their original English form — do NOT translate them:
    - Brand names (e.g., Google, Apple, Anthropic, ASUS, Samsung, Sony, Microsoft, Amazon, Dell, HP, Lenovo, LG, Panasonic, Canon, Nikon, Dyson, Bose, JBL, Razer, Logitech)
    - Product names (e.g., iPhone, MacBook, Galaxy, PlayStation, Surface, Pixel, AirPods, iPad, HomePod, Chromebook, ThinkPad, ROG, ZenBook)
    - Technical standards and interfaces (e.g., USB-C, USB 3.2, USB4, Wi-Fi, Wi-Fi 6E, Wi-Fi 7, Bluetooth, Bluetooth 5.3, HDMI, HDMI 2.1, NFC, Thunderbolt, DisplayPort, PCIe, DDR5, MagSafe, Lightning, Qi, Miracast)
@@ -39,29 +40,219 @@ CRITICAL RULES:
    - Industry terms commonly kept in English in Traditional Chinese tech writing
    When in doubt, keep the English term.
 
-Output the translated HTML directly. Do not wrap in markdown code blocks. Do not add explanations.
+Output the JSON array only. Do not wrap in markdown code blocks. Do not add explanations.
 
 ---
-{html}"""
+{segments}"""
 
+# Tags that stay inside a text segment — every other tag is a segment boundary
+_INLINE_TAGS = {'strong', 'em', 'b', 'i', 'u', 'span', 'a', 'br', 'small', 'sup', 'sub', 'code', 'mark'}
+_RAW_TEXT_TAGS = {'script', 'style'}
+_TOKEN_RE = re.compile(r'(<!--.*?-->|<[^>]+>)', re.S)
+_TAG_NAME_RE = re.compile(r'^</?\s*([a-zA-Z0-9]+)')
+_PLACEHOLDER_RE = re.compile(r'</?t\d+/?>')
+_CJK_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+_LATIN_RE = re.compile(r'[A-Za-z]')
 
-def _truncate_html(html: str) -> str:
-    if len(html) <= MAX_HTML_CHARS:
-        return html
-    truncated = html[:MAX_HTML_CHARS]
-    last_close = truncated.rfind('>')
-    if last_close > MAX_HTML_CHARS * 0.8:
-        truncated = truncated[:last_close + 1]
-    return truncated
+MAX_BATCH_CHARS = 12_000
+MAX_BATCH_SEGMENTS = 150
+MAX_CONCURRENT_BATCHES = 3
+
+# Misses currently being translated, shared between concurrent calls (html + shopline)
+_inflight: dict[tuple[str, str], asyncio.Future] = {}
 
 
 def _strip_code_block(text: str) -> str:
     text = text.strip()
-    text = re.sub(r'^```(?:html)?\s*\n?', '', text)
+    text = re.sub(r'^```(?:html|json)?\s*\n?', '', text)
     text = re.sub(r'\n?```\s*$', '', text)
     return text.strip()
 
 
+def _segment_html(html: str) -> list[str | tuple[str, str, str]]:
+    """Split HTML into markup pieces and translatable text runs.
+
+    Plain strings are emitted verbatim; tuples are (leading_ws, segment, trailing_ws)
+    where segment is a run of text and inline tags between two block boundaries.
+    """
+    parts: list[str | tuple[str, str, str]] = []
+    run: list[str] = []
+    raw_text_tag = None
+
+    def _flush():
+        text = "".join(run)
+        run.clear()
+        if not text:
+            return
+        core = text.strip()
+        if not re.sub(r'<[^>]+>', '', core).strip():
+            parts.append(text)
+            return
+        start = text.index(core)
+        parts.append((text[:start], core, text[start + len(core):]))
+
+    for token in _TOKEN_RE.split(html):
+        if not token:
+            continue
+        if raw_text_tag:
+            parts.append(token)
+            if re.match(rf'^</\s*{raw_text_tag}\b', token, re.I):
+                raw_text_tag = None
+            continue
+        if not token.startswith('<'):
+            run.append(token)
+            continue
+        match = _TAG_NAME_RE.match(token)
+        name = match.group(1).lower() if match else ""
+        if name in _INLINE_TAGS:
+            run.append(token)
+            continue
+        _flush()
+        parts.append(token)
+        if name in _RAW_TEXT_TAGS and not token.startswith('</'):
+            raw_text_tag = name
+    _flush()
+    return parts
+
+
+def _to_placeholders(segment: str) -> tuple[str, dict[str, str]]:
+    """Replace inline tags with numbered placeholders; return (text, {placeholder: tag})."""
+    mapping: dict[str, str] = {}
+    stack: list[int] = []
+    counter = 0
+
+    def _sub(match: re.Match) -> str:
+        nonlocal counter
+        tag = match.group(0)
+        name_match = _TAG_NAME_RE.match(tag)
+        name = name_match.group(1).lower() if name_match else ""
+        if tag.startswith('</'):
+            if stack:
+                index = stack.pop()
+            else:
+                index = counter
+                counter += 1
+            placeholder = f"</t{index}>"
+        elif tag.endswith('/>') or name == 'br':
+            placeholder = f"<t{counter}/>"
+            counter += 1
+        else:
+            stack.append(counter)
+            placeholder = f"<t{counter}>"
+            counter += 1
+        mapping[placeholder] = tag
+        return placeholder
+
+    return _TOKEN_RE.sub(_sub, segment), mapping
+
+
+def _needs_translation(text: str, target_language: str) -> bool:
+    plain = _PLACEHOLDER_RE.sub('', text)
+    if target_language == "en":
+        return bool(_CJK_RE.search(plain))
+    return bool(_LATIN_RE.search(plain))
+
+
+def _placeholders_match(source: str, translation: str) -> bool:
+    return sorted(_PLACEHOLDER_RE.findall(source)) == sorted(_PLACEHOLDER_RE.findall(translation))
+
+
+def _parse_translations(content: str, expected: int) -> list[str] | None:
+    try:
+        data = json.loads(_strip_code_block(content))
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(data, list) or len(data) != expected:
+        return None
+    if not all(isinstance(item, str) for item in data):
+        return None
+    return data
+
+
+def _make_batches(sources: list[str]) -> list[list[str]]:
+    batches = []
+    current: list[str] = []
+    size = 0
+    for source in sources:
+        if current and (size + len(source) > MAX_BATCH_CHARS or len(current) >= MAX_BATCH_SEGMENTS):
+            batches.append(current)
+            current, size = [], 0
+        current.append(source)
+        size += len(source)
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _translate_batch(
+    batch: list[str],
+    target_language: str,
+    api_key: str,
+    model: str | None,
+) -> dict[str, str]:
+    prompt = TRANSLATE_PROMPT_ZH_TO_EN if target_language == "en" else TRANSLATE_PROMPT_EN_TO_ZH
+    content = await chat_completion(
+        "translator", api_key, model or DEFAULT_MODEL,
+        prompt.format(segments=json.dumps(batch, ensure_ascii=False)),
+        temperature=0.3,
+    )
+    translations = _parse_translations(content, len(batch))
+    if translations is None:
+        logger.warning("Translation batch returned malformed output (%d segments)", len(batch))
+        return {}
+    return {
+        source: translated.strip()
+        for source, translated in zip(batch, translations)
+        if translated.strip() and _placeholders_match(source, translated)
+    }
+
+
+async def _translate_misses(
+    misses: list[str],
+    target_language: str,
+    api_key: str,
+    model: str | None,
+) -> dict[str, str]:
+    """Batch translation-memory misses to the LLM, sharing in-flight work with concurrent calls."""
+    loop = asyncio.get_running_loop()
+    waiting = {}
+    owned = []
+    for source in misses:
+        key = (target_language, source)
+        if key in _inflight:
+            waiting[source] = _inflight[key]
+        else:
+            _inflight[key] = loop.create_future()
+            owned.append(source)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+
+    async def _run(batch: list[str]) -> dict[str, str]:
+        async with semaphore:
+            try:
+                return await _translate_batch(batch, target_language, api_key, model)
+            except Exception:
+                logger.exception("Translation batch failed (target=%s)", target_language)
+                return {}
+
+    translated: dict[str, str] = {}
+    try:
+        for result in await asyncio.gather(*(_run(b) for b in _make_batches(owned))):
+            translated.update(result)
+        await asyncio.to_thread(translation_memory.store, target_language, translated)
+    finally:
+        for source in owned:
+            future = _inflight.pop((target_language, source))
+            if not future.done():
+                future.set_result(translated.get(source))
+
+    for source, future in waiting.items():
+        result = await future
+        if result:
+            translated[source] = result
+    return translated
+
+
 async def translate_html(
     html: str,
     target_language: str,
@@ -70,31 +261,46 @@ async def translate_html(
 ) -> str:
     """Translate HTML content between Traditional Chinese and English.
 
-    Returns original html on failure (graceful fallback).
+    Markup stays local: text segments are looked up in the translation memory
+    and only misses go to the LLM. Returns original text for any segment that
+    could not be translated (graceful fallback).
     """
     if not html or not html.strip():
         return html
 
     try:
-        if target_language == "en":
-            prompt_text = TRANSLATE_PROMPT_ZH_TO_EN.format(html=_truncate_html(html))
-        else:
-            prompt_text = TRANSLATE_PROMPT_EN_TO_ZH.format(html=_truncate_html(html))
+        parts = _segment_html(html)
+        segments = {}
+        for part in parts:
+            if isinstance(part, tuple) and part[1] not in segments:
+                text, mapping = _to_placeholders(part[1])
+                text = re.sub(r'\s+', ' ', text).strip()
+                if _needs_translation(text, target_language):
+                    segments[part[1]] = (text, mapping)
 
-        client = AsyncOpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-            timeout=90,
-        )
-        response = await client.chat.completions.create(
-            model=model or DEFAULT_MODEL,
-            temperature=0.3,
-            messages=[{"role": "user", "content": prompt_text}],
+        sources = list(dict.fromkeys(text for text, _ in segments.values()))
+        translated = await asyncio.to_thread(translation_memory.lookup, target_language, sources)
+        misses = [s for s in sources if s not in translated]
+        if misses:
+            translated.update(await _translate_misses(misses, target_language, api_key, model))
+        logger.info(
+            "Translation memory: %d segments, %d hits, %d misses (target=%s)",
+            len(sources), len(sources) - len(misses), len(misses), target_language,
         )
-        translated = response.choices[0].message.content
-        if translated:
-            return _strip_code_block(translated)
-        return html
+
+        output = []
+        for part in parts:
+            if isinstance(part, str):
+                output.append(part)
+                continue
+            leading, segment, trailing = part
+            entry = segments.get(segment)
+            result = translated.get(entry[0]) if entry else None
+            if result:
+                mapping = entry[1]
+                segment = _PLACEHOLDER_RE.sub(lambda m: mapping.get(m.group(0), ""), result)
+            output.append(f"{leading}{segment}{trailing}")
+        return "".join(output)
     except Exception:
         logger.exception("Translation failed (target=%s)", target_language)
         return html
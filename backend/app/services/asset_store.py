@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import threading
+import time
+
+from app.utils import metrics
+
+# Processed product images shared across jobs. An asset is keyed by the SHA-256 of the downloaded
+# original and holds its derivative (800x800 main or 1280px gallery JPEG). Source URLs map to the
+# asset they last yielded, and a perceptual-hash index finds the same picture at another size or
+# encoding — so repeated images are neither downloaded nor processed again. The perceptual hash is
+# greyscale, so a match must also agree on colour: colour variants of one shot stay distinct.
+ASSET_DIR = os.getenv("ASSET_DIR", "/tmp/scraper_assets")
+ASSET_TTL_HOURS = float(os.getenv("ASSET_TTL_HOURS", "24"))  # unused assets (and URL mappings) expire
+ASSET_MAX_MB = float(os.getenv("ASSET_MAX_MB", "2048"))
+PHASH_MAX_DISTANCE = 6  # differing bits for two images to count as the same picture
+PHASH_BANDS = 8  # 8-bit bands: within PHASH_MAX_DISTANCE (< PHASH_BANDS), some band matches exactly
+COLOUR_MAX_DISTANCE = 24  # largest per-quadrant channel-mean difference (0-255) for the same picture
+
+_conn: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(ASSET_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(ASSET_DIR, "assets.db"), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # kind NULL: the original was unusable (too small, undecodable) — remembered so it isn't retried
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS assets ("
+            " hash TEXT PRIMARY KEY,"
+            " phash TEXT,"
+            " colour BLOB,"
+            " kind TEXT,"
+            " width INTEGER,"
+            " height INTEGER,"
+            " source_pixels INTEGER,"
+            " bytes INTEGER NOT NULL DEFAULT 0,"
+            " used_at REAL NOT NULL)"
+        )
+        if "colour" not in {row[1] for row in conn.execute("PRAGMA table_info(assets)")}:
+            conn.execute("ALTER TABLE assets ADD COLUMN colour BLOB")  # stores from before colour matching
+        conn.execute("CREATE INDEX IF NOT EXISTS assets_used_at ON assets (used_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " url TEXT PRIMARY KEY,"
+            " hash TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS phash_bands ("
+            " band INTEGER NOT NULL,"
+            " value INTEGER NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " PRIMARY KEY (band, value, hash))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS phash_bands_hash ON phash_bands (hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sources_hash ON sources (hash)")
+        _conn = conn
+    return _conn
+
+
+def path(asset_hash: str) -> str:
+    return os.path.join(ASSET_DIR, asset_hash[:2], f"{asset_hash}.jpg")
+
+
+def _bands(phash: int) -> list[tuple[int, int]]:
+    return [(band, (phash >> (8 * band)) & 0xFF) for band in range(PHASH_BANDS)]
+
+
+def _matches(phash_a: int, colour_a: bytes, phash_b: int, colour_b: bytes) -> bool:
+    return (bin(phash_a ^ phash_b).count("1") <= PHASH_MAX_DISTANCE
+            and max(abs(x - y) for x, y in zip(colour_a, colour_b)) <= COLOUR_MAX_DISTANCE)
+
+
+def same_picture(a: dict, b: dict) -> bool:
+    if a["hash"] == b["hash"]:
+        return True
+    if None in (a["phash"], b["phash"], a["colour"], b["colour"]):
+        return False
+    return _matches(a["phash"], a["colour"], b["phash"], b["colour"])
+
+
+_COLUMNS = "hash, phash, colour, kind, width, height, source_pixels"
+
+
+def _row_to_asset(row) -> dict:
+    asset_hash, phash, colour, kind, width, height, source_pixels = row
+    return dict(hash=asset_hash, phash=int(phash, 16) if phash else None, colour=colour, kind=kind,
+                width=width, height=height, source_pixels=source_pixels)
+
+
+def _get(conn: sqlite3.Connection, asset_hash: str) -> dict | None:
+    row = conn.execute(f"SELECT {_COLUMNS} FROM assets WHERE hash = ?", (asset_hash,)).fetchone()
+    if row is None:
+        return None
+    asset = _row_to_asset(row)
+    if asset["kind"] and not os.path.exists(path(asset_hash)):
+        return None  # derivative evicted or lost
+    conn.execute("UPDATE assets SET used_at = ? WHERE hash = ?", (time.time(), asset_hash))
+    conn.commit()
+    return asset
+
+
+def by_url(url: str) -> dict | None:
+    """Asset this URL yielded within the TTL (no download needed)."""
+    cutoff = time.time() - ASSET_TTL_HOURS * 3600
+    with _lock:
+        conn = _connect()
+        row = conn.execute("SELECT hash FROM sources WHERE url = ? AND fetched_at >= ?", (url, cutoff)).fetchone()
+        return _get(conn, row[0]) if row else None
+
+
+def by_hash(asset_hash: str) -> dict | None:
+    with _lock:
+        return _get(_connect(), asset_hash)
+
+
+def similar(phash: int, colour: bytes, source_pixels: int) -> dict | None:
+    """A usable asset of the same picture (and colour) whose original was at least this large."""
+    with _lock:
+        conn = _connect()
+        candidates = set()
+        for band, value in _bands(phash):
+            candidates.update(row[0] for row in conn.execute(
+                "SELECT hash FROM phash_bands WHERE band = ? AND value = ?", (band, value),
+            ))
+        best = None
+        for asset_hash in candidates:
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM assets"
+                " WHERE hash = ? AND kind IS NOT NULL AND colour IS NOT NULL AND source_pixels >= ?",
+                (asset_hash, source_pixels),
+            ).fetchone()
+            if row is None or not _matches(int(row[1], 16), row[2], phash, colour):
+                continue
+            if best is None or row[6] > best[6]:
+                best = row
+        return _get(conn, best[0]) if best else None
+
+
+def _link(conn: sqlite3.Connection, url: str, asset_hash: str):
+    conn.execute(
+        "INSERT INTO sources (url, hash, fetched_at) VALUES (?, ?, ?)"
+        " ON CONFLICT(url) DO UPDATE SET hash = excluded.hash, fetched_at = excluded.fetched_at",
+        (url, asset_hash, time.time()),
+    )
+
+
+def link(url: str, asset_hash: str):
+    """Remember that url yielded this asset."""
+    with _lock:
+        conn = _connect()
+        _link(conn, url, asset_hash)
+        conn.commit()
+
+
+def put(asset_hash: str, url: str, phash: int | None = None, colour: bytes | None = None, kind: str | None = None,
+        jpeg: bytes = b"", width: int | None = None, height: int | None = None, source_pixels: int | None = None) -> dict:
+    """Store a processed original (or, with no kind, mark it unusable) and link url to it."""
+    if kind:
+        target = path(asset_hash)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".tmp", "wb") as f:
+            f.write(jpeg)
+        os.replace(target + ".tmp", target)
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO assets (hash, phash, colour, kind, width, height, source_pixels, bytes, used_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (asset_hash, f"{phash:016x}" if phash is not None else None, colour, kind, width, height,
+             source_pixels, len(jpeg), time.time()),
+        )
+        if kind and phash is not None and colour is not None:
+            conn.executemany(
+                "INSERT OR IGNORE INTO phash_bands (band, value, hash) VALUES (?, ?, ?)",
+                [(band, value, asset_hash) for band, value in _bands(phash)],
+            )
+        _link(conn, url, asset_hash)
+        conn.commit()
+    return dict(hash=asset_hash, phash=phash, colour=colour, kind=kind, width=width, height=height,
+                source_pixels=source_pixels)
+
+
+def _delete(conn: sqlite3.Connection, hashes: list[str]):
+    for asset_hash in hashes:
+        try:
+            os.remove(path(asset_hash))
+        except FileNotFoundError:
+            pass
+    conn.executemany("DELETE FROM assets WHERE hash = ?", [(h,) for h in hashes])
+    conn.executemany("DELETE FROM phash_bands WHERE hash = ?", [(h,) for h in hashes])
+    conn.executemany("DELETE FROM sources WHERE hash = ?", [(h,) for h in hashes])
+
+
+def purge(pinned: set[str] = frozenset()):
+    """Drop assets unused for ASSET_TTL_HOURS, then least recently used ones beyond ASSET_MAX_MB.
+    Pinned assets (referenced by live jobs, whose ZIPs read them) are kept either way."""
+    cutoff = time.time() - ASSET_TTL_HOURS * 3600
+    with _lock:
+        conn = _connect()
+        expired = [row[0] for row in conn.execute("SELECT hash FROM assets WHERE used_at < ?", (cutoff,))
+                   if row[0] not in pinned]
+        _delete(conn, expired)
+        conn.execute("DELETE FROM sources WHERE fetched_at < ?", (cutoff,))
+        over = []
+        remaining = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM assets").fetchone()[0] - ASSET_MAX_MB * 1024 * 1024
+        if remaining > 0:
+            for asset_hash, size in conn.execute("SELECT hash, bytes FROM assets ORDER BY used_at"):
+                if remaining <= 0:
+                    break
+                if asset_hash in pinned:
+                    continue
+                over.append(asset_hash)
+                remaining -= size
+            _delete(conn, over)
+        conn.commit()
+        disk_bytes = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM assets").fetchone()[0]
+    metrics.set_gauge("assets.disk_bytes", disk_bytes)
+    if expired or over:
+        metrics.incr("assets.evicted", len(expired) + len(over))
+
+
+def hit_rates() -> dict:
+    """Share of image lookups answered by the store, per kind of hit."""
+    outcomes = ("url", "content", "perceptual", "miss")
+    counts = {outcome: metrics.counter("assets.lookups", outcome=outcome) for outcome in outcomes}
+    total = sum(counts.values())
+    return {
+        "lookups": total,
+        **{f"{outcome}_hits": counts[outcome] for outcome in outcomes[:-1]},
+        "hit_rate": round((total - counts["miss"]) / total, 4) if total else None,
+    }
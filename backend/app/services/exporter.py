@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import re
+
+from app.models.schemas import ProductResult
+from app.services.packager import ZipStream, package_files
+
+# Catalog exports of many jobs, written one product at a time so memory stays flat
+# however many products are included (a ZIP keeps only its central directory records).
+
+# Generic product CSV — one row per product, columns named after the ProductResult fields.
+# For importing into Shopline, use the "shopline" format below.
+CSV_COLUMNS = (
+    "product_name",
+    "product_model",
+    "summary",
+    "description",
+    "description_html",
+    "description_shopline",
+    "source_url",
+)
+
+
+class CsvExport:
+    media_type = "text/csv; charset=utf-8"
+    extension = "csv"
+
+    def _row(self, values: list[str]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue().encode("utf-8")
+
+    def start(self) -> bytes:
+        # BOM so spreadsheet apps read the Chinese text as UTF-8
+        return "\ufeff".encode("utf-8") + self._row(list(CSV_COLUMNS))
+
+    def add(self, job_id: str, result: ProductResult) -> bytes:
+        return self._row([getattr(result, field) for field in CSV_COLUMNS])
+
+    def finish(self) -> bytes:
+        return b""
+
+
+# Shopline product import layout (Shopify-compatible): one row per product, then one extra row per
+# further image that repeats only the Handle. Images are referenced by their source URLs.
+SHOPLINE_COLUMNS = (
+    "Handle",
+    "Title",
+    "Body (HTML)",
+    "Variant SKU",
+    "SEO Description",
+    "Published",
+    "Image Src",
+    "Image Position",
+    "Image Alt Text",
+)
+
+
+class ShoplineCsvExport(CsvExport):
+    def __init__(self):
+        self._handles: set[str] = set()
+
+    def _handle(self, job_id: str, result: ProductResult) -> str:
+        handle = re.sub(r"[^a-z0-9]+", "-", (result.product_model or result.product_name).lower()).strip("-")
+        handle = handle or f"product-{job_id[:8]}"
+        if handle in self._handles:
+            handle = f"{handle}-{job_id[:8]}"
+        self._handles.add(handle)
+        return handle
+
+    def start(self) -> bytes:
+        return "\ufeff".encode("utf-8") + self._row(list(SHOPLINE_COLUMNS))
+
+    def add(self, job_id: str, result: ProductResult) -> bytes:
+        handle = self._handle(job_id, result)
+        images = [image.source_url for image in result.images] or [""]
+        rows = [self._row([
+            handle, result.product_name, result.description_shopline or result.description_html,
+            result.product_model, result.summary, "TRUE", images[0], "1" if images[0] else "",
+            result.product_name if images[0] else "",
+        ])]
+        for position, url in enumerate(images[1:], start=2):
+            rows.append(self._row([handle, "", "", "", "", "", url, str(position), result.product_name]))
+        return b"".join(rows)
+
+
+class NdjsonExport:
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def start(self) -> bytes:
+        return b""
+
+    def add(self, job_id: str, result: ProductResult) -> bytes:
+        line = {"job_id": job_id, **result.model_dump()}
+        return json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class ZipExport:
+    """One folder per product (named after its model) holding that product's package files."""
+
+    media_type = "application/zip"
+    extension = "zip"
+
+    def __init__(self):
+        self._zip = ZipStream()
+        self._folders: set[str] = set()
+
+    def _folder(self, job_id: str, result: ProductResult) -> str:
+        name = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", result.product_model).strip(" .") or "product"
+        if name in self._folders:
+            name = f"{name}-{job_id[:8]}"
+        self._folders.add(name)
+        return name
+
+    def start(self) -> bytes:
+        return b""
+
+    def add(self, job_id: str, result: ProductResult) -> bytes:
+        folder = self._folder(job_id, result)
+        return b"".join(self._zip.add(f"{folder}/{name}", data) for name, data in package_files(result))
+
+    def finish(self) -> bytes:
+        return self._zip.finish()
+
+
+EXPORT_FORMATS = {"csv": CsvExport, "shopline": ShoplineCsvExport, "ndjson": NdjsonExport, "zip": ZipExport}
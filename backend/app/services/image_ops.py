@@ -0,0 +1,106 @@
+import io
+
+from PIL import Image, ImageChops, ImageOps
+
+# Pillow work for the image pool. Runs in worker processes, so nothing from the app is imported here.
+MIN_IMAGE_SIDE = 300  # smaller images are icons, logos, colour swatches
+MAIN_SIZE = 800
+GALLERY_WIDTH = 1280
+WHITE_LEVEL = 235  # darkest channel at or above this counts as white
+WHITE_BORDER_RATIO = 0.9  # share of border pixels that must be white for a main image
+BORDER_FRACTION = 0.05
+JPEG_QUALITY = 85
+
+Image.MAX_IMAGE_PIXELS = 50_000_000  # larger is refused (decompression bombs)
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """RGB, with any transparency composited onto white."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, rgba).convert("RGB")
+    return img.convert("RGB")
+
+
+def white_border_ratio(img: Image.Image) -> float:
+    """Share of the border frame whose darkest channel is near white.
+
+    The per-pixel min over R/G/B and the histogram are computed by Pillow in C — no Python pixel loop.
+    """
+    r, g, b = img.split()
+    darkest = ImageChops.darker(ImageChops.darker(r, g), b)
+    width, height = darkest.size
+    edge = max(1, int(min(width, height) * BORDER_FRACTION))
+    strips = (
+        (0, 0, width, edge), (0, height - edge, width, height),
+        (0, edge, edge, height - edge), (width - edge, edge, width, height - edge),
+    )
+    white = total = 0
+    for box in strips:
+        hist = darkest.crop(box).histogram()
+        white += sum(hist[WHITE_LEVEL:])
+        total += sum(hist)
+    return white / total if total else 0.0
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: stays (nearly) the same across resizes and re-encodes of a picture."""
+    small = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def colour_signature(img: Image.Image) -> bytes:
+    """Mean R/G/B of each image quadrant (12 bytes) — dhash is greyscale, so this tells the
+    red and the blue variant of one product shot apart."""
+    return img.resize((2, 2), Image.Resampling.BOX).tobytes()
+
+
+def inspect_image(data: bytes) -> tuple[int, bytes, int, int] | None:
+    """(perceptual hash, colour signature, width, height) of an image without a full-size decode; None if unusable."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                width, height = height, width  # rotated by exif_transpose when processed
+            if min(width, height) < MIN_IMAGE_SIDE:
+                return None
+            img.draft("RGB", (64, 64))
+            img = _flatten(ImageOps.exif_transpose(img))
+            return dhash(img), colour_signature(img), width, height
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def process_image(data: bytes) -> tuple[str, bytes, int, int] | None:
+    """Decode, classify and resize one downloaded image → (kind, jpeg, width, height); None if unusable.
+
+    White-background images are main images (cropped to a MAIN_SIZE square); the rest are
+    gallery images (scaled down to GALLERY_WIDTH wide).
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEGs decode straight at a reduced scale when far larger than needed
+            img.draft("RGB", (GALLERY_WIDTH, GALLERY_WIDTH))
+            img = ImageOps.exif_transpose(img)
+            if min(img.size) < MIN_IMAGE_SIDE:
+                return None
+            img = _flatten(img)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    if white_border_ratio(img) >= WHITE_BORDER_RATIO:
+        kind = "main"
+        img = ImageOps.fit(img, (MAIN_SIZE, MAIN_SIZE), Image.Resampling.LANCZOS)
+    else:
+        kind = "gallery"
+        if img.width > GALLERY_WIDTH:
+            img = img.resize((GALLERY_WIDTH, round(img.height * GALLERY_WIDTH / img.width)), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return kind, out.getvalue(), img.width, img.height
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import httpx
+
+from app.models.schemas import ProductImage
+from app.services import asset_store
+from app.services.image_ops import inspect_image, process_image
+from app.services.scraper import get_http_client
+from app.utils import metrics
+from app.utils.admission import admission
+from app.utils.urls import is_public_url
+
+logger = logging.getLogger(__name__)
+
+# Product images: downloaded concurrently (bounded), then decoded / classified / resized by
+# Pillow in a process pool so the event loop and the GIL stay free. Each processed image goes
+# into the shared asset store as it completes; the ZIP picks them up from there. Decodes are
+# admitted against the memory budget, and the pool is shut down once idle so its processes
+# don't hold memory between jobs.
+MAX_IMAGES = int(os.getenv("MAX_IMAGES", "12"))
+IMAGE_DOWNLOAD_CONCURRENCY = int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY", "6"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_POOL_IDLE_SECONDS = float(os.getenv("IMAGE_POOL_IDLE_SECONDS", "30"))
+MAX_IMAGE_BYTES = 15 * 1024 * 1024
+MAX_IMAGE_REDIRECTS = 5
+
+_pool: ProcessPoolExecutor | None = None
+_pool_users = 0
+_pool_idle: asyncio.TimerHandle | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs threads and an event loop isn't safe
+        _pool = ProcessPoolExecutor(IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the image workers (app shutdown)."""
+    global _pool, _pool_idle
+    if _pool_idle is not None:
+        _pool_idle.cancel()
+        _pool_idle = None
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _read_image(resp: httpx.Response) -> bytes | None:
+    resp.raise_for_status()
+    if resp.headers.get("content-type", "").startswith("text/"):
+        return None
+    chunks, size = [], 0
+    async for chunk in resp.aiter_bytes():
+        size += len(chunk)
+        if size > MAX_IMAGE_BYTES:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _download(url: str, limit: asyncio.Semaphore) -> bytes | None:
+    """Image bytes, or None. Image URLs come from page content, so every hop (redirects are
+    followed here, not by the client) must resolve to a public address."""
+    async with limit:
+        try:
+            for _ in range(MAX_IMAGE_REDIRECTS + 1):
+                if not await is_public_url(url):
+                    metrics.incr("images.blocked")
+                    return None
+                async with get_http_client().stream(
+                    "GET", url, headers={"Accept": "image/*"}, follow_redirects=False,
+                ) as resp:
+                    if not resp.is_redirect:
+                        return await _read_image(resp)
+                    url = str(resp.url.join(resp.headers["location"]))
+            return None
+        except httpx.HTTPError:
+            return None
+
+
+async def _in_pool(fn, data: bytes):
+    global _pool, _pool_users, _pool_idle
+    loop = asyncio.get_running_loop()
+    async with admission.reserve("image"):
+        if _pool_idle is not None:
+            _pool_idle.cancel()
+            _pool_idle = None
+        pool = _get_pool()
+        _pool_users += 1
+        try:
+            return await loop.run_in_executor(pool, fn, data)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory on a huge image); start a fresh pool for the rest
+            logger.warning("Image worker pool broke; restarting it")
+            if _pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                _pool = None
+            return None
+        finally:
+            _pool_users -= 1
+            if _pool_users == 0 and _pool is not None:
+                _pool_idle = loop.call_later(IMAGE_POOL_IDLE_SECONDS, shutdown_pool)
+
+
+def _hit(outcome: str, asset: dict) -> dict | None:
+    metrics.incr("assets.lookups", outcome=outcome)
+    return asset if asset["kind"] else None
+
+
+async def _resolve(url: str, limit: asyncio.Semaphore) -> dict | None:
+    """The asset for one image URL: from the store if this URL, these bytes or this picture (at
+    another size) were seen before — otherwise downloaded and processed. None if unusable."""
+    asset = await asyncio.to_thread(asset_store.by_url, url)
+    if asset:
+        return _hit("url", asset)
+    data = await _download(url, limit)
+    if data is None:
+        metrics.incr("images.skipped", reason="download")
+        return None
+    content_hash = await asyncio.to_thread(lambda data=data: hashlib.sha256(data).hexdigest())
+    asset = await asyncio.to_thread(asset_store.by_hash, content_hash)
+    if asset:
+        await asyncio.to_thread(asset_store.link, url, content_hash)
+        return _hit("content", asset)
+
+    # A cheap reduced decode gives the perceptual hash before committing to full processing
+    inspected = await _in_pool(inspect_image, data)
+    if inspected:
+        phash, colour, width, height = inspected
+        asset = await asyncio.to_thread(asset_store.similar, phash, colour, width * height)
+        if asset:
+            await asyncio.to_thread(asset_store.link, url, asset["hash"])
+            return _hit("perceptual", asset)
+    metrics.incr("assets.lookups", outcome="miss")
+    processed = await _in_pool(process_image, data) if inspected else None
+    del data
+    if processed is None:
+        metrics.incr("images.skipped", reason="unusable")
+        await asyncio.to_thread(asset_store.put, content_hash, url)
+        return None
+    kind, jpeg, out_width, out_height = processed
+    metrics.incr("images.processed", kind=kind)
+    return await asyncio.to_thread(
+        asset_store.put, content_hash, url, phash, colour, kind, jpeg, out_width, out_height, width * height,
+    )
+
+
+async def acquire_images(urls: list[str]) -> list[ProductImage]:
+    """Download, classify and resize images (reusing stored assets); main images first, then page order."""
+    urls = urls[:MAX_IMAGES]
+    limit = asyncio.Semaphore(IMAGE_DOWNLOAD_CONCURRENCY)
+    resolved = await asyncio.gather(*(_resolve(url, limit) for url in urls))
+
+    # A page often shows one picture at several sizes: keep it once, from the largest original
+    # (colour variants of one shot are different pictures and all kept)
+    kept: list[tuple[str, dict]] = []
+    for url, asset in zip(urls, resolved):
+        if asset is None:
+            continue
+        same = next((i for i, (_, other) in enumerate(kept) if asset_store.same_picture(asset, other)), None)
+        if same is None:
+            kept.append((url, asset))
+            continue
+        metrics.incr("images.duplicates")
+        if asset["source_pixels"] > kept[same][1]["source_pixels"]:
+            kept[same] = (url, asset)
+
+    kept.sort(key=lambda entry: entry[1]["kind"] != "main")
+    images, numbers = [], {"main": 0, "gallery": 0}
+    for url, asset in kept:
+        numbers[asset["kind"]] += 1
+        images.append(ProductImage(
+            filename=f"{asset['kind']}_{numbers[asset['kind']]:02d}.jpg", kind=asset["kind"],
+            width=asset["width"], height=asset["height"], source_url=url, asset=asset["hash"],
+        ))
+    return images
@@ -1,16 +1,149 @@
-import os
+import hashlib
 import json
-import zipfile
+import struct
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+
 from app.models.schemas import ProductResult
+from app.services import asset_store
+
+# Packages are built in memory and streamed — nothing is written to disk. Entries carry a
+# fixed timestamp so the same result always yields the same bytes (ETag / Range resume).
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+CHUNK_SIZE = 64 * 1024
+_UTF8_NAMES = 0x0800
+_STORED_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")  # already compressed — stored as-is
+# Past these, sizes / offsets / the entry count go in ZIP64 records (bulk exports can pass 4 GiB or 65535 entries)
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_COUNT_LIMIT = 0xFFFF
+
+
+@dataclass
+class ZipPackage:
+    parts: list[bytes]
+    size: int
+    etag: str
+
+    def iter_range(self, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        """Bytes start..end (inclusive) in CHUNK_SIZE pieces."""
+        end = self.size - 1 if end is None else end
+        offset = 0
+        for part in self.parts:
+            part_end = offset + len(part)
+            if part_end > start and offset <= end:
+                lo, hi = max(start, offset) - offset, min(end + 1, part_end) - offset
+                for i in range(lo, hi, CHUNK_SIZE):
+                    yield part[i:min(i + CHUNK_SIZE, hi)]
+            offset = part_end
+            if offset > end:
+                break
+
+
+def package_files(result: ProductResult) -> list[tuple[str, bytes]]:
+    """Files in a job's package: product.json and the processed images (read from the asset store)."""
+    files = [("product.json", json.dumps(result.model_dump(), indent=2, ensure_ascii=False).encode("utf-8"))]
+    for image in result.images:
+        try:
+            with open(asset_store.path(image.asset), "rb") as f:
+                files.append((f"images/{image.filename}", f.read()))
+        except FileNotFoundError:
+            continue
+    return files
+
+
+def _dos_time() -> tuple[int, int]:
+    year, month, day, hour, minute, second = ZIP_DATE_TIME
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+class ZipStream:
+    """Writes a ZIP one entry at a time: add() returns that entry's bytes, finish() the central
+    directory. Only the directory records are kept, so memory doesn't grow with the file data.
+    ZIP64 extra fields and end records are written only where a value overflows."""
+
+    def __init__(self):
+        self._time, self._date = _dos_time()
+        self._central: list[bytes] = []
+        self.offset = 0
+
+    def add(self, name: str, data: bytes) -> bytes:
+        encoded = name.encode("utf-8")
+        if name.endswith(_STORED_SUFFIXES):
+            method, body = 0, data
+        else:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            method, body = 8, compressor.compress(data) + compressor.flush()
+        crc = zlib.crc32(data)
+        compressed_size, size, offset = len(body), len(data), self.offset
+        large = compressed_size >= _ZIP64_LIMIT or size >= _ZIP64_LIMIT
+        if large:
+            compressed_size = size = 0xFFFFFFFF  # see the ZIP64 extra field
+        local_extra = struct.pack("<HHQQ", 1, 16, len(data), len(body)) if large else b""
+        central_values = [len(data), len(body)] if large else []
+        if offset >= _ZIP64_LIMIT:
+            central_values.append(offset)
+            offset = 0xFFFFFFFF
+        central_extra = (struct.pack(f"<HH{len(central_values)}Q", 1, 8 * len(central_values), *central_values)
+                         if central_values else b"")
+        local_version = 45 if large else 20
+        central_version = 45 if central_values else 20
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, local_version, _UTF8_NAMES, method, self._time, self._date,
+            crc, compressed_size, size, len(encoded), len(local_extra),
+        ) + encoded + local_extra
+        self._central.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, central_version, central_version, _UTF8_NAMES, method,
+            self._time, self._date, crc, compressed_size, size, len(encoded), len(central_extra),
+            0, 0, 0, 0, offset,
+        ) + encoded + central_extra)
+        entry = header + body
+        self.offset += len(entry)
+        return entry
+
+    def finish(self) -> bytes:
+        directory = b"".join(self._central)
+        count, start = len(self._central), self.offset
+        zip64 = b""
+        if count >= _ZIP64_COUNT_LIMIT or len(directory) >= _ZIP64_LIMIT or start >= _ZIP64_LIMIT:
+            zip64 = struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, len(directory), start,
+            ) + struct.pack("<IIQI", 0x07064B50, 0, start + len(directory), 1)
+        return directory + zip64 + struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(len(directory), 0xFFFFFFFF), min(start, 0xFFFFFFFF), 0,
+        )
+
+
+def build_zip(files: list[tuple[str, bytes]]) -> ZipPackage:
+    """Deflated ZIP of files, as parts whose total size is known before sending (CPU-bound — run in a thread)."""
+    stream = ZipStream()
+    parts = [stream.add(name, data) for name, data in files]
+    parts.append(stream.finish())
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+    return ZipPackage(parts, sum(len(p) for p in parts), f'"{digest.hexdigest()[:32]}"')
+
+
+def build_package(result: ProductResult) -> ZipPackage:
+    return build_zip(package_files(result))
+
 
-async def create_package(result: ProductResult, job_dir: str):
-    """Create JSON result file and ZIP archive."""
-    # Save JSON
-    json_path = os.path.join(job_dir, "product.json")
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(result.model_dump(), f, indent=2, ensure_ascii=False)
-
-    # Create ZIP (only product.json)
-    zip_path = os.path.join(job_dir, "result.zip")
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.write(json_path, "product.json")
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """(start, end) of a single "bytes=" range; None if unsatisfiable. Raises ValueError for
+    anything else (multiple ranges, other units), which is served as the full body."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        length = int(last)
+        if length <= 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from app.models.schemas import ProductResult
+from app.services.scraper import get_http_client
+from app.utils import metrics
+from app.utils.urls import normalize_url
+
+logger = logging.getLogger(__name__)
+
+# Completed results, reused when the same product is scraped again with the same options
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "/tmp/scraper_cache/results.db")
+RESULT_CACHE_TTL_HOURS = float(os.getenv("RESULT_CACHE_TTL_HOURS", "24"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+FRESHNESS_TIMEOUT = 10.0  # seconds
+
+_conn: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(RESULT_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(RESULT_CACHE_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " cache_key TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " stored_at REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at)")
+        _conn = conn
+    return _conn
+
+
+def cache_key(url: str, product_model: str | None, api_key: str | None, ai_model: str | None,
+              reasoning_effort: str | None, firecrawl: bool) -> str:
+    """AI results are keyed per API key: they pass through the owner's review (and may carry
+    their edits), so they are only served back to the same user."""
+    owner = hashlib.sha256(api_key.encode()).hexdigest() if api_key else ""
+    parts = [normalize_url(url), product_model or "", owner, ai_model or "", reasoning_effort or "", firecrawl]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def lookup(key: str) -> tuple[ProductResult, float, dict] | None:
+    """(result, stored_at, validators) for an entry younger than the TTL, else None."""
+    cutoff = time.time() - RESULT_CACHE_TTL_HOURS * 3600
+    with _lock:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT result, stored_at, etag, last_modified FROM results WHERE cache_key = ? AND stored_at >= ?",
+            (key, cutoff),
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE results SET hits = hits + 1 WHERE cache_key = ?", (key,))
+            conn.commit()
+    if row is None:
+        metrics.incr("result_cache.lookups", outcome="miss")
+        return None
+    metrics.incr("result_cache.lookups", outcome="hit")
+    result, stored_at, etag, last_modified = row
+    return ProductResult.model_validate_json(result), stored_at, {"etag": etag, "last_modified": last_modified}
+
+
+async def is_fresh(url: str, validators: dict) -> bool:
+    """Conditional GET with the stored validators. Pages without validators count as fresh within the TTL."""
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    if not headers:
+        return True
+    try:
+        async with get_http_client().stream("GET", url, headers=headers, timeout=FRESHNESS_TIMEOUT) as resp:
+            if resp.status_code == 304:
+                return True
+            etag = resp.headers.get("etag")
+            return bool(etag) and etag == validators.get("etag")
+    except httpx.HTTPError as e:
+        logger.info("Freshness check failed for %s: %s", url, e)
+        return False
+
+
+def store(key: str, url: str, result: ProductResult, validators: dict | None = None):
+    """Cache a result with the ETag / Last-Modified of the response it was extracted from."""
+    validators = validators or {}
+    payload = result.model_dump_json()
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT INTO results (cache_key, url, result, etag, last_modified, stored_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(cache_key) DO UPDATE SET result = excluded.result, etag = excluded.etag,"
+            " last_modified = excluded.last_modified, stored_at = excluded.stored_at",
+            (key, url, payload, validators.get("etag"), validators.get("last_modified"), time.time()),
+        )
+        conn.commit()
+    metrics.incr("result_cache.stores")
+
+
+def purge():
+    """Drop entries past the TTL and the oldest beyond RESULT_CACHE_MAX_ENTRIES."""
+    cutoff = time.time() - RESULT_CACHE_TTL_HOURS * 3600
+    with _lock:
+        conn = _connect()
+        conn.execute("DELETE FROM results WHERE stored_at < ?", (cutoff,))
+        conn.execute(
+            "DELETE FROM results WHERE cache_key IN ("
+            " SELECT cache_key FROM results ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (RESULT_CACHE_MAX_ENTRIES,),
+        )
+        conn.commit()
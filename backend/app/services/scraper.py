@@ -3,13 +3,19 @@ import copy
 import gc
 import re
 import json
+import logging
 import time
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urldefrag, urlparse
 
 import httpx
 from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup, Tag, NavigableString
 
+from app.utils import metrics
+from app.utils.admission import admission
+
+logger = logging.getLogger(__name__)
+
 # Model number pattern: must contain both letters and digits
 MODEL_PATTERN = re.compile(r'(?<![/\w])[A-Z]{1,6}[-\s]?[A-Z0-9]*\d[A-Z0-9]*(?:[-\s][A-Z0-9]+)*(?![/\w])')
 
@@ -70,33 +76,57 @@ def detect_spa_heuristic(html: str) -> bool:
     return '__NUXT__' in html or '__NEXT_DATA__' in html
 
 
-async def fetch_with_httpx(url: str) -> str | None:
-    """Lightweight HTTP fetch — no browser needed (~200MB peak)."""
-    try:
-        async with httpx.AsyncClient(
+# Shared across jobs (batches hit the same hosts repeatedly) — closed by close_shared_clients()
+_http_client: httpx.AsyncClient | None = None
+_firecrawl_apps: dict[str, object] = {}
+BROWSER_IDLE_SECONDS = 5
+# A cancelled render gets this long to close its context before the whole browser is killed
+CONTEXT_CLOSE_SECONDS = 3
+BROWSER_KILL_SECONDS = 5
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
             follow_redirects=True,
             timeout=30.0,
             headers={"User-Agent": _USER_AGENT},
-        ) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            return resp.text
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _http_client
+
+
+async def fetch_page(url: str) -> tuple[str | None, dict]:
+    """Lightweight HTTP fetch — (html, validators); validators are the response's ETag /
+    Last-Modified, which the result cache later revalidates against."""
+    try:
+        resp = await get_http_client().get(url)
+        resp.raise_for_status()
+        return resp.text, {"etag": resp.headers.get("etag"), "last_modified": resp.headers.get("last-modified")}
     except Exception:
-        return None
+        return None, {}
+
+
+async def fetch_with_httpx(url: str) -> str | None:
+    """Lightweight HTTP fetch — no browser needed (~200MB peak)."""
+    html, _ = await fetch_page(url)
+    return html
 
 
 async def fetch_with_firecrawl(url: str, api_key: str) -> dict | None:
     """Fetch page via Firecrawl API — handles JS rendering, anti-bot, and content cleaning."""
     try:
-        from firecrawl import FirecrawlApp
-        app = FirecrawlApp(api_key=api_key)
-        doc = await asyncio.to_thread(
-            lambda: app.scrape(
-                url,
-                formats=["html", "rawHtml"],
-                only_main_content=True,
-                timeout=60000,
-            ),
+        app = _firecrawl_apps.get(api_key)
+        if app is None:
+            # Async client: cancelling the job aborts the request (a worker thread would run on)
+            from firecrawl import AsyncFirecrawl
+            app = _firecrawl_apps[api_key] = AsyncFirecrawl(api_key=api_key)
+        doc = await app.scrape(
+            url,
+            formats=["html", "rawHtml"],
+            only_main_content=True,
+            timeout=60000,
         )
         if not doc:
             return None
@@ -120,28 +150,146 @@ async def fetch_with_firecrawl(url: str, api_key: str) -> dict | None:
         return None
 
 
+class _SharedBrowser:
+    """One Chromium reused by back-to-back renders (e.g. a batch).
+
+    The browser's processes count against this process's admission budget, so it
+    is closed as soon as no render is using or waiting for it (BROWSER_IDLE_SECONDS
+    is only a backstop when a waiting render is cancelled).
+    """
+
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._users = 0
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+        self._idle_close: asyncio.TimerHandle | None = None
+
+    async def acquire(self):
+        async with self._lock:
+            if self._idle_close:
+                self._idle_close.cancel()
+                self._idle_close = None
+            if self._browser is None or not self._browser.is_connected():
+                await self._close()
+                self._playwright = await async_playwright().start()
+                try:
+                    self._browser = await self._playwright.chromium.launch(
+                        headless=True,
+                        args=[
+                            '--no-sandbox',
+                            '--disable-dev-shm-usage',
+                            '--disable-gpu',
+                            '--disable-extensions',
+                            '--disable-background-networking',
+                            '--disable-default-apps',
+                            '--disable-sync',
+                            '--disable-translate',
+                            '--no-first-run',
+                            '--single-process',
+                            '--js-flags=--max-old-space-size=256',
+                        ]
+                    )
+                except Exception:
+                    await self._close()
+                    raise
+            self._users += 1
+            return self._browser
+
+    async def release(self):
+        async with self._lock:
+            self._users -= 1
+            if self._users > 0:
+                return
+            if self.waiting == 0:
+                await self._close()
+            else:
+                loop = asyncio.get_running_loop()
+                self._idle_close = loop.call_later(BROWSER_IDLE_SECONDS, lambda: asyncio.create_task(self._close_if_idle()))
+
+    async def _close_if_idle(self):
+        async with self._lock:
+            if self._users == 0:
+                await self._close()
+
+    async def _close(self):
+        browser, pw = self._browser, self._playwright
+        self._browser = self._playwright = None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        if pw is not None:
+            await pw.stop()
+        gc.collect()
+
+    async def kill(self, browser):
+        """Drop this browser now, without the lock (a wedged page must not block release);
+        renders still on it fail and the next acquire launches a fresh one. A no-op if the
+        browser was already replaced — only the one holding the wedged context is killed."""
+        if browser is None or self._browser is not browser:
+            return
+        pw = self._playwright
+        self._browser = self._playwright = None
+        metrics.incr("browser.killed")
+        if browser is not None:
+            try:
+                await asyncio.wait_for(browser.close(), BROWSER_KILL_SECONDS)
+            except Exception:
+                pass
+        if pw is not None:
+            try:
+                # Stopping the driver takes the Chromium process down with it
+                await asyncio.wait_for(pw.stop(), BROWSER_KILL_SECONDS)
+            except Exception:
+                pass
+        gc.collect()
+
+    async def close(self):
+        async with self._lock:
+            if self._idle_close:
+                self._idle_close.cancel()
+                self._idle_close = None
+            await self._close()
+
+
+_browser = _SharedBrowser()
+
+
 async def fetch_with_playwright(url: str) -> str:
-    """Full browser fetch for SPA sites (~450-500MB peak)."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=[
-                '--no-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-gpu',
-                '--disable-extensions',
-                '--disable-background-networking',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--no-first-run',
-                '--single-process',
-                '--js-flags=--max-old-space-size=256',
-            ]
-        )
-        page = await browser.new_page(user_agent=_USER_AGENT)
+    """Full browser fetch for SPA sites (~450-500MB peak) — admitted against the memory budget."""
+    _browser.waiting += 1
+    admitted = False
+    try:
+        async with admission.reserve("render"):
+            admitted = True
+            _browser.waiting -= 1
+            return await _render_with_playwright(url)
+    finally:
+        if not admitted:
+            _browser.waiting -= 1
+
+
+async def _close_context(context, browser):
+    """Close a page's context (also on cancellation, mid-goto); kill its browser if it won't."""
+    try:
+        await asyncio.wait_for(context.close(), CONTEXT_CLOSE_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("Browser context did not close in %ss — killing the browser", CONTEXT_CLOSE_SECONDS)
+        await _browser.kill(browser)
+    except Exception:
+        pass  # its browser is already gone (killed or crashed): nothing left to close
+
 
+async def _render_with_playwright(url: str) -> str:
+    browser = await _browser.acquire()
+    try:
+        # Fresh context per page: no cookies / storage leak between jobs
+        context = await browser.new_context(user_agent=_USER_AGENT)
         try:
+            page = await context.new_page()
             try:
                 await page.goto(url, wait_until="networkidle", timeout=60000)
             except Exception:
@@ -173,31 +321,44 @@ async def fetch_with_playwright(url: str) -> str:
 
             html = await page.content()
         finally:
-            await browser.close()
+            await _close_context(context, browser)
+    finally:
+        await _browser.release()
 
     gc.collect()
     return html
 
 
-def extract_all(soup: BeautifulSoup, url: str, analysis: dict | None = None) -> dict:
-    """Extract all product data from parsed HTML."""
-    product_name = _extract_product_name(soup)
-    product_model = _extract_model(soup, product_name, url)
-    summary = _extract_summary(soup)
-    description = _extract_description(soup)
-    # _extract_description_html mutates soup — must be called last
-    description_html = _extract_description_html(soup, analysis)
+async def close_shared_clients():
+    """Close the pooled HTTP client and browser (app shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    await _browser.close()
 
+
+def extract_metadata(soup: BeautifulSoup, url: str) -> dict:
+    """Extract name/model/summary/description — does not mutate soup."""
+    product_name = _extract_product_name(soup)
     return {
         "product_name": product_name,
-        "product_model": product_model,
-        "summary": summary,
-        "description": description,
-        "description_html": description_html,
+        "product_model": _extract_model(soup, product_name, url),
+        "summary": _extract_summary(soup),
+        "description": _extract_description(soup),
         "source_url": url,
+        "image_urls": _extract_image_urls(soup, url),
     }
 
 
+def extract_all(soup: BeautifulSoup, url: str, analysis: dict | None = None) -> dict:
+    """Extract all product data from parsed HTML."""
+    data = extract_metadata(soup, url)
+    # extract_description_html mutates soup — must be called last
+    data["description_html"] = extract_description_html(soup, analysis)
+    return data
+
+
 def _is_content_sufficient(data: dict) -> bool:
     """Check if extracted data has enough content to skip Playwright."""
     if data.get("product_name", "Unknown Product") == "Unknown Product":
@@ -210,20 +371,29 @@ def _is_content_sufficient(data: dict) -> bool:
     return len(plain_from_html) >= 300 or len(desc) >= 200
 
 
+def _parse_all(html: str, url: str) -> dict:
+    return extract_all(BeautifulSoup(html, 'lxml'), url)
+
+
+async def parse_all(html: str, url: str) -> dict:
+    """Parse + extract off the event loop, admitted against the memory budget."""
+    async with admission.reserve("parse"):
+        return await asyncio.to_thread(_parse_all, html, url)
+
+
 async def scrape_product(url: str) -> dict:
     # Phase 1: Try lightweight httpx fetch first (~200MB peak)
-    html = await fetch_with_httpx(url)
+    html, validators = await fetch_page(url)
     if html:
         # SPA frameworks: SSR content often incomplete, needs JS rendering
         is_spa = detect_spa_heuristic(html)
         if not is_spa:
-            soup = BeautifulSoup(html, 'lxml')
-            data = extract_all(soup, url)
+            data = await parse_all(html, url)
             if _is_content_sufficient(data):
                 data["_raw_html"] = html
-                del soup
+                data["_validators"] = validators
                 return data
-            del data, soup, html
+            del data, html
             gc.collect()
         else:
             del html
@@ -231,10 +401,10 @@ async def scrape_product(url: str) -> dict:
 
     # Phase 2: Fallback to Playwright for SPA sites / insufficient content
     html = await fetch_with_playwright(url)
-    soup = BeautifulSoup(html, 'lxml')
-    data = extract_all(soup, url)
+    data = await parse_all(html, url)
     data["_raw_html"] = html
-    del soup, html
+    data["_validators"] = validators  # the rendered page is still this document
+    del html
     return data
 
 
@@ -341,6 +511,66 @@ def _extract_summary(soup: BeautifulSoup) -> str:
     return ""
 
 
+_IMAGE_SKIP_RE = re.compile(r'\.(svg|gif|ico)(\?|$)|^data:', re.IGNORECASE)
+
+
+def _best_srcset_candidate(srcset: str) -> str | None:
+    """Highest-resolution URL of a srcset ("a.jpg 640w, b.jpg 1280w" or "a.jpg 1x, b.jpg 2x")."""
+    best, best_size = None, -1.0
+    for candidate in srcset.split(","):
+        parts = candidate.strip().split()
+        if not parts:
+            continue
+        size = 1.0
+        if len(parts) > 1 and parts[1][:-1].replace(".", "", 1).isdigit():
+            size = float(parts[1][:-1])
+        if size > best_size:
+            best, best_size = parts[0], size
+    return best
+
+
+def _jsonld_images(value) -> list[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [url for item in value for url in _jsonld_images(item)]
+    if isinstance(value, dict):
+        return _jsonld_images(value.get("contentUrl") or value.get("url"))
+    return []
+
+
+def _extract_image_urls(soup: BeautifulSoup, url: str) -> list[str]:
+    """Candidate product images, most reliable first: og:image, JSON-LD image, then <img> (best srcset entry)."""
+    found = []
+    for meta in soup.find_all("meta", property=re.compile(r'^og:image(:secure_url|:url)?$')):
+        found.append(meta.get("content"))
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except json.JSONDecodeError:
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                found += _jsonld_images(item.get("image"))
+
+    for img in soup.find_all("img"):
+        width = img.get("width", "")
+        if width.isdigit() and int(width) < 300:
+            continue  # icons, logos, swatches
+        srcset = img.get("srcset") or img.get("data-srcset")
+        found.append((srcset and _best_srcset_candidate(srcset)) or img.get("data-src") or img.get("src"))
+
+    urls = []
+    for candidate in found:
+        if not candidate or _IMAGE_SKIP_RE.search(candidate.strip()):
+            continue
+        absolute = urldefrag(urljoin(url, candidate.strip()))[0]
+        if absolute.startswith(("http://", "https://")) and absolute not in urls:
+            urls.append(absolute)
+    return urls
+
+
 def _extract_description(soup: BeautifulSoup) -> str:
     """Extract detailed product description from multiple sources."""
     description_parts = []
@@ -506,10 +736,10 @@ def _maybe_add_element(
     return False
 
 
-def _extract_description_html(soup: BeautifulSoup, analysis: dict | None = None) -> str:
+def extract_description_html(soup: BeautifulSoup, analysis: dict | None = None) -> str:
     """Extract clean HTML description suitable for Shopline product description.
 
-    NOTE: This function mutates soup. It MUST be called last in scrape_product().
+    NOTE: This function mutates soup. It MUST be called after extract_metadata().
     """
     work_soup = soup
 
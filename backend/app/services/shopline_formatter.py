@@ -1,6 +1,11 @@
-import asyncio
+import html
 import logging
-from openai import AsyncOpenAI
+import re
+from collections import Counter
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+from app.services.ai_client import chat_completion
 
 logger = logging.getLogger(__name__)
 
@@ -107,6 +112,310 @@ font-family: -apple-system, BlinkMacSystemFont, 'Helvetica Neue', 'PingFang TC',
 DEFAULT_MODEL = "z-ai/glm-5"
 
 
+# Style guide from SHOPLINE_PROMPT — used by the deterministic renderer and the conformance checker
+FONT_FAMILY = "-apple-system, BlinkMacSystemFont, 'Helvetica Neue', 'PingFang TC', 'Noto Sans TC', sans-serif"
+ALLOWED_SHOPLINE_TAGS = {'div', 'h2', 'h3', 'p', 'ul', 'li', 'hr', 'span', 'strong'}
+ALLOWED_COLORS = {'#1d1d1f', '#6e6e73', '#e0e0e0'}
+ALLOWED_FONT_SIZES = {'28px', '20px', '16px', '14px'}
+
+STYLES = {
+    "container": f"max-width: 780px; margin: 0 auto; padding: 0 16px; font-family: {FONT_FAMILY}; color: #1d1d1f",
+    "title": "margin: 0; font-size: 28px; font-weight: 700; line-height: 1.2; color: #1d1d1f",
+    "model": "margin: 8px 0 0 0; font-size: 14px; font-weight: 400; color: #6e6e73",
+    "summary": "margin: 8px 0 0 0; font-size: 16px; line-height: 1.6; color: #6e6e73",
+    "hr": "margin: 32px 0; border: none; border-top: 1px solid #e0e0e0",
+    "section_title": "margin: 0; font-size: 20px; font-weight: 700; line-height: 1.3; color: #1d1d1f",
+    "body_first": "margin: 12px 0 0 0; font-size: 16px; font-weight: 400; line-height: 1.6; color: #1d1d1f",
+    "body": "margin: 10px 0 0 0; font-size: 16px; font-weight: 400; line-height: 1.6; color: #1d1d1f",
+    "list_first": "margin: 12px 0 0 0; padding-left: 20px; font-size: 16px; line-height: 1.6; color: #1d1d1f",
+    "list": "margin: 10px 0 0 0; padding-left: 20px; font-size: 16px; line-height: 1.6; color: #1d1d1f",
+    "item": "margin-top: 4px; font-size: 16px; line-height: 1.6; color: #1d1d1f",
+    "nested_list": "margin: 4px 0 0 0; padding-left: 20px; font-size: 16px; line-height: 1.6; color: #1d1d1f",
+    "spec_item": "margin-top: 4px; font-size: 14px; line-height: 1.6; color: #1d1d1f",
+    "spec_label": "font-size: 14px; font-weight: 600; color: #6e6e73",
+    "spec_group": "margin: 32px 0 0 0; font-size: 20px; font-weight: 700; line-height: 1.3; color: #1d1d1f",
+}
+
+_CJK_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+_SPEC_LABEL_RE = re.compile(r'^([^:：]{1,30})[:：]\s*(.+)$', re.S)
+_SPEC_TITLE_RE = re.compile(r'^((技術|產品)?規格|(technical |product )?spec(ification)?s?)[:：]?$', re.I)
+_EMOJI_RE = re.compile(r'[\U0001F300-\U0001FAFF\u2600-\u27BF]')
+_TEXT_CHAR_RE = re.compile(r'\w')
+MIN_TEXT_RETAINED = 0.98  # share of the source's letters and digits the output must keep
+
+_HEADINGS = ('h2', 'h3', 'h4')
+_BLOCKS = ('p', 'ul', 'ol', 'table')
+# Wrappers whose children are walked; any other tag (inline markup, unknown tags) joins the loose text
+_CONTAINERS = {
+    'html', 'body', 'div', 'section', 'article', 'main', 'header', 'footer', 'aside',
+    'nav', 'figure', 'details', 'form', 'fieldset', 'center', 'dl',
+}
+# Text blocks outside the style guide, kept as paragraphs
+_TEXT_BLOCKS = {'h1', 'h5', 'h6', 'blockquote', 'pre', 'figcaption', 'address', 'summary', 'dt', 'dd', 'li'}
+
+
+def _inline_html(el: Tag) -> str:
+    """Render an element's children as escaped text, keeping only <strong> emphasis."""
+    parts = []
+    for child in el.children:
+        if isinstance(child, NavigableString):
+            parts.append(html.escape(str(child), quote=False))
+        elif isinstance(child, Tag):
+            if child.name == 'br':
+                parts.append(" ")
+            elif child.name in ('strong', 'b'):
+                inner = _inline_html(child).strip()
+                if inner:
+                    parts.append(f"<strong>{inner}</strong>")
+            else:
+                parts.append(_inline_html(child))
+    return re.sub(r'\s+', ' ', "".join(parts)).strip()
+
+
+def _paragraphs(el: Tag) -> list[str]:
+    """Split a paragraph on <br> into separate inline-html paragraphs."""
+    chunks = [[]]
+    for child in el.children:
+        if isinstance(child, Tag) and child.name == 'br':
+            chunks.append([])
+        else:
+            chunks[-1].append(child)
+    result = []
+    for chunk in chunks:
+        wrapper = BeautifulSoup("<p></p>", 'html.parser').p
+        for node in chunk:
+            wrapper.append(node.extract() if isinstance(node, Tag) else NavigableString(str(node)))
+        text = _inline_html(wrapper)
+        if text:
+            result.append(text)
+    return result
+
+
+def _spec_rows(el: Tag) -> list[tuple[str, str]]:
+    """Extract (label, value) rows from a table, or from a list of "label: value" items."""
+    rows = []
+    if el.name == 'table':
+        for tr in el.find_all('tr'):
+            cells = [_inline_html(c) for c in tr.find_all(['th', 'td'])]
+            cells = [c for c in cells if c]
+            if len(cells) >= 2:
+                rows.append((cells[0], " / ".join(cells[1:])))
+            elif cells:
+                rows.append(("", cells[0]))
+        return rows
+    for li in el.find_all('li', recursive=False):
+        if li.find(['ul', 'ol']):
+            return []  # nested lists are content, not spec rows
+        text = li.get_text(" ", strip=True)
+        match = _SPEC_LABEL_RE.match(text)
+        if not match:
+            return []
+        rows.append((html.escape(match.group(1).strip(), quote=False), html.escape(match.group(2).strip(), quote=False)))
+    return rows
+
+
+def _is_spec_list(el: Tag) -> bool:
+    if el.name not in ('ul', 'ol'):
+        return False
+    items = el.find_all('li', recursive=False)
+    return len(items) >= 2 and len(_spec_rows(el)) == len(items)
+
+
+def _render_spec_rows(rows: list[tuple[str, str]]) -> str:
+    items = []
+    for label, value in rows:
+        label_html = f'<strong style="{STYLES["spec_label"]}">{re.sub(r"[:：]$", "", label)}：</strong>' if label else ""
+        items.append(f'<li style="{STYLES["spec_item"]}">{label_html}{value}</li>')
+    return f'<ul style="{STYLES["list_first"]}">{"".join(items)}</ul>'
+
+
+def _render_list(el: Tag, style: str) -> str:
+    """A list with each item once; nested lists stay nested inside their item."""
+    items = []
+    for li in el.find_all('li', recursive=False):
+        nested = [child.extract() for child in li.find_all(['ul', 'ol'], recursive=False)]
+        text = _inline_html(li)
+        sublists = "".join(_render_list(child, STYLES["nested_list"]) for child in nested)
+        if text or sublists:
+            items.append(f'<li style="{STYLES["item"]}">{text}{sublists}</li>')
+    return f'<ul style="{style}">{"".join(items)}</ul>' if items else ""
+
+
+def _render_block(el: Tag, first: bool) -> list[str]:
+    if el.name in ('ul', 'ol'):
+        rendered = _render_list(el, STYLES["list_first"] if first else STYLES["list"])
+        return [rendered] if rendered else []
+    blocks = []
+    for text in _paragraphs(el):
+        style = STYLES["body_first"] if first and not blocks else STYLES["body"]
+        blocks.append(f'<p style="{style}">{text}</p>')
+    return blocks
+
+
+def _top_level_blocks(soup: BeautifulSoup) -> list[Tag]:
+    """Headings and p/ul/ol/table blocks in document order. Loose text between them (bare text
+    nodes, <div>text</div>, inline markup) is wrapped into <p> blocks so no content is dropped."""
+    blocks: list[Tag] = []
+    run: list = []
+
+    def flush():
+        if "".join(node.get_text() if isinstance(node, Tag) else str(node) for node in run).strip():
+            paragraph = soup.new_tag('p')
+            for node in run:
+                paragraph.append(node.extract())
+            blocks.append(paragraph)
+        run.clear()
+
+    def walk(parent: Tag):
+        for node in list(parent.children):
+            if isinstance(node, NavigableString):
+                if type(node) is NavigableString:  # not a comment, doctype, ...
+                    run.append(node)
+            elif node.name in _HEADINGS or node.name in _BLOCKS:
+                flush()
+                blocks.append(node)
+            elif node.name in _TEXT_BLOCKS:
+                flush()
+                node.name = 'p'
+                blocks.append(node)
+            elif node.name in _CONTAINERS:
+                flush()
+                walk(node)
+                flush()
+            else:
+                run.append(node)
+
+    walk(soup)
+    flush()
+    return blocks
+
+
+def _text_chars(soup: BeautifulSoup) -> Counter:
+    return Counter(_TEXT_CHAR_RE.findall(soup.get_text()))
+
+
+def text_retained(source_html: str, shopline_html: str) -> float:
+    """Share of the source's letters and digits (as a multiset) found in the Shopline HTML."""
+    source = BeautifulSoup(source_html or "", 'html.parser')
+    for tag in source.find_all(['script', 'style']):
+        tag.decompose()
+    expected = _text_chars(source)
+    if not expected:
+        return 1.0
+    kept = expected & _text_chars(BeautifulSoup(shopline_html or "", 'html.parser'))
+    return sum(kept.values()) / sum(expected.values())
+
+
+def render_shopline_html(
+    product_name: str,
+    product_model: str,
+    summary: str,
+    description_html: str,
+) -> str:
+    """Render cleaned description_html into the Shopline layout without an LLM.
+
+    Follows the same style guide as SHOPLINE_PROMPT: title block, feature sections
+    (h3 + p/ul, separated by hr), then a spec section built from tables and
+    "label: value" lists. Text outside those elements is kept as paragraphs.
+    """
+    soup = BeautifulSoup(description_html or "", 'html.parser')
+    for tag in soup.find_all(['script', 'style']):
+        tag.decompose()
+    is_chinese = len(_CJK_RE.findall(soup.get_text())) > len(soup.get_text()) * 0.1
+
+    # Group top-level blocks into sections keyed by their heading
+    sections: list[tuple[str, list[Tag]]] = [("", [])]
+    for el in _top_level_blocks(soup):
+        if el.name in _HEADINGS:
+            sections.append((_inline_html(el), []))
+        else:
+            sections[-1][1].append(el)
+
+    feature_sections = []
+    spec_groups = []
+    for title, blocks in sections:
+        spec_blocks = [b for b in blocks if b.name == 'table' or _is_spec_list(b)]
+        content_blocks = [b for b in blocks if b not in spec_blocks]
+        rows = [row for b in spec_blocks for row in _spec_rows(b)]
+        if rows:
+            group_title = "" if content_blocks or _SPEC_TITLE_RE.match(title) else title
+            if spec_groups and spec_groups[-1][0] == group_title:
+                spec_groups[-1][1].extend(rows)
+            else:
+                spec_groups.append((group_title, rows))
+        if not content_blocks:
+            continue
+        rendered = []
+        for block in content_blocks:
+            rendered.extend(_render_block(block, first=not rendered))
+        if not rendered:
+            continue
+        heading = f'<h3 style="{STYLES["section_title"]}">{title}</h3>' if title else ""
+        feature_sections.append(f"<div>{heading}{''.join(rendered)}</div>")
+
+    parts = [f'<h2 style="{STYLES["title"]}">{html.escape(product_name or "", quote=False)}</h2>']
+    if product_model:
+        parts.append(f'<p style="{STYLES["model"]}">{html.escape(product_model, quote=False)}</p>')
+    if summary:
+        parts.append(f'<p style="{STYLES["summary"]}">{html.escape(summary, quote=False)}</p>')
+    parts.append(f'<hr style="{STYLES["hr"]}">')
+    parts.append(f'<hr style="{STYLES["hr"]}">'.join(feature_sections))
+
+    if spec_groups:
+        if feature_sections:
+            parts.append(f'<hr style="{STYLES["hr"]}">')
+        spec_title = "規格" if is_chinese else "Specifications"
+        spec_html = [f'<h3 style="{STYLES["section_title"]}">{spec_title}</h3>']
+        for group_title, rows in spec_groups:
+            if group_title:
+                spec_html.append(f'<h3 style="{STYLES["spec_group"]}">{group_title}</h3>')
+            spec_html.append(_render_spec_rows(rows))
+        parts.append(f"<div>{''.join(spec_html)}</div>")
+
+    return f'<div style="{STYLES["container"]}">{"".join(parts)}</div>'
+
+
+def check_shopline_html(shopline_html: str, source_html: str | None = None) -> list[str]:
+    """Check Shopline HTML against the style guide — and, given the description it was made
+    from, that it keeps the source text; return a list of violations (empty = conforms)."""
+    violations = []
+    soup = BeautifulSoup(shopline_html or "", 'html.parser')
+    roots = [c for c in soup.contents if isinstance(c, Tag)]
+    if len(roots) != 1 or roots[0].name != 'div':
+        violations.append("output must be a single root <div>")
+    elif 'max-width: 780px' not in roots[0].get('style', '').replace('max-width:780px', 'max-width: 780px'):
+        violations.append("root <div> must set max-width: 780px")
+    if not soup.find('h2'):
+        violations.append("missing product title <h2>")
+
+    for tag in soup.find_all(True):
+        if tag.name not in ALLOWED_SHOPLINE_TAGS:
+            violations.append(f"disallowed tag <{tag.name}>")
+        style = tag.get('style', '').lower()
+        if not style:
+            continue
+        if 'background' in style:
+            violations.append(f"<{tag.name}> uses a background")
+        if re.search(r'text-align\s*:\s*center', style):
+            violations.append(f"<{tag.name}> uses text-align: center")
+        if re.search(r'border-radius|box-shadow|border-left', style):
+            violations.append(f"<{tag.name}> uses card/accent styling")
+        for color in re.findall(r'#[0-9a-f]{3,6}\b', style):
+            if color not in ALLOWED_COLORS:
+                violations.append(f"<{tag.name}> uses color {color}")
+        for size in re.findall(r'font-size\s*:\s*([\d.]+px)', style):
+            if size not in ALLOWED_FONT_SIZES:
+                violations.append(f"<{tag.name}> uses font-size {size}")
+
+    if _EMOJI_RE.search(soup.get_text()):
+        violations.append("contains emoji")
+    if source_html is not None:
+        retained = text_retained(source_html, shopline_html)
+        if retained < MIN_TEXT_RETAINED:
+            violations.append(f"keeps only {retained:.0%} of the source text")
+    return list(dict.fromkeys(violations))
+
+
 async def generate_shopline_html(
     product_name: str,
     product_model: str,
@@ -118,54 +427,32 @@ async def generate_shopline_html(
 ) -> str:
     """用 OpenRouter AI 生成 Shopline 兼容嘅帶 inline styles HTML。
 
-    失敗時 return 空 string（graceful fallback）。
+    AI 輸出唔符合 style guide 或者 call 失敗時，fall back 用 render_shopline_html。
     """
-    client = AsyncOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-        timeout=90,
-    )
-    extra = {}
-    if reasoning_effort:
-        extra["extra_body"] = {"reasoning": {"effort": reasoning_effort}}
+    source_html = _truncate_html(description_html)
     prompt_content = SHOPLINE_PROMPT.format(
         product_name=product_name,
         product_model=product_model,
         summary=summary,
-        description_html=_truncate_html(description_html),
+        description_html=source_html,
     )
 
-    last_error = None
-    for attempt in range(3):
-        try:
-            response = await client.chat.completions.create(
-                model=model or DEFAULT_MODEL,
-                temperature=0.3,
-                messages=[{"role": "user", "content": prompt_content}],
-                **extra,
-            )
-            result = response.choices[0].message.content
-            if result:
-                result = result.strip()
-                if result.startswith("```html"):
-                    result = result[7:]
-                elif result.startswith("```"):
-                    result = result[3:]
-                if result.endswith("```"):
-                    result = result[:-3]
-                return result.strip()
-            return ""
-        except Exception as e:
-            last_error = e
-            logger.warning("Shopline HTML generation attempt %d failed: %s", attempt + 1, e)
-            if attempt < 2:
-                await asyncio.sleep(2)
-
-    logger.exception("Shopline HTML generation failed after 3 attempts", exc_info=last_error)
-    error_msg = str(last_error).replace("<", "&lt;").replace(">", "&gt;")
-    return (
-        f'<div style="padding:24px;border:1px solid #e00;border-radius:8px;margin:16px 0">'
-        f'<p style="color:#e00;font-weight:600;margin:0 0 8px 0">Shopline HTML 生成失敗</p>'
-        f'<p style="color:#666;font-size:14px;margin:0">{error_msg}</p>'
-        f'</div>'
-    )
+    try:
+        result = (await chat_completion(
+            "shopline", api_key, model or DEFAULT_MODEL, prompt_content,
+            temperature=0.3, reasoning_effort=reasoning_effort,
+        )).strip()
+        if result.startswith("```html"):
+            result = result[7:]
+        elif result.startswith("```"):
+            result = result[3:]
+        if result.endswith("```"):
+            result = result[:-3]
+        result = result.strip()
+        violations = check_shopline_html(result, source_html) if result else ["empty response"]
+        if not violations:
+            return result
+        logger.warning("Shopline HTML from AI violates style guide: %s", "; ".join(violations[:5]))
+    except Exception as e:
+        logger.error("Shopline HTML generation failed, using template renderer: %s", e)
+    return render_shopline_html(product_name, product_model, summary, description_html)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+TRANSLATION_MEMORY_PATH = os.getenv("TRANSLATION_MEMORY_PATH", "/tmp/scraper_cache/translation_memory.db")
+# Segments unused for the TTL go, and the least recently used beyond the row cap
+TRANSLATION_MEMORY_TTL_DAYS = float(os.getenv("TRANSLATION_MEMORY_TTL_DAYS", "30"))
+TRANSLATION_MEMORY_MAX_ENTRIES = int(os.getenv("TRANSLATION_MEMORY_MAX_ENTRIES", "200000"))
+
+_conn: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(TRANSLATION_MEMORY_PATH), exist_ok=True)
+        conn = sqlite3.connect(TRANSLATION_MEMORY_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tm ("
+            " target TEXT NOT NULL,"
+            " source_hash TEXT NOT NULL,"
+            " source TEXT NOT NULL,"
+            " translation TEXT NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"  # last stored or hit
+            " PRIMARY KEY (target, source_hash))"
+        )
+        _conn = conn
+    return _conn
+
+
+def _hash(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def lookup(target_language: str, sources: list[str]) -> dict[str, str]:
+    """Return {source: translation} for every source segment already in memory."""
+    if not sources:
+        return {}
+    by_hash = {_hash(s): s for s in sources}
+    found = {}
+    hashes = list(by_hash)
+    with _lock:
+        conn = _connect()
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            rows = conn.execute(
+                f"SELECT source_hash, source, translation FROM tm"
+                f" WHERE target = ? AND source_hash IN ({','.join('?' * len(batch))})",
+                [target_language, *batch],
+            ).fetchall()
+            for source_hash, source, translation in rows:
+                if by_hash.get(source_hash) == source:
+                    found[source] = translation
+        if found:
+            now = time.time()
+            conn.executemany(
+                "UPDATE tm SET hits = hits + 1, updated_at = ? WHERE target = ? AND source_hash = ?",
+                [(now, target_language, _hash(s)) for s in found],
+            )
+            conn.commit()
+    return found
+
+
+def store(target_language: str, pairs: dict[str, str]):
+    """Persist {source: translation} pairs, replacing older entries."""
+    if not pairs:
+        return
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        conn.executemany(
+            "INSERT INTO tm (target, source_hash, source, translation, updated_at) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(target, source_hash) DO UPDATE SET translation = excluded.translation,"
+            " updated_at = excluded.updated_at",
+            [(target_language, _hash(s), s, t, now) for s, t in pairs.items()],
+        )
+        conn.commit()
+
+
+def purge():
+    """Drop segments unused for TRANSLATION_MEMORY_TTL_DAYS and the least recently used beyond the cap."""
+    cutoff = time.time() - TRANSLATION_MEMORY_TTL_DAYS * 86400
+    with _lock:
+        conn = _connect()
+        conn.execute("DELETE FROM tm WHERE updated_at < ?", (cutoff,))
+        conn.execute(
+            "DELETE FROM tm WHERE rowid IN ("
+            " SELECT rowid FROM tm ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (TRANSLATION_MEMORY_MAX_ENTRIES,),
+        )
+        conn.commit()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import resource
+import time
+from contextlib import asynccontextmanager
+
+from app.utils import metrics
+
+# Memory-aware admission: stages reserve their estimated peak cost against a process budget
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "480"))
+RECHECK_SECONDS = 1.0
+
+# Estimated peak memory per stage (MB). Stages at or below FREE_STAGE_MB are never gated.
+STAGE_COSTS_MB = {
+    "render": 450,  # Playwright / Chromium
+    "parse": 60,  # BeautifulSoup + lxml over a full page
+    "image": 150,  # one Pillow decode in the image pool (a 50 MP RGB frame)
+    "llm": 0,  # waiting on OpenRouter
+}
+FREE_STAGE_MB = 1
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _statm_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass  # exited meanwhile
+    return children
+
+
+def process_rss_mb() -> float:
+    """Resident set size of this process and its descendants — Chromium and the image pool run
+    as child processes (peak RSS of this process alone where /proc is unavailable)."""
+    try:
+        total = _statm_rss_mb(os.getpid())
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    pending = _children(os.getpid())
+    while pending:
+        pid = pending.pop()
+        try:
+            total += _statm_rss_mb(pid)
+        except (OSError, ValueError, IndexError):
+            continue
+        pending.extend(_children(pid))
+    return total
+
+
+class AdmissionController:
+    """Admit work per stage while measured RSS plus outstanding reservations fit the budget.
+
+    Reservations are added on top of the RSS measured when the process was last
+    idle, so memory a stage has not allocated yet is still accounted for. With
+    nothing reserved, a stage is always admitted so an over-budget baseline
+    cannot deadlock the queue.
+    """
+
+    def __init__(self, budget_mb: int):
+        self.budget_mb = budget_mb
+        self._reserved_mb = 0.0
+        self._active = 0
+        self._baseline_mb: float | None = None
+        self._cond = asyncio.Condition()
+
+    def _fits(self, cost_mb: float) -> bool:
+        rss = process_rss_mb()
+        metrics.set_gauge("admission.rss_mb", round(rss, 1))
+        if self._active == 0:
+            self._baseline_mb = rss
+            return True
+        projected = max(rss, (self._baseline_mb or rss) + self._reserved_mb) + cost_mb
+        return projected <= self.budget_mb
+
+    @asynccontextmanager
+    async def reserve(self, stage: str):
+        cost_mb = STAGE_COSTS_MB.get(stage, 0)
+        if cost_mb <= FREE_STAGE_MB:
+            yield
+            return
+        start = time.monotonic()
+        async with self._cond:
+            while not self._fits(cost_mb):
+                try:
+                    # RSS changes without notifications (GC, other stages), so re-check periodically
+                    await asyncio.wait_for(self._cond.wait(), timeout=RECHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            self._reserved_mb += cost_mb
+            self._active += 1
+            metrics.set_gauge("admission.reserved_mb", self._reserved_mb)
+        metrics.observe("admission.wait_seconds", time.monotonic() - start, stage=stage)
+        metrics.incr("admission.admitted", stage=stage)
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._reserved_mb -= cost_mb
+                self._active -= 1
+                metrics.set_gauge("admission.reserved_mb", self._reserved_mb)
+                self._cond.notify_all()
+
+
+admission = AdmissionController(MEMORY_BUDGET_MB)
@@ -1,42 +1,551 @@
 import asyncio
+import gc
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
 from datetime import datetime
-from app.models.schemas import ScrapeStatus
-
-# In-memory job storage
-jobs: dict[str, ScrapeStatus] = {}
-job_timestamps: dict[str, datetime] = {}
-# Internal data not exposed via API (raw_html, api_key, etc. for review/refine)
-job_internal: dict[str, dict] = {}
-# asyncio Task references for cancellation
+from app.models.job_record import JobRecord
+from app.utils import coalesce, expiry, metrics
+from app.utils.blob_store import BlobStore
+from app.utils.events import events, job_delta
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps jobs in this process; "sqlite" shares them between uvicorn workers
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "/tmp/scraper_jobs/jobs.db")
+CANCEL_POLL_SECONDS = 1.0
+# "inline" runs jobs in the API process; "process" queues them for worker processes (app.worker)
+WORKER_MODE = os.getenv("WORKER_MODE", "inline")
+# Internals kept as compressed blobs, loaded only through get_blob()
+BLOB_FIELDS = ("raw_html",)
+# A shared (SQLite) store leases each processing job to the process running it; the lease is
+# renewed while that process lives, so jobs of a process that died can be failed by the others
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+LEASE_RENEW_SECONDS = JOB_LEASE_SECONDS / 4
+LOST_JOB_ERROR = "處理此工作的伺服器程序已停止，請重新提交網址或從上次步驟繼續。"
+# Told apart from a later process that reuses the pid
+_STARTED_AT = int(time.time())
+
+
+def process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{_STARTED_AT}"
+
+
+def _owner_alive(owner: str) -> bool:
+    """False only for an owner on this host whose process is gone (other hosts can't be checked)."""
+    host, _, rest = owner.partition(":")
+    pid = rest.split(":")[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    if int(pid) == os.getpid():
+        return owner == process_owner()
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore(ABC):
+    """Storage for job status and internal (non-API) state such as raw_html / api_key."""
+
+    in_process = False
+
+    @abstractmethod
+    def create(self, record: JobRecord):
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> JobRecord | None:
+        ...
+
+    @abstractmethod
+    def head(self, job_id: str) -> tuple[int, str] | None:
+        """(version, status) without loading the record."""
+
+    @abstractmethod
+    def update(self, job_id: str, changes: dict, expect_status: str | None = None) -> tuple[JobRecord, JobRecord] | None:
+        """Apply changes and refresh the timestamp; (before, after), or None if unknown, unchanged
+        or (given expect_status) not in that status — checked atomically with the write."""
+
+    @abstractmethod
+    def get_internal(self, job_id: str) -> dict:
+        """Internals without the BLOB_FIELDS."""
+
+    @abstractmethod
+    def set_internal(self, job_id: str, values: dict):
+        ...
+
+    @abstractmethod
+    def get_blob(self, job_id: str, name: str) -> str | None:
+        ...
+
+    @abstractmethod
+    def blob_usage(self) -> dict:
+        """Bytes held by blobs: {"memory_bytes", "disk_bytes", "jobs": {job_id: {...}}}."""
+
+    @abstractmethod
+    def clear_internal(self, job_id: str):
+        ...
+
+    @abstractmethod
+    def asset_refs(self) -> set[str]:
+        """Asset-store hashes referenced by stored job results."""
+
+    @abstractmethod
+    def renew_leases(self):
+        """Extend the leases of the processing jobs this process owns."""
+
+    @abstractmethod
+    def fail_lost(self, error: str) -> list[str]:
+        """Fail processing jobs whose owner is gone (lease expired, owner dead or none); their ids."""
+
+    @abstractmethod
+    def completed_usage(self) -> list[tuple[str, int]]:
+        """(job_id, bytes kept in the store) of completed jobs, least recently updated first."""
+
+    @abstractmethod
+    def expired(self, cutoff: datetime) -> list[tuple[str, JobRecord | None]]:
+        """Jobs last touched before cutoff, with their current status."""
+
+    @abstractmethod
+    def touched(self, job_id: str) -> datetime | None:
+        """When the job was last updated."""
+
+    @abstractmethod
+    def delete(self, job_id: str):
+        ...
+
+    @abstractmethod
+    def request_cancel(self, job_id: str):
+        ...
+
+    @abstractmethod
+    def cancel_requested(self, job_ids: list[str]) -> set[str]:
+        ...
+
+    @abstractmethod
+    def save_batch(self, batch_id: str, data: dict):
+        ...
+
+    @abstractmethod
+    def get_batch(self, batch_id: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def expired_batches(self, cutoff: datetime) -> list[tuple[str, dict]]:
+        """Batches created before cutoff."""
+
+    @abstractmethod
+    def delete_batch(self, batch_id: str):
+        ...
+
+
+class MemoryJobStore(JobStore):
+    in_process = True  # results count against JOB_RESULTS_MAX_MB
+
+    def __init__(self):
+        self.jobs: dict[str, JobRecord] = {}
+        self.timestamps: dict[str, datetime] = {}
+        self.internal: dict[str, dict] = {}
+        self.blobs = BlobStore()
+        self.cancels: set[str] = set()
+        self.batches: dict[str, tuple[dict, datetime]] = {}
+
+    def create(self, record: JobRecord):
+        self.jobs[record.job_id] = record
+        self.timestamps[record.job_id] = datetime.now()
+
+    def get(self, job_id: str) -> JobRecord | None:
+        return self.jobs.get(job_id)
+
+    def head(self, job_id: str) -> tuple[int, str] | None:
+        record = self.jobs.get(job_id)
+        return (record.version, record.status) if record else None
+
+    def update(self, job_id: str, changes: dict, expect_status: str | None = None) -> tuple[JobRecord, JobRecord] | None:
+        record = self.jobs.get(job_id)
+        if record is None or (expect_status is not None and record.status != expect_status):
+            return None
+        before = record.copy()
+        if not record.apply(changes):
+            return None
+        self.timestamps[job_id] = datetime.now()
+        return before, record
+
+    def get_internal(self, job_id: str) -> dict:
+        return self.internal.get(job_id, {})
+
+    def set_internal(self, job_id: str, values: dict):
+        values = dict(values)
+        for name in BLOB_FIELDS:
+            if values.get(name) is not None:
+                self.blobs.put(job_id, name, values.pop(name))
+        self.internal.setdefault(job_id, {}).update(values)
+
+    def get_blob(self, job_id: str, name: str) -> str | None:
+        return self.blobs.get(job_id, name)
+
+    def blob_usage(self) -> dict:
+        return self.blobs.usage()
+
+    def clear_internal(self, job_id: str):
+        self.internal.pop(job_id, None)
+        self.blobs.delete(job_id)
+
+    def asset_refs(self) -> set[str]:
+        return {image.asset for record in list(self.jobs.values()) if record.result
+                for image in record.result.images if image.asset}
+
+    def renew_leases(self):
+        pass  # jobs live and die with this process
+
+    def fail_lost(self, error: str) -> list[str]:
+        return []
+
+    def completed_usage(self) -> list[tuple[str, int]]:
+        # Results are bounded by JOB_RESULTS_MAX_MB; what else a completed job keeps is its blobs
+        blobs = self.blobs.usage()["jobs"]
+        completed = sorted(
+            (ts, jid) for jid, ts in list(self.timestamps.items())
+            if (record := self.jobs.get(jid)) and record.status == "completed"
+        )
+        return [(jid, sum(blobs.get(jid, {}).values())) for _, jid in completed]
+
+    def expired(self, cutoff: datetime) -> list[tuple[str, JobRecord | None]]:
+        return [(jid, self.jobs.get(jid)) for jid, ts in self.timestamps.items() if ts < cutoff]
+
+    def touched(self, job_id: str) -> datetime | None:
+        return self.timestamps.get(job_id)
+
+    def delete(self, job_id: str):
+        self.jobs.pop(job_id, None)
+        self.timestamps.pop(job_id, None)
+        self.internal.pop(job_id, None)
+        self.blobs.delete(job_id)
+        self.cancels.discard(job_id)
+
+    def request_cancel(self, job_id: str):
+        self.cancels.add(job_id)
+
+    def cancel_requested(self, job_ids: list[str]) -> set[str]:
+        return self.cancels.intersection(job_ids)
+
+    def save_batch(self, batch_id: str, data: dict):
+        created = self.batches.get(batch_id, (None, datetime.now()))[1]
+        self.batches[batch_id] = (data, created)
+
+    def get_batch(self, batch_id: str) -> dict | None:
+        entry = self.batches.get(batch_id)
+        return entry[0] if entry else None
+
+    def expired_batches(self, cutoff: datetime) -> list[tuple[str, dict]]:
+        return [(bid, data) for bid, (data, created) in self.batches.items() if created < cutoff]
+
+    def delete_batch(self, batch_id: str):
+        self.batches.pop(batch_id, None)
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite (WAL) store — several worker processes can share jobs.
+
+    raw_html is kept zlib-compressed in its own column, outside the JSON internals,
+    and only read by get_blob().
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_internal ("
+            " job_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " raw_html BLOB)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            " batch_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        if "owner" not in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            # Stores from before leases: their processing rows count as unowned
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _lease(record: JobRecord) -> tuple[str | None, float | None]:
+        if record.status != "processing":
+            return None, None
+        return process_owner(), time.time() + JOB_LEASE_SECONDS
+
+    def _execute(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    def create(self, record: JobRecord):
+        self._execute(
+            "INSERT INTO jobs (job_id, data, updated_at, owner, lease_until) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(job_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at,"
+            " owner = excluded.owner, lease_until = excluded.lease_until",
+            (record.job_id, record.to_json(), datetime.now().timestamp(), *self._lease(record)),
+        )
+
+    def get(self, job_id: str) -> JobRecord | None:
+        rows = self._execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,))
+        return JobRecord.from_json(rows[0][0]) if rows else None
+
+    def head(self, job_id: str) -> tuple[int, str] | None:
+        rows = self._execute(
+            "SELECT json_extract(data, '$.version'), json_extract(data, '$.status') FROM jobs WHERE job_id = ?",
+            (job_id,),
+        )
+        return (rows[0][0] or 0, rows[0][1]) if rows else None
+
+    def update(self, job_id: str, changes: dict, expect_status: str | None = None) -> tuple[JobRecord, JobRecord] | None:
+        # Read-modify-write under one transaction so concurrent writers can't lose a version
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                record = JobRecord.from_json(row[0]) if row else None
+                before = record.copy() if record else None
+                if record is None or (expect_status is not None and record.status != expect_status) \
+                        or not record.apply(changes):
+                    self._conn.rollback()
+                    return None
+                # Whoever moves a job to (or keeps it in) processing holds its lease
+                self._conn.execute(
+                    "UPDATE jobs SET data = ?, updated_at = ?, owner = ?, lease_until = ? WHERE job_id = ?",
+                    (record.to_json(), datetime.now().timestamp(), *self._lease(record), job_id),
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return before, record
+
+    def get_internal(self, job_id: str) -> dict:
+        rows = self._execute("SELECT data FROM job_internal WHERE job_id = ?", (job_id,))
+        return json.loads(rows[0][0]) if rows else {}
+
+    def get_blob(self, job_id: str, name: str) -> str | None:
+        if name not in BLOB_FIELDS:
+            return None
+        rows = self._execute(f"SELECT {name} FROM job_internal WHERE job_id = ?", (job_id,))
+        if not rows or rows[0][0] is None:
+            return None
+        return zlib.decompress(rows[0][0]).decode("utf-8")
+
+    def blob_usage(self) -> dict:
+        rows = self._execute("SELECT job_id, length(raw_html) FROM job_internal WHERE raw_html IS NOT NULL")
+        jobs = {jid: {"memory_bytes": 0, "disk_bytes": size} for jid, size in rows}
+        return {"memory_bytes": 0, "disk_bytes": sum(size for _, size in rows), "jobs": jobs}
+
+    def set_internal(self, job_id: str, values: dict):
+        values = dict(values)
+        raw_html = values.pop("raw_html", None)
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM job_internal WHERE job_id = ?", (job_id,)).fetchone()
+            data = json.loads(row[0]) if row else {}
+            data.update(values)
+            self._conn.execute(
+                "INSERT INTO job_internal (job_id, data) VALUES (?, ?)"
+                " ON CONFLICT(job_id) DO UPDATE SET data = excluded.data",
+                (job_id, json.dumps(data, ensure_ascii=False)),
+            )
+            if raw_html is not None:
+                self._conn.execute(
+                    "UPDATE job_internal SET raw_html = ? WHERE job_id = ?",
+                    (zlib.compress(raw_html.encode("utf-8"), 6), job_id),
+                )
+            self._conn.commit()
+
+    def clear_internal(self, job_id: str):
+        self._execute("DELETE FROM job_internal WHERE job_id = ?", (job_id,))
+
+    def asset_refs(self) -> set[str]:
+        rows = self._execute(
+            "SELECT DISTINCT json_extract(image.value, '$.asset')"
+            " FROM jobs, json_each(jobs.data, '$.result.images') AS image"
+        )
+        return {row[0] for row in rows if row[0]}
+
+    def renew_leases(self):
+        self._execute(
+            "UPDATE jobs SET lease_until = ? WHERE owner = ?",
+            (time.time() + JOB_LEASE_SECONDS, process_owner()),
+        )
+
+    def fail_lost(self, error: str) -> list[str]:
+        failed = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT job_id, data, owner, lease_until FROM jobs"
+                    " WHERE json_extract(data, '$.status') = 'processing'"
+                ).fetchall()
+                now = time.time()
+                for job_id, data, owner, lease_until in rows:
+                    if owner and (lease_until or 0) >= now and _owner_alive(owner):
+                        continue
+                    record = JobRecord.from_json(data)
+                    record.apply({"status": "failed", "error": error, "progress": None})
+                    self._conn.execute(
+                        "UPDATE jobs SET data = ?, updated_at = ?, owner = NULL, lease_until = NULL WHERE job_id = ?",
+                        (record.to_json(), now, job_id),
+                    )
+                    failed.append(job_id)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return failed
+
+    def completed_usage(self) -> list[tuple[str, int]]:
+        return self._execute(
+            "SELECT jobs.job_id, length(CAST(jobs.data AS BLOB))"
+            " + coalesce(length(CAST(job_internal.data AS BLOB)), 0) + coalesce(length(job_internal.raw_html), 0)"
+            " FROM jobs LEFT JOIN job_internal USING (job_id)"
+            " WHERE json_extract(jobs.data, '$.status') = 'completed' ORDER BY jobs.updated_at"
+        )
+
+    def expired(self, cutoff: datetime) -> list[tuple[str, JobRecord | None]]:
+        rows = self._execute("SELECT job_id, data FROM jobs WHERE updated_at < ?", (cutoff.timestamp(),))
+        return [(jid, JobRecord.from_json(data)) for jid, data in rows]
+
+    def touched(self, job_id: str) -> datetime | None:
+        rows = self._execute("SELECT updated_at FROM jobs WHERE job_id = ?", (job_id,))
+        return datetime.fromtimestamp(rows[0][0]) if rows else None
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM job_internal WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+    def request_cancel(self, job_id: str):
+        self._execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+
+    def cancel_requested(self, job_ids: list[str]) -> set[str]:
+        if not job_ids:
+            return set()
+        rows = self._execute(
+            f"SELECT job_id FROM jobs WHERE cancel_requested = 1 AND job_id IN ({','.join('?' * len(job_ids))})",
+            tuple(job_ids),
+        )
+        return {row[0] for row in rows}
+
+    def save_batch(self, batch_id: str, data: dict):
+        self._execute(
+            "INSERT INTO batches (batch_id, data, created_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(batch_id) DO UPDATE SET data = excluded.data",
+            (batch_id, json.dumps(data, ensure_ascii=False), datetime.now().timestamp()),
+        )
+
+    def get_batch(self, batch_id: str) -> dict | None:
+        rows = self._execute("SELECT data FROM batches WHERE batch_id = ?", (batch_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def expired_batches(self, cutoff: datetime) -> list[tuple[str, dict]]:
+        rows = self._execute("SELECT batch_id, data FROM batches WHERE created_at < ?", (cutoff.timestamp(),))
+        return [(bid, json.loads(data)) for bid, data in rows]
+
+    def delete_batch(self, batch_id: str):
+        self._execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+
+
+def _make_store() -> JobStore:
+    if JOB_STORE == "sqlite" or WORKER_MODE == "process":
+        return SQLiteJobStore(JOB_STORE_PATH)
+    return MemoryJobStore()
+
+
+store: JobStore = _make_store()
+# asyncio Task references for cancellation (always local to this process)
 job_tasks: dict[str, asyncio.Task] = {}
 
-def create_job(job_id: str) -> ScrapeStatus:
-    status = ScrapeStatus(job_id=job_id, status="processing", progress="Starting...")
-    jobs[job_id] = status
-    job_timestamps[job_id] = datetime.now()
-    return status
+async def create_job(job_id: str, batch_id: str | None = None) -> JobRecord:
+    record = JobRecord(job_id, "processing", progress="Starting...", batch_id=batch_id)
+    await _off_loop(store.create, record)
+    expiry.note_created(job_id)
+    return record
+
+async def _off_loop(fn, *args):
+    """Run a store call; SQLite I/O (which can wait on other writers) goes to a thread."""
+    if store.in_process:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
 
-def update_job(job_id: str, **kwargs):
-    if job_id in jobs:
-        job_timestamps[job_id] = datetime.now()
-        updated = jobs[job_id].model_copy(update=kwargs)
-        jobs[job_id] = updated
-        return updated
-    return None
+async def update_job(job_id: str, mirror: bool = True, expect_status: str | None = None, **kwargs) -> bool:
+    """Update a job; updates of a coalesced run are mirrored to the jobs sharing it (mirror=False: this job only).
 
-def get_job(job_id: str) -> ScrapeStatus | None:
-    return jobs.get(job_id)
+    With expect_status, a job is only updated while in that status. True if any job changed.
+    """
+    updated = False
+    for target in (coalesce.route(job_id, kwargs) if mirror else [job_id]):
+        changed = await _off_loop(store.update, target, kwargs, expect_status)
+        if changed is None:
+            continue
+        updated = True
+        before, after = changed
+        events.publish(target, job_delta(before, after))
+        held = expiry.result_bytes(after.result) if store.in_process else 0
+        if after.status == "completed" and before.status != "completed":
+            expiry.note_completed(target, held)
+        elif before.result is not after.result:
+            expiry.completed.resize(target, held)
+    return updated
 
-def set_job_internal(job_id: str, **kwargs):
-    if job_id not in job_internal:
-        job_internal[job_id] = {}
-    job_internal[job_id].update(kwargs)
+async def get_job(job_id: str) -> JobRecord | None:
+    return await _off_loop(store.get, job_id)
 
-def get_job_internal(job_id: str) -> dict:
-    return job_internal.get(job_id, {})
+async def get_job_head(job_id: str) -> tuple[int, str] | None:
+    return await _off_loop(store.head, job_id)
 
-def clear_job_internal(job_id: str):
-    job_internal.pop(job_id, None)
+async def set_job_internal(job_id: str, **kwargs):
+    # Always in a thread: even the memory store compresses raw_html here
+    await asyncio.to_thread(store.set_internal, job_id, kwargs)
+
+async def get_job_internal(job_id: str) -> dict:
+    return await _off_loop(store.get_internal, job_id)
+
+async def get_job_raw_html(job_id: str) -> str | None:
+    """Decompress the job's rendered HTML (only refine needs it) — in a thread, whatever the store."""
+    return await asyncio.to_thread(store.get_blob, job_id, "raw_html")
+
+async def clear_job_internal(job_id: str):
+    await _off_loop(store.clear_internal, job_id)
+
+async def save_batch(batch_id: str, data: dict):
+    await _off_loop(store.save_batch, batch_id, data)
+
+async def get_batch(batch_id: str) -> dict | None:
+    return await _off_loop(store.get_batch, batch_id)
 
 def set_job_task(job_id: str, task: asyncio.Task):
     job_tasks[job_id] = task
@@ -46,3 +555,50 @@ def get_job_task(job_id: str) -> asyncio.Task | None:
 
 def clear_job_task(job_id: str):
     job_tasks.pop(job_id, None)
+
+def cancel_task(job_id: str, task: asyncio.Task):
+    """Cancel a job's task; once its teardown (browser context, HTTP/LLM requests, ...) has run,
+    record how long the resources took to be released."""
+    requested = time.monotonic()
+
+    def released(_):
+        gc.collect()
+        seconds = time.monotonic() - requested
+        metrics.observe("cancel.release_seconds", seconds)
+        logger.info("Job %s released its resources %.2fs after cancel", job_id, seconds)
+
+    task.add_done_callback(released)
+    task.cancel()
+
+async def request_job_cancel(job_id: str):
+    """Ask whichever worker process owns the job to cancel it."""
+    await _off_loop(store.request_cancel, job_id)
+
+async def watch_cancellations():
+    """Cancel local job tasks whose cancellation was requested through a shared store."""
+    while True:
+        await asyncio.sleep(CANCEL_POLL_SECONDS)
+        for job_id in await _off_loop(store.cancel_requested, list(job_tasks)):
+            task = job_tasks.get(job_id)
+            if task and not task.done():
+                cancel_task(job_id, task)
+
+async def keep_leases():
+    """Renew the leases of the jobs this process is running, for as long as it runs."""
+    while True:
+        await asyncio.sleep(LEASE_RENEW_SECONDS)
+        try:
+            await _off_loop(store.renew_leases)
+        except sqlite3.Error:
+            logger.warning("Renewing job leases failed", exc_info=True)
+
+async def fail_lost_jobs() -> list[str]:
+    """Fail processing jobs whose process died or restarted (inline mode; in process mode the
+    worker pool recovers the queue's claims instead)."""
+    if WORKER_MODE != "inline":
+        return []
+    failed = await _off_loop(store.fail_lost, LOST_JOB_ERROR)
+    if failed:
+        logger.warning("Failed %d job(s) left processing by a lost process: %s", len(failed), ", ".join(failed))
+        metrics.incr("jobs.lost", len(failed))
+    return failed
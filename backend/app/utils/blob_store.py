@@ -0,0 +1,100 @@
+import os
+import threading
+import zlib
+
+from app.utils import metrics
+
+# Large per-job values (rendered raw HTML) kept out of the job internals: zlib-compressed,
+# in memory while small, spilled to BLOB_DIR once the compressed size passes BLOB_SPILL_BYTES
+BLOB_DIR = os.getenv("BLOB_DIR", "/tmp/scraper_blobs")
+BLOB_SPILL_BYTES = int(os.getenv("BLOB_SPILL_BYTES", str(128 * 1024)))
+COMPRESS_LEVEL = 6
+
+
+class BlobStore:
+    """Compressed blobs per (job_id, name). Nothing is decompressed until get()."""
+
+    def __init__(self, directory: str = BLOB_DIR, spill_bytes: int = BLOB_SPILL_BYTES):
+        self.directory = directory
+        self.spill_bytes = spill_bytes
+        self._lock = threading.Lock()
+        self._memory: dict[tuple[str, str], bytes] = {}
+        self._held: dict[str, dict[str, tuple[int, bool]]] = {}  # job_id -> name -> (bytes, on disk)
+
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{name}.z")
+
+    def put(self, job_id: str, name: str, text: str):
+        raw = text.encode("utf-8")
+        blob = zlib.compress(raw, COMPRESS_LEVEL)
+        spill = len(blob) > self.spill_bytes
+        if spill:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(job_id, name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(blob)
+            os.replace(path + ".tmp", path)
+        with self._lock:
+            if spill:
+                self._memory.pop((job_id, name), None)
+            else:
+                self._memory[(job_id, name)] = blob
+            previous = self._held.setdefault(job_id, {}).get(name)
+            self._held[job_id][name] = (len(blob), spill)
+        if previous and previous[1] and not spill:
+            self._remove_file(job_id, name)
+        metrics.observe("blob_store.compression_ratio", len(blob) / max(1, len(raw)))
+        self._update_gauges()
+
+    def get(self, job_id: str, name: str) -> str | None:
+        with self._lock:
+            held = self._held.get(job_id, {}).get(name)
+            blob = self._memory.get((job_id, name))
+        if held is None:
+            return None
+        if blob is None:
+            try:
+                with open(self._path(job_id, name), "rb") as f:
+                    blob = f.read()
+            except FileNotFoundError:
+                return None
+        return zlib.decompress(blob).decode("utf-8")
+
+    def delete(self, job_id: str):
+        """Drop every blob of a job."""
+        with self._lock:
+            held = self._held.pop(job_id, {})
+            for name in held:
+                self._memory.pop((job_id, name), None)
+        for name, (_, on_disk) in held.items():
+            if on_disk:
+                self._remove_file(job_id, name)
+        if held:
+            self._update_gauges()
+
+    def _remove_file(self, job_id: str, name: str):
+        try:
+            os.remove(self._path(job_id, name))
+        except FileNotFoundError:
+            pass
+
+    def usage(self) -> dict:
+        """Held (compressed) bytes per job and in total, split into memory and disk."""
+        with self._lock:
+            jobs = {
+                job_id: {
+                    "memory_bytes": sum(size for size, on_disk in held.values() if not on_disk),
+                    "disk_bytes": sum(size for size, on_disk in held.values() if on_disk),
+                }
+                for job_id, held in self._held.items()
+            }
+        return {
+            "memory_bytes": sum(j["memory_bytes"] for j in jobs.values()),
+            "disk_bytes": sum(j["disk_bytes"] for j in jobs.values()),
+            "jobs": jobs,
+        }
+
+    def _update_gauges(self):
+        totals = self.usage()
+        metrics.set_gauge("blob_store.memory_bytes", totals["memory_bytes"])
+        metrics.set_gauge("blob_store.disk_bytes", totals["disk_bytes"])
@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import zlib
+from typing import Any
+
+from app.utils import metrics
+
+# Stage outputs of a job (fetched HTML, analysis, extraction, cleaned HTML, ...) so a failed
+# or timed-out job can resume from its last completed stage. Kept on disk: they must outlive
+# the process, and worker processes resume jobs other processes started.
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "/tmp/scraper_checkpoints")
+COMPRESS_LEVEL = 6
+
+
+def _path(job_id: str, stage: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, job_id, f"{stage}.json.z")
+
+
+def save(job_id: str, stage: str, value: Any):
+    path = _path(job_id, stage)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), COMPRESS_LEVEL)
+    with open(path + ".tmp", "wb") as f:
+        f.write(blob)
+    os.replace(path + ".tmp", path)
+    metrics.incr("checkpoints.saved", stage=stage)
+
+
+def stages(job_id: str) -> set[str]:
+    """Stages with a checkpoint."""
+    try:
+        names = os.listdir(os.path.join(CHECKPOINT_DIR, job_id))
+    except FileNotFoundError:
+        return set()
+    return {name[:-len(".json.z")] for name in names if name.endswith(".json.z")}
+
+
+def load_many(job_id: str, names: set[str]) -> dict[str, Any]:
+    """Checkpointed values of the given stages (missing ones are left out)."""
+    restored = {}
+    for stage in names:
+        try:
+            with open(_path(job_id, stage), "rb") as f:
+                restored[stage] = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except FileNotFoundError:
+            continue
+        metrics.incr("checkpoints.restored", stage=stage)
+    return restored
+
+
+def load(job_id: str, stage: str) -> Any | None:
+    return load_many(job_id, {stage}).get(stage)
+
+
+def copy(src_job_id: str, dst_job_id: str, exclude: tuple[str, ...] = ()):
+    """Give another job the checkpoints of src (e.g. the jobs sharing a coalesced run)."""
+    for stage in stages(src_job_id) - set(exclude):
+        dst = _path(dst_job_id, stage)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copyfile(_path(src_job_id, stage), dst)
+
+
+def clear(job_id: str):
+    shutil.rmtree(os.path.join(CHECKPOINT_DIR, job_id), ignore_errors=True)
@@ -1,34 +1,110 @@
 import asyncio
-import shutil
-import os
+import time
 from datetime import datetime, timedelta
-from app.utils.background import jobs, job_timestamps, job_internal, job_tasks
+from app.utils import checkpoints, expiry, metrics
+from app.utils.background import store, job_tasks, fail_lost_jobs
+from app.utils.events import events
+from app.utils.expiry import MAX_AGE_MINUTES, JOB_RESULTS_MAX_MB, JOB_STORE_MAX_MB
+from app.services import asset_store, result_cache, translation_memory
 
-JOBS_DIR = "/tmp/scraper_jobs"
-MAX_AGE_MINUTES = 30
-CLEANUP_INTERVAL_SECONDS = 120  # 2 minutes
+CLEANUP_INTERVAL_SECONDS = 120  # lost jobs, store sweep and quota, caches and batches
+QUOTA_CHECK_SECONDS = 5  # longest sleep between deadline / result memory checks
+MB = 1024 * 1024
 
 async def start_cleanup_task():
+    last_sweep = time.monotonic()
     while True:
-        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
-        cleanup_old_jobs()
+        next_due = expiry.deadlines.next_deadline()
+        delay = QUOTA_CHECK_SECONDS if next_due is None else min(QUOTA_CHECK_SECONDS, max(0.0, next_due - time.time()))
+        await asyncio.sleep(delay)
+        expire_due_jobs()
+        enforce_quotas()
+        if time.monotonic() - last_sweep >= CLEANUP_INTERVAL_SECONDS:
+            last_sweep = time.monotonic()
+            await fail_lost_jobs()
+            cleanup_old_jobs()
+            await enforce_store_quota()
+            await purge_assets()
+            await purge_caches()
 
-def _is_safe_to_clean(jid: str) -> bool:
-    job = jobs.get(jid)
+def _is_safe_to_clean(job) -> bool:
     if job is None:
         return True
     return job.status not in ("processing", "awaiting_review")
 
+def remove_job(jid: str, reason: str):
+    task = job_tasks.pop(jid, None)
+    if task and not task.done():
+        task.cancel()
+    store.delete(jid)
+    events.drop(jid)
+    expiry.forget(jid)
+    checkpoints.clear(jid)
+    metrics.incr("jobs.evicted", reason=reason)
+
+def expire_due_jobs():
+    """Jobs at their deadline go, unless updated since (or still running / in review) — then the deadline moves."""
+    now = time.time()
+    max_age = MAX_AGE_MINUTES * 60
+    for jid in expiry.deadlines.pop_due(now):
+        touched = store.touched(jid)
+        if touched is None:
+            expiry.forget(jid)
+            continue
+        deadline = touched.timestamp() + max_age
+        if deadline > now:
+            expiry.deadlines.schedule(jid, deadline)
+        elif not _is_safe_to_clean(store.get(jid)):
+            expiry.deadlines.schedule(jid, now + max_age)
+        else:
+            remove_job(jid, "age")
+
+def enforce_quotas():
+    """Evict least recently used completed jobs while their results held in memory exceed JOB_RESULTS_MAX_MB."""
+    if not store.in_process:
+        return
+    for jid in expiry.completed.over_quota(int(JOB_RESULTS_MAX_MB * MB)):
+        remove_job(jid, "memory_quota")
+
+def _store_quota_victims(max_bytes: int) -> list[str]:
+    usage = store.completed_usage()
+    total = sum(size for _, size in usage)
+    metrics.set_gauge("jobs.store_bytes", total)
+    victims = []
+    for jid, size in usage:
+        if total <= max_bytes:
+            break
+        victims.append(jid)
+        total -= size
+    return victims
+
+async def enforce_store_quota():
+    """Evict least recently updated completed jobs while what they keep in the store (SQLite rows and
+    blobs, or the memory store's blobs) exceeds JOB_STORE_MAX_MB — with a SQLite store, results
+    are otherwise bounded only by age."""
+    for jid in await asyncio.to_thread(_store_quota_victims, int(JOB_STORE_MAX_MB * MB)):
+        remove_job(jid, "store_quota")
+
+async def purge_assets():
+    """Evict stored images off the event loop, keeping those of jobs still in the store (their
+    ZIPs — and any Range resume of them — read the images from there)."""
+    pinned = await asyncio.to_thread(store.asset_refs)
+    await asyncio.to_thread(asset_store.purge, pinned)
+
+async def purge_caches():
+    """Trim the result cache and the translation memory off the event loop."""
+    await asyncio.to_thread(result_cache.purge)
+    await asyncio.to_thread(translation_memory.purge)
+
 def cleanup_old_jobs():
     cutoff = datetime.now() - timedelta(minutes=MAX_AGE_MINUTES)
-    expired = [jid for jid, ts in job_timestamps.items() if ts < cutoff and _is_safe_to_clean(jid)]
-    for jid in expired:
-        task = job_tasks.pop(jid, None)
-        if task and not task.done():
-            task.cancel()
-        jobs.pop(jid, None)
-        job_timestamps.pop(jid, None)
-        job_internal.pop(jid, None)
-        job_dir = os.path.join(JOBS_DIR, jid)
-        if os.path.exists(job_dir):
-            shutil.rmtree(job_dir, ignore_errors=True)
+    if not store.in_process:
+        # Jobs created by other processes (or before a restart) aren't on this process's deadline heap
+        for jid, job in store.expired(cutoff):
+            if _is_safe_to_clean(job):
+                remove_job(jid, "age")
+
+    # A batch goes once none of its jobs are left
+    for bid, batch in store.expired_batches(cutoff):
+        if all(store.get(item["job_id"]) is None for item in batch.get("items", [])):
+            store.delete_batch(bid)
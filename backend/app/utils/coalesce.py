@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+
+from app.utils import metrics
+from app.utils.urls import normalize_url
+
+# Single-flight: identical submissions share one pipeline run. Each submission keeps its
+# own job id; the pipeline's progress is mirrored to all of them and, once the run ends,
+# every member gets the outcome and continues (review / refine / confirm) independently.
+_NON_TERMINAL = (None, "processing")
+
+
+@dataclass
+class Flight:
+    key: str
+    pipeline_id: str  # job id the shared run reports under
+    members: list[str] = field(default_factory=list)  # job ids still waiting on the run
+    state: dict = field(default_factory=dict)  # latest status/result/error of the run
+
+
+_lock = threading.Lock()
+_by_key: dict[str, Flight] = {}
+_by_pipeline: dict[str, Flight] = {}
+_by_member: dict[str, Flight] = {}
+
+
+def _key_hash(api_key: str | None) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest() if api_key else ""
+
+
+def flight_key(url: str, product_model: str | None, api_key: str | None, ai_model: str | None,
+               reasoning_effort: str | None, firecrawl_api_key: str | None, auto_confirm: bool) -> str:
+    """Normalized URL plus every option that changes the output, and the (hashed) keys the run
+    is billed to — only submissions paying with the same keys share a run."""
+    parts = [normalize_url(url), product_model or "", _key_hash(api_key), ai_model or "", reasoning_effort or "",
+             _key_hash(firecrawl_api_key), auto_confirm]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def start(key: str, job_id: str):
+    with _lock:
+        flight = Flight(key, job_id, [job_id])
+        _by_key[key] = _by_pipeline[job_id] = _by_member[job_id] = flight
+
+
+def join(key: str, job_id: str) -> str | None:
+    """Attach job_id to a running flight with this key; returns its pipeline id (None = start one)."""
+    with _lock:
+        flight = _by_key.get(key)
+        if flight is None:
+            return None
+        flight.members.append(job_id)
+        _by_member[job_id] = flight
+    metrics.incr("coalesce.joined")
+    return flight.pipeline_id
+
+
+def pipeline_of(job_id: str) -> str:
+    with _lock:
+        flight = _by_member.get(job_id)
+        return flight.pipeline_id if flight else job_id
+
+
+def route(job_id: str, changes: dict) -> list[str]:
+    """Job ids an update reported under job_id should be written to.
+
+    Progress updates of a shared run go to every member; its outcome (a status
+    other than "processing") only to the pipeline job itself, if still a member —
+    other members receive it when the flight lands.
+    """
+    with _lock:
+        flight = _by_pipeline.get(job_id)
+        if flight is None:
+            return [job_id]
+        flight.state.update(changes)
+        if changes.get("status") in _NON_TERMINAL:
+            return list(flight.members)
+        return [job_id] if job_id in flight.members else []
+
+
+def leave(job_id: str) -> tuple[str | None, bool]:
+    """Detach a member (e.g. cancelled). Returns (pipeline id, whether other members still need the run)."""
+    with _lock:
+        flight = _by_member.pop(job_id, None)
+        if flight is None:
+            return None, False
+        flight.members.remove(job_id)
+        if flight.members:
+            return flight.pipeline_id, True
+        # Nobody left — later submissions must start a fresh run
+        _by_key.pop(flight.key, None)
+        _by_pipeline.pop(flight.pipeline_id, None)
+        return flight.pipeline_id, False
+
+
+def finish(pipeline_id: str) -> Flight | None:
+    """End the flight run under pipeline_id; returns it (members + final state) for landing."""
+    with _lock:
+        flight = _by_pipeline.pop(pipeline_id, None)
+        if flight is None:
+            return None
+        if _by_key.get(flight.key) is flight:
+            del _by_key[flight.key]
+        for member in flight.members:
+            _by_member.pop(member, None)
+        return flight
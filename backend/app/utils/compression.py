@@ -0,0 +1,135 @@
+import os
+import zlib
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils import metrics
+
+# Negotiated response compression (brotli preferred, then gzip) for bodies above a size threshold.
+# Event streams are left alone (compressing them would hold events back); so are bodies that are
+# already compressed (ZIPs, images) and partial (Range) responses.
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # 5–6 is the usual sweet spot for on-the-fly compression
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+ENCODINGS = ("br", "gzip")  # server preference when the client weights them equally
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Best encoding the client accepts (by q-value, then ENCODINGS order); None for identity."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                continue
+        weights[name.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Compressed data; non-final chunks are flushed so streamed bodies reach the client as they go."""
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+class _CompressingSend:
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Message | None = None
+        self.compressor: _Compressor | None = None
+        self.bytes_in = self.bytes_out = 0
+
+    @staticmethod
+    def _compressible(start: Message, headers: MutableHeaders) -> bool:
+        if start["status"] in (204, 206, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start = message  # held until the first body chunk shows whether to compress
+            return
+        if message["type"] != "http.response.body":
+            if self.start is not None:
+                await self._send(self.start)
+                self.start = None
+            await self._send(message)
+            return
+
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(scope=start)
+            compressible = self._compressible(start, headers)
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if not compressible or (not more_body and len(body) < self.minimum_size):
+                await self._send(start)
+                await self._send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            data = self._compress(body, final=not more_body)
+            headers["Content-Encoding"] = self.encoding
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(data))
+            metrics.incr("http.compression.responses", encoding=self.encoding)
+            await self._send(start)
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+        elif self.compressor is None:
+            await self._send(message)
+        else:
+            data = self._compress(body, final=not more_body)
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+        if not more_body and self.compressor is not None:
+            metrics.incr("http.compression.bytes_in", self.bytes_in, encoding=self.encoding)
+            metrics.incr("http.compression.bytes_out", self.bytes_out, encoding=self.encoding)
+
+    def _compress(self, body: bytes, final: bool) -> bytes:
+        data = self.compressor.compress(body, final)
+        self.bytes_in += len(body)
+        self.bytes_out += len(data)
+        return data
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+from app.models.job_record import FIELDS, JobRecord
+
+# Per-job event bus fed by update_job: subscribers (SSE / WebSocket) get status/progress
+# transitions and result deltas instead of re-fetching the whole ScrapeStatus.
+BACKLOG_SIZE = 64  # events kept per job for Last-Event-ID resume
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+@dataclass(eq=False)
+class Subscriber:
+    job_id: str
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+
+
+def job_delta(old: JobRecord | None, new: JobRecord) -> dict:
+    """Changed top-level fields; "result" carries only the changed result fields (or None if removed)."""
+    if old is None:
+        return new.to_dict()
+    delta = {}
+    for name in FIELDS:
+        before, after = getattr(old, name), getattr(new, name)
+        if before == after:
+            continue
+        if name == "result" and before is not None and after is not None:
+            delta["result"] = {
+                k: v for k, v in after.model_dump(mode="json").items()
+                if getattr(before, k) != getattr(after, k)
+            }
+        else:
+            delta[name] = new.to_dict((name,))[name]
+    return delta
+
+
+class JobEvents:
+    def __init__(self):
+        # update_job may run in a worker thread (sync background tasks), so state is lock-protected
+        self._lock = threading.Lock()
+        self._seq: dict[str, int] = {}
+        self._backlog: dict[str, deque[dict]] = {}
+        self._subscribers: dict[str, set[Subscriber]] = {}
+
+    def publish(self, job_id: str, data: dict):
+        if not data:
+            return
+        with self._lock:
+            seq = self._seq.get(job_id, 0) + 1
+            self._seq[job_id] = seq
+            event = {"id": seq, "type": "update", "data": data}
+            self._backlog.setdefault(job_id, deque(maxlen=BACKLOG_SIZE)).append(event)
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.queue.put_nowait, event)
+            except RuntimeError:
+                # Subscriber's loop is closed
+                self.unsubscribe(sub)
+
+    def subscribe(self, job_id: str, last_event_id: int | None = None) -> tuple[Subscriber, list[dict] | None, int]:
+        """Register a subscriber; returns (subscriber, events after last_event_id, current sequence).
+
+        The replay list is None when it cannot be served from the backlog — the
+        caller then starts from a snapshot instead.
+        """
+        sub = Subscriber(job_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(sub)
+            seq = self._seq.get(job_id, 0)
+            replay = None
+            if last_event_id is not None and last_event_id <= seq:
+                backlog = [e for e in self._backlog.get(job_id, ()) if e["id"] > last_event_id]
+                # Only usable if nothing between last_event_id and the backlog was evicted
+                if (backlog[0]["id"] if backlog else seq + 1) == last_event_id + 1:
+                    replay = backlog
+        return sub, replay, seq
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            subs = self._subscribers.get(sub.job_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.job_id]
+
+    def drop(self, job_id: str):
+        """Forget a deleted job's backlog."""
+        with self._lock:
+            self._seq.pop(job_id, None)
+            self._backlog.pop(job_id, None)
+
+
+events = JobEvents()
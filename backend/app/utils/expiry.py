@@ -0,0 +1,133 @@
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils import metrics
+
+# Job lifetime and resource bounds, enforced by app.utils.cleanup
+MAX_AGE_MINUTES = int(os.getenv("JOB_MAX_AGE_MINUTES", "30"))
+JOB_RESULTS_MAX_MB = float(os.getenv("JOB_RESULTS_MAX_MB", "128"))  # completed results held in memory (memory store)
+JOB_STORE_MAX_MB = float(os.getenv("JOB_STORE_MAX_MB", "1024"))  # completed jobs' store rows and blobs
+
+
+class ExpiryHeap:
+    """Min-heap of job deadlines. Rescheduling pushes a new entry; the old one is skipped when it surfaces."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: list[tuple[float, str]] = []
+        self._deadlines: dict[str, float] = {}
+
+    def schedule(self, job_id: str, deadline: float):
+        with self._lock:
+            self._deadlines[job_id] = deadline
+            heapq.heappush(self._heap, (deadline, job_id))
+            metrics.set_gauge("expiry.scheduled", len(self._deadlines))
+
+    def discard(self, job_id: str):
+        with self._lock:
+            self._deadlines.pop(job_id, None)
+
+    def _drop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> float | None:
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[str]:
+        """Job ids whose deadline has passed; they are unscheduled."""
+        due = []
+        with self._lock:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, job_id = heapq.heappop(self._heap)
+                del self._deadlines[job_id]
+                due.append(job_id)
+                self._drop_stale()
+            metrics.set_gauge("expiry.scheduled", len(self._deadlines))
+        return due
+
+
+class CompletedLRU:
+    """Completed jobs in least-recently-used order, with the result memory each holds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, int] = OrderedDict()  # job_id -> memory bytes
+        self.memory_bytes = 0
+
+    def add(self, job_id: str, memory_bytes: int):
+        with self._lock:
+            self._remove(job_id)
+            self._jobs[job_id] = memory_bytes
+            self.memory_bytes += memory_bytes
+            self._update_gauges()
+
+    def resize(self, job_id: str, memory_bytes: int):
+        with self._lock:
+            if job_id in self._jobs:
+                self.memory_bytes += memory_bytes - self._jobs[job_id]
+                self._jobs[job_id] = memory_bytes
+                self._update_gauges()
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def touch(self, job_id: str):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs.move_to_end(job_id)
+
+    def discard(self, job_id: str):
+        with self._lock:
+            self._remove(job_id)
+            self._update_gauges()
+
+    def _remove(self, job_id: str):
+        self.memory_bytes -= self._jobs.pop(job_id, 0)
+
+    def over_quota(self, memory_max: int) -> list[str]:
+        """Job ids to evict, least recently used first, until the held memory fits."""
+        victims = []
+        with self._lock:
+            memory = self.memory_bytes
+            for job_id, job_memory in self._jobs.items():
+                if memory <= memory_max:
+                    break
+                victims.append(job_id)
+                memory -= job_memory
+        return victims
+
+    def _update_gauges(self):
+        metrics.set_gauge("jobs.completed_held", len(self._jobs))
+        metrics.set_gauge("jobs.result_memory_bytes", self.memory_bytes)
+
+
+deadlines = ExpiryHeap()
+completed = CompletedLRU()
+
+
+def note_created(job_id: str):
+    deadlines.schedule(job_id, time.time() + MAX_AGE_MINUTES * 60)
+
+
+def result_bytes(result) -> int:
+    """Rough in-memory size of a ProductResult (its text fields)."""
+    if result is None:
+        return 0
+    return sum(len(value) for value in vars(result).values() if isinstance(value, str))
+
+
+def note_completed(job_id: str, memory_bytes: int):
+    """A job finished — its result now counts against JOB_RESULTS_MAX_MB."""
+    completed.add(job_id, memory_bytes)
+
+
+def forget(job_id: str):
+    deadlines.discard(job_id)
+    completed.discard(job_id)
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from cryptography.fernet import Fernet
+
+from app.utils.background import JOB_STORE_PATH
+
+# Local job queue shared by the API process (producer) and worker processes (consumers)
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", JOB_STORE_PATH)
+PRIORITY_RANK = {"interactive": 0, "batch": 1}
+# Payload fields encrypted at rest. The key comes from JOB_QUEUE_KEY (a Fernet key) or is generated
+# once into an owner-only file next to the queue, so every process on the host shares it.
+SECRET_FIELDS = ("api_key", "firecrawl_api_key")
+JOB_QUEUE_KEY = os.getenv("JOB_QUEUE_KEY")
+
+
+def _load_fernet(path: str) -> Fernet:
+    if JOB_QUEUE_KEY:
+        return Fernet(JOB_QUEUE_KEY.encode())
+    key_path = path + ".key"
+    if not os.path.exists(key_path):
+        # Written to a temp file and linked into place, so the key file never exists half-written;
+        # when processes race, the first link wins and everyone reads that key
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(key_path), prefix=".queue-key-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(Fernet.generate_key())
+            try:
+                os.link(tmp_path, key_path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp_path)
+    with open(key_path, "rb") as f:
+        return Fernet(f.read().strip())
+
+
+class JobQueue:
+    """SQLite (WAL) queue. Workers claim the next job by priority class, then by the
+    client with the fewest jobs currently claimed (fair share), then FIFO."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._fernet = _load_fernet(path)
+        # Autocommit; claim() opens its own IMMEDIATE transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_queue ("
+            " job_id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " client TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " claimed_by TEXT,"
+            " claimed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_queue_claim ON job_queue (claimed_by, priority, enqueued_at)")
+
+    def _seal(self, payload: dict) -> str:
+        sealed = {name: self._fernet.encrypt(value.encode()).decode() if name in SECRET_FIELDS and value else value
+                  for name, value in payload.items()}
+        return json.dumps(sealed)
+
+    def _unseal(self, data: str) -> dict:
+        payload = json.loads(data)
+        for name in SECRET_FIELDS:
+            if payload.get(name):
+                payload[name] = self._fernet.decrypt(payload[name].encode()).decode()
+        return payload
+
+    def enqueue(self, job_id: str, kind: str, payload: dict, priority: str = "interactive", client: str = "anonymous"):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_queue (job_id, kind, payload, priority, client, enqueued_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, self._seal(payload), PRIORITY_RANK.get(priority, 0), client, time.time()),
+            )
+
+    def claim(self, worker_id: str) -> tuple[str, str, dict] | None:
+        """Atomically take the next job: (job_id, kind, payload)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, kind, payload FROM job_queue q WHERE claimed_by IS NULL"
+                    " ORDER BY priority,"
+                    " (SELECT COUNT(*) FROM job_queue c WHERE c.client = q.client AND c.claimed_by IS NOT NULL),"
+                    " enqueued_at LIMIT 1"
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE job_queue SET claimed_by = ?, claimed_at = ? WHERE job_id = ?",
+                        (worker_id, time.time(), row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row[0], row[1], self._unseal(row[2])
+
+    def ack(self, job_id: str):
+        """Job finished (whatever the outcome) — drop it from the queue."""
+        with self._lock:
+            self._conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+
+    def remove_unclaimed(self, job_id: str) -> bool:
+        """Withdraw a job nobody has started yet; False if it is claimed (or unknown)."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM job_queue WHERE job_id = ? AND claimed_by IS NULL", (job_id,))
+            return cur.rowcount > 0
+
+    def claimants(self) -> list[str]:
+        """Ids of the workers currently holding claims."""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT claimed_by FROM job_queue WHERE claimed_by IS NOT NULL").fetchall()
+        return [row[0] for row in rows]
+
+    def release_claims(self, worker: str) -> list[str]:
+        """Drop the jobs claimed by a dead worker; returns their ids."""
+        with self._lock:
+            rows = self._conn.execute("SELECT job_id FROM job_queue WHERE claimed_by = ?", (worker,)).fetchall()
+            self._conn.execute("DELETE FROM job_queue WHERE claimed_by = ?", (worker,))
+        return [row[0] for row in rows]
+
+    def position(self, job_id: str) -> int | None:
+        """1-based position among unclaimed jobs (approximate: ignores fair-share reordering)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT priority, enqueued_at FROM job_queue WHERE job_id = ? AND claimed_by IS NULL", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            ahead = self._conn.execute(
+                "SELECT COUNT(*) FROM job_queue WHERE claimed_by IS NULL"
+                " AND (priority < ? OR (priority = ? AND enqueued_at < ?))",
+                (row[0], row[0], row[1]),
+            ).fetchone()[0]
+        return ahead + 1
+
+
+_queue: JobQueue | None = None
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(JOB_QUEUE_PATH)
+    return _queue
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+StageFn = Callable[[dict[str, Any]], Awaitable[Any]]
+CheckpointFn = Callable[[str, Any], Awaitable[None]]
+
+
+class StageGraph:
+    """Run async stages as a dependency graph.
+
+    Every stage starts as soon as all of its dependencies have finished, so
+    independent stages overlap. A stage can cancel another (e.g. a speculative
+    stage whose result became irrelevant); a cancelled stage yields None to its
+    dependents. Per-stage timings are kept to report the critical path.
+
+    With a checkpoint callback, each finished stage's output is handed to it
+    (best effort: a failing save is logged and counted, never fails the stage);
+    run() can then be given restored outputs and skips those stages (and any
+    stage only they depended on).
+    """
+
+    def __init__(self, name: str, checkpoint: CheckpointFn | None = None):
+        self.name = name
+        self._checkpoint = checkpoint
+        self._stages: dict[str, tuple[StageFn, tuple[str, ...]]] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._cancelled: set[str] = set()
+        self._restored: dict[str, Any] = {}
+        self._needed: set[str] | None = None
+        self._origin = 0.0
+        self.timings: dict[str, tuple[float, float]] = {}
+
+    def add(self, name: str, fn: StageFn, after: tuple[str, ...] = ()):
+        for dep in after:
+            if dep not in self._stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+        self._stages[name] = (fn, after)
+
+    def cancel(self, name: str):
+        """Cancel a stage (if not finished yet); dependents receive None for it."""
+        self._cancelled.add(name)
+        task = self._tasks.get(name)
+        if task and not task.done():
+            task.cancel()
+
+    async def _result_of(self, name: str) -> Any:
+        task = self._tasks[name]
+        await asyncio.wait({task})
+        if task.cancelled():
+            return None
+        return task.result()
+
+    def plan(self, outputs: tuple[str, ...], available: set[str]) -> set[str]:
+        """Which of the available checkpoints are needed to produce outputs (the rest can stay on disk)."""
+        restore, seen = set(), set()
+
+        def visit(name: str):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in available:
+                restore.add(name)
+                return
+            for dep in self._stages[name][1]:
+                visit(dep)
+
+        for name in outputs:
+            visit(name)
+        return restore
+
+    def _mark_needed(self, outputs: tuple[str, ...]) -> set[str]:
+        needed = set()
+
+        def visit(name: str):
+            if name in needed or name in self._restored:
+                return
+            needed.add(name)
+            for dep in self._stages[name][1]:
+                visit(dep)
+
+        for name in outputs:
+            visit(name)
+        return needed
+
+    async def _run_stage(self, name: str) -> Any:
+        if name in self._restored:
+            return self._restored[name]
+        if self._needed is not None and name not in self._needed:
+            return None
+        fn, deps = self._stages[name]
+        inputs = {dep: await self._result_of(dep) for dep in deps}
+        if name in self._cancelled:
+            return None
+        start = time.monotonic()
+        try:
+            result = await fn(inputs)
+        finally:
+            end = time.monotonic()
+            self.timings[name] = (start - self._origin, end - self._origin)
+            metrics.observe("pipeline.stage_seconds", end - start, pipeline=self.name, stage=name)
+        if self._checkpoint and name not in self._cancelled:
+            try:
+                await self._checkpoint(name, result)
+            except Exception:
+                logger.warning("Checkpoint of %s:%s failed", self.name, name, exc_info=True)
+                metrics.incr("pipeline.checkpoint_failures", pipeline=self.name, stage=name)
+        return result
+
+    def restored(self, name: str) -> bool:
+        return name in self._restored
+
+    async def run(self, restored: dict[str, Any] | None = None, outputs: tuple[str, ...] | None = None) -> dict[str, Any]:
+        """Run all stages; returns {stage: result}. The first stage error cancels the rest and is raised.
+
+        Stages in `restored` return that value without running; given `outputs`, only
+        the stages those still need are run (others yield None).
+        """
+        self._origin = time.monotonic()
+        self._restored = restored or {}
+        self._needed = self._mark_needed(outputs) if outputs else None
+        for name in self._stages:
+            self._tasks[name] = asyncio.create_task(self._run_stage(name), name=f"{self.name}:{name}")
+        try:
+            pending = set(self._tasks.values())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    if not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+            return {name: (None if task.cancelled() else task.result()) for name, task in self._tasks.items()}
+        finally:
+            for task in self._tasks.values():
+                if not task.done():
+                    task.cancel()
+            if self.timings:
+                logger.info("%s critical path: %s", self.name, self.describe_critical_path())
+
+    def critical_path(self) -> list[str]:
+        """Walk back from the last stage to finish through the dependency that finished last."""
+        if not self.timings:
+            return []
+        current = max(self.timings, key=lambda n: self.timings[n][1])
+        path = [current]
+        while True:
+            deps = [d for d in self._stages[current][1] if d in self.timings]
+            if not deps:
+                break
+            current = max(deps, key=lambda n: self.timings[n][1])
+            path.append(current)
+        return list(reversed(path))
+
+    def describe_critical_path(self) -> str:
+        return " → ".join(
+            f"{name} ({self.timings[name][1] - self.timings[name][0]:.2f}s)" for name in self.critical_path()
+        )
@@ -0,0 +1,17 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON (CJK text unescaped); datetimes as ISO 8601."""
+    return orjson.dumps(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson — for endpoints that return plain dicts (typed endpoints
+    with a response model are serialized by Pydantic directly and don't need it)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
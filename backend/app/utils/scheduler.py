@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from app.utils import metrics
+
+MAX_ACTIVE_JOBS = int(os.getenv("MAX_ACTIVE_JOBS", "8"))
+# Slots batch jobs may never take, so an interactive job never waits behind a full batch
+INTERACTIVE_RESERVED_SLOTS = int(os.getenv("INTERACTIVE_RESERVED_SLOTS", "1"))
+
+PRIORITIES = ("interactive", "batch")  # strict order: interactive is always dispatched first
+# Fallback job durations (seconds) until enough jobs of a kind have finished
+DEFAULT_JOB_SECONDS = {"legacy": 20.0, "ai": 150.0}
+ETA_MIN_SAMPLES = 5
+
+
+@dataclass
+class _Ticket:
+    job_id: str
+    client: str
+    priority: str
+    kind: str
+    granted: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+    started: float = 0.0
+
+
+class JobScheduler:
+    """Slot scheduler with priority classes and per-client fair share.
+
+    Within a priority class, clients are served round-robin, so one client's bulk
+    import interleaves with everyone else's jobs instead of running ahead of them.
+    """
+
+    def __init__(self, slots: int, interactive_reserved: int = 0):
+        self.slots = max(1, slots)
+        self.batch_slots = max(1, self.slots - interactive_reserved)
+        # priority -> client -> waiting tickets (client order = round-robin order)
+        self._queues: dict[str, OrderedDict[str, deque[_Ticket]]] = {p: OrderedDict() for p in PRIORITIES}
+        self._waiting: dict[str, _Ticket] = {}
+        self._running: dict[str, _Ticket] = {}
+
+    def _running_batch(self) -> int:
+        return sum(1 for t in self._running.values() if t.priority == "batch")
+
+    def _pop_next(self, priority: str) -> _Ticket | None:
+        clients = self._queues[priority]
+        if not clients:
+            return None
+        client, tickets = next(iter(clients.items()))
+        ticket = tickets.popleft()
+        # Client goes to the back of the rotation (or leaves it if it has nothing queued)
+        del clients[client]
+        if tickets:
+            clients[client] = tickets
+        return ticket
+
+    def _dispatch(self):
+        while len(self._running) < self.slots:
+            ticket = self._pop_next("interactive")
+            if ticket is None and self._running_batch() < self.batch_slots:
+                ticket = self._pop_next("batch")
+            if ticket is None:
+                break
+            del self._waiting[ticket.job_id]
+            ticket.started = time.monotonic()
+            self._running[ticket.job_id] = ticket
+            ticket.granted.set_result(True)
+        metrics.set_gauge("scheduler.running", len(self._running))
+        for priority in PRIORITIES:
+            metrics.set_gauge("scheduler.waiting", sum(len(q) for q in self._queues[priority].values()), priority=priority)
+
+    def _remove_waiting(self, ticket: _Ticket):
+        self._waiting.pop(ticket.job_id, None)
+        clients = self._queues[ticket.priority]
+        tickets = clients.get(ticket.client)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del clients[ticket.client]
+
+    @asynccontextmanager
+    async def slot(self, job_id: str, client: str, priority: str = "interactive", kind: str = "ai"):
+        """Wait for a slot (in scheduler order) and hold it for the duration of the block."""
+        if priority not in PRIORITIES:
+            priority = "interactive"
+        ticket = _Ticket(job_id, client, priority, kind)
+        self._waiting[job_id] = ticket
+        self._queues[priority].setdefault(client, deque()).append(ticket)
+        enqueued = time.monotonic()
+        self._dispatch()
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                self._release(ticket, finished=False)
+            else:
+                self._remove_waiting(ticket)
+                self._dispatch()
+            raise
+        metrics.observe("scheduler.wait_seconds", ticket.started - enqueued, priority=priority)
+        try:
+            yield
+        finally:
+            self._release(ticket, finished=True)
+
+    def _release(self, ticket: _Ticket, finished: bool):
+        self._running.pop(ticket.job_id, None)
+        if finished:
+            metrics.observe("scheduler.job_seconds", time.monotonic() - ticket.started, kind=ticket.kind)
+        self._dispatch()
+
+    def _expected_seconds(self, kind: str) -> float:
+        if metrics.sample_count("scheduler.job_seconds", kind=kind) >= ETA_MIN_SAMPLES:
+            return metrics.percentile("scheduler.job_seconds", 0.5, kind=kind)
+        return DEFAULT_JOB_SECONDS.get(kind, DEFAULT_JOB_SECONDS["ai"])
+
+    def _dispatch_order(self) -> list[_Ticket]:
+        """Waiting tickets in the order _dispatch would start them."""
+        order = []
+        for priority in PRIORITIES:
+            queues = [deque(q) for q in self._queues[priority].values()]
+            while queues:
+                for q in queues:
+                    order.append(q.popleft())
+                queues = [q for q in queues if q]
+        return order
+
+    def position(self, job_id: str) -> tuple[int | None, int | None]:
+        """(queue_position, eta_seconds) — position is 1-based among waiting jobs, None once running.
+
+        The ETA is the expected time until the job finishes, simulated from the
+        median duration of recently finished jobs of each kind.
+        """
+        now = time.monotonic()
+        running = self._running.get(job_id)
+        if running is not None:
+            return None, int(max(0.0, self._expected_seconds(running.kind) - (now - running.started)))
+        if job_id not in self._waiting:
+            return None, None
+
+        # Min-heap of times at which each slot becomes free
+        free_at = [max(0.0, self._expected_seconds(t.kind) - (now - t.started)) for t in self._running.values()]
+        free_at += [0.0] * (self.slots - len(free_at))
+        heapq.heapify(free_at)
+        batch_phase = False
+        for index, ticket in enumerate(self._dispatch_order(), start=1):
+            if ticket.priority == "batch" and not batch_phase:
+                # Batch jobs only ever get batch_slots of the slots
+                batch_phase = True
+                free_at = heapq.nsmallest(self.batch_slots, free_at)
+            start = heapq.heappop(free_at)
+            end = start + self._expected_seconds(ticket.kind)
+            if ticket.job_id == job_id:
+                return index, int(end)
+            heapq.heappush(free_at, end)
+        return None, None
+
+
+scheduler = JobScheduler(MAX_ACTIVE_JOBS, INTERACTIVE_RESERVED_SLOTS)
@@ -0,0 +1,220 @@
+"""Worker processes for WORKER_MODE=process.
+
+The API process only enqueues jobs (app.utils.job_queue); workers claim them, run the
+pipeline and report progress through the shared SQLite job store. A worker stops
+claiming and exits once it outgrows WORKER_MAX_RSS_MB (its whole process tree, Chromium
+and image pool included) or has run WORKER_MAX_JOBS jobs, and the pool starts a fresh one. Run standalone with `python -m app.worker`,
+or let the API start the pool (WORKER_AUTOSTART). Only one pool supervises a host at a
+time (a file lock next to the queue): with several uvicorn workers, one runs the pool and
+the others stand by to take over if it goes away.
+"""
+import asyncio
+import fcntl
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+
+from app.utils import metrics
+from app.utils.admission import process_rss_mb
+from app.utils.background import set_job_task, update_job, watch_cancellations
+from app.utils.job_queue import JOB_QUEUE_PATH, get_queue
+
+logger = logging.getLogger(__name__)
+
+WORKER_COUNT = max(1, int(os.getenv("WORKER_COUNT", "2")))
+WORKER_JOB_SLOTS = max(1, int(os.getenv("WORKER_JOB_SLOTS", "4")))  # concurrent jobs per worker
+WORKER_MAX_RSS_MB = int(os.getenv("WORKER_MAX_RSS_MB", "1024"))  # includes a live Chromium
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "200"))
+WORKER_AUTOSTART = os.getenv("WORKER_AUTOSTART", "1") == "1"
+CLAIM_POLL_SECONDS = 0.5
+SUPERVISE_SECONDS = 1.0
+STANDBY_SECONDS = 5.0  # how often a standby process retries the supervisor lock
+STOP_TIMEOUT_SECONDS = 30
+
+
+def worker_id(pid: int) -> str:
+    return f"{socket.gethostname()}:{pid}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+async def _run_claimed(kind: str, payload: dict):
+    # Imported here so the pipeline modules (Playwright, lxml, ...) load only in workers
+    from app.routers import scraper as jobs
+    if kind == "scrape":
+        await jobs.run_scrape_job(**payload)
+    elif kind == "finalize":
+        await jobs._finalize_job(**payload)
+    elif kind == "refine":
+        await jobs._refine_extraction(**payload)
+    else:
+        logger.error("Unknown queued job kind %r", kind)
+
+
+async def _worker_loop():
+    from app.services.images import shutdown_pool as shutdown_image_pool
+    from app.services.scraper import close_shared_clients
+
+    me = worker_id(os.getpid())
+    queue = get_queue()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    cancel_watch = asyncio.create_task(watch_cancellations())
+    running: set[asyncio.Task] = set()
+    started = 0
+
+    while not stop.is_set():
+        if process_rss_mb() > WORKER_MAX_RSS_MB:
+            logger.info("Worker %s at %.0fMB RSS — recycling", me, process_rss_mb())
+            break
+        if started >= WORKER_MAX_JOBS:
+            logger.info("Worker %s ran %d jobs — recycling", me, started)
+            break
+        if len(running) >= WORKER_JOB_SLOTS:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        claimed = await asyncio.to_thread(queue.claim, me)
+        if claimed is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=CLAIM_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        job_id, kind, payload = claimed
+        task = asyncio.create_task(_run_claimed(kind, payload), name=f"{kind}:{job_id}")
+        set_job_task(job_id, task)
+        running.add(task)
+        task.add_done_callback(lambda t, jid=job_id: (running.discard(t), queue.ack(jid)))
+        started += 1
+
+    # Drain: finish what was claimed, take nothing new
+    if running:
+        await asyncio.wait(running)
+    cancel_watch.cancel()
+    await close_shared_clients()
+    shutdown_image_pool()
+
+
+def run_worker():
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_worker_loop())
+
+
+class WorkerPool:
+    """Keeps WORKER_COUNT worker processes alive, replacing recycled or crashed ones."""
+
+    def __init__(self, count: int):
+        self.count = count
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs: list[multiprocessing.Process | None] = [None] * count
+        self._lock_file = None
+
+    def _try_lock(self) -> bool:
+        os.makedirs(os.path.dirname(JOB_QUEUE_PATH), exist_ok=True)
+        f = open(JOB_QUEUE_PATH + ".supervisor.lock", "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._lock_file = f  # held (and the lock with it) until stop() or process exit
+        return True
+
+    def _spawn(self, index: int):
+        proc = self._ctx.Process(target=run_worker, name=f"scraper-worker-{index}", daemon=False)
+        proc.start()
+        self._procs[index] = proc
+
+    @staticmethod
+    async def _fail_lost(worker: str) -> int:
+        # Jobs claimed by a worker that died (e.g. OOM-killed) can't finish — fail them
+        lost = await asyncio.to_thread(get_queue().release_claims, worker)
+        for job_id in lost:
+            await update_job(job_id, status="failed", error="工作進程異常終止（可能記憶體不足），請重新提交。", progress=None)
+        return len(lost)
+
+    async def _fail_orphaned(self) -> int:
+        """Fail claims left by this host's workers that are no longer running (from a previous
+        run or a supervisor that went away); live workers keep theirs."""
+        host = socket.gethostname()
+        lost = 0
+        for worker in await asyncio.to_thread(get_queue().claimants):
+            worker_host, _, pid = worker.rpartition(":")
+            if worker_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                lost += await self._fail_lost(worker)
+        return lost
+
+    async def _reap(self, index: int, proc: multiprocessing.Process):
+        lost = await self._fail_lost(worker_id(proc.pid))
+        reason = "recycled" if proc.exitcode == 0 else "crashed"
+        metrics.incr("workers.restarts", reason=reason)
+        logger.log(logging.INFO if reason == "recycled" else logging.ERROR,
+                   "Worker %d (pid %s) exited with %s, %d job(s) lost", index, proc.pid, proc.exitcode, lost)
+
+    async def supervise(self):
+        if not self._try_lock():
+            logger.info("Another process supervises the workers; standing by")
+            while not self._try_lock():
+                await asyncio.sleep(STANDBY_SECONDS)
+        lost = await self._fail_orphaned()
+        if lost:
+            logger.warning("Failed %d job(s) claimed by workers that are gone", lost)
+        for index in range(self.count):
+            self._spawn(index)
+        while True:
+            await asyncio.sleep(SUPERVISE_SECONDS)
+            for index, proc in enumerate(self._procs):
+                if proc is not None and not proc.is_alive():
+                    proc.join()
+                    await self._reap(index, proc)
+                    self._spawn(index)
+            metrics.set_gauge("workers.alive", sum(1 for p in self._procs if p and p.is_alive()))
+
+    def stop(self):
+        for proc in self._procs:
+            if proc is not None and proc.is_alive():
+                proc.terminate()  # SIGTERM: the worker drains its claimed jobs
+        for proc in self._procs:
+            if proc is not None:
+                proc.join(STOP_TIMEOUT_SECONDS)
+                if proc.is_alive():
+                    proc.kill()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    pool = WorkerPool(WORKER_COUNT)
+
+    async def supervise():
+        loop = asyncio.get_running_loop()
+        task = asyncio.create_task(pool.supervise())
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(supervise())
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
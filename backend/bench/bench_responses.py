@@ -0,0 +1,126 @@
+"""Serialization time and bytes on the wire for a typical job status response.
+
+Builds a completed job with a Chinese product description (plain text, cleaned HTML and
+Shopline HTML) plus a gallery of images, then measures:
+
+- how long each JSON encoding of the status takes: FastAPI's default path for a
+  response model, stdlib json with ASCII escaping, and FastJSONResponse;
+- the body size of FastJSONResponse after CompressionMiddleware for identity, gzip
+  and brotli, and how long each compression takes.
+
+    cd backend && python -m bench.bench_responses [--chars 9000] [--runs 200]
+
+The payload is generated from a fixed seed, so figures are comparable between runs.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.models.job_record import JobRecord
+from app.models.schemas import ProductImage, ProductResult, ScrapeStatus
+from app.utils.compression import CompressionMiddleware
+from app.utils.responses import FastJSONResponse
+
+# Common characters of product copy, so the text compresses like real descriptions do
+CJK = "產品支援無線網絡高速連接設計輕巧耐用電池續航時間長適合家庭辦公室使用功能規格尺寸重量顏色材質保養說明"
+
+
+def _paragraphs(rng: random.Random, chars: int) -> list[str]:
+    paragraphs, total = [], 0
+    while total < chars:
+        paragraph = "".join(rng.choice(CJK) for _ in range(rng.randint(60, 180))) + "。"
+        paragraphs.append(paragraph)
+        total += len(paragraph)
+    return paragraphs
+
+
+def build_status(chars: int) -> JobRecord:
+    rng = random.Random(0)
+    paragraphs = _paragraphs(rng, chars)
+    html = "".join(f"<h2>規格 {i}</h2><p>{p}</p>" if i % 4 == 0 else f"<p>{p}</p>" for i, p in enumerate(paragraphs))
+    shopline = "".join(f'<div class="product-section"><p style="line-height:1.8">{p}</p></div>' for p in paragraphs)
+    images = [
+        ProductImage(
+            filename=f"{'main' if i < 2 else 'gallery'}_{i + 1:02d}.jpg", kind="main" if i < 2 else "gallery",
+            width=1200, height=1200, source_url=f"https://shop.example.com/images/x100-{i}.jpg", asset=f"{i:064x}",
+        )
+        for i in range(8)
+    ]
+    result = ProductResult(
+        product_name="ACME X100 無線路由器", product_model="X100", summary=paragraphs[0],
+        description="\n\n".join(paragraphs), description_html=html, description_shopline=shopline,
+        source_url="https://shop.example.com/products/x100", images=images,
+    )
+    return JobRecord("bench", "completed", progress="完成", result=result, version=7)
+
+
+def _median_us(fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+async def _through_middleware(body: dict, accept_encoding: str, runs: int) -> tuple[int, float]:
+    """Bytes sent for the response with this Accept-Encoding, and the median seconds it took."""
+    sizes, timings = set(), []
+    for _ in range(runs):
+        size, seconds = await _send_once(body, accept_encoding)
+        sizes.add(size)
+        timings.append(seconds)
+    return sizes.pop(), statistics.median(timings)
+
+
+async def _send_once(body: dict, accept_encoding: str) -> tuple[int, float]:
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    app = CompressionMiddleware(FastJSONResponse(body))
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    seconds = time.perf_counter() - start
+    return sum(len(m.get("body", b"")) for m in sent if m["type"] == "http.response.body"), seconds
+
+
+def main(chars: int, runs: int):
+    job = build_status(chars)
+    body = job.to_dict()
+
+    print(f"payload: {len(job.result.description)} chars of description, {len(job.result.images)} images, {runs} runs")
+    print("\nserialization (median per response)")
+    encoders = {
+        "FastAPI response model": lambda: JSONResponse(jsonable_encoder(ScrapeStatus.model_validate(body))).body,
+        "stdlib json, ASCII-escaped": lambda: json.dumps(body).encode(),
+        "FastJSONResponse (orjson)": lambda: FastJSONResponse(body).body,
+    }
+    for name, fn in encoders.items():
+        print(f"  {name:<28} {_median_us(fn, runs):9.1f} us  {len(fn()) / 1024:7.1f} KB")
+
+    print("\nbytes on the wire (FastJSONResponse through CompressionMiddleware)")
+    identity = None
+    for encoding in ("identity", "gzip", "br"):
+        size, seconds = asyncio.run(_through_middleware(body, encoding, runs))
+        identity = identity or size
+        print(f"  {encoding:<10} {size / 1024:7.1f} KB  {size / identity:6.1%}  {seconds * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chars", type=int, default=9000, help="length of the generated description")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    main(args.chars, args.runs)
@@ -0,0 +1,80 @@
+"""Time from cancelling a Playwright render mid-goto until its resources are released.
+
+Serves a page that never answers, starts a render of it, cancels the render once the
+browser's request has arrived, and measures how long the cancelled task takes to finish
+(context closed, browser released). A second render of a normal page runs alongside and
+must still succeed — cancelling one job must not take down another's browser.
+
+    cd backend && python -m bench.cancel_release [--runs 5] [--max-seconds 4]
+
+Exits non-zero if any release is slower than --max-seconds or the neighbour render fails.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.services import scraper
+
+PAGE = b"<html><body><h1>Neighbour</h1>" + b"<p>text</p>" * 200 + b"</body></html>"
+
+
+async def _serve(requested: asyncio.Event):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        request_line = await reader.readline()
+        if b"/hang" in request_line:
+            requested.set()
+            await asyncio.sleep(3600)  # never answer: the render stays inside goto()
+            return
+        while (await reader.readline()).strip():
+            pass
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: %d\r\n\r\n" % len(PAGE) + PAGE)
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def _run_once(base: str, requested: asyncio.Event) -> float:
+    requested.clear()
+    neighbour = asyncio.create_task(scraper._render_with_playwright(f"{base}/ok"))
+    render = asyncio.create_task(scraper._render_with_playwright(f"{base}/hang"))
+    await asyncio.wait_for(requested.wait(), 30)
+
+    started = time.monotonic()
+    render.cancel()
+    try:
+        await render
+    except asyncio.CancelledError:
+        pass
+    seconds = time.monotonic() - started
+
+    html = await neighbour
+    if "Neighbour" not in html:
+        raise SystemExit("neighbour render returned unexpected content")
+    if scraper._browser._users != 0:
+        raise SystemExit(f"browser still has {scraper._browser._users} user(s) after both renders ended")
+    return seconds
+
+
+async def main(runs: int, max_seconds: float):
+    requested = asyncio.Event()
+    server = await _serve(requested)
+    base = "http://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+    try:
+        timings = [await _run_once(base, requested) for _ in range(runs)]
+    finally:
+        server.close()
+        await scraper.close_shared_clients()
+
+    print(f"release after cancel: median {statistics.median(timings):.2f}s, max {max(timings):.2f}s over {runs} runs")
+    if max(timings) > max_seconds:
+        raise SystemExit(f"slowest release {max(timings):.2f}s exceeds {max_seconds}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=scraper.CONTEXT_CLOSE_SECONDS + 1)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.max_seconds))
@@ -7,9 +7,11 @@ import { ReviewPanel } from "@/components/review-panel";
 import {
   submitScrapeJob,
   getJobStatus,
+  subscribeJobStatus,
   getDownloadUrl,
   submitReview,
   cancelJob,
+  resumeJob,
   type ScrapeStatus,
 } from "@/lib/api";
 
@@ -22,6 +24,7 @@ export default function Home() {
   const [elapsed, setElapsed] = useState(0);
   const [finalElapsed, setFinalElapsed] = useState<number | null>(null);
   const startTimeRef = useRef<number | null>(null);
+  const keysRef = useRef<{ apiKey?: string; firecrawlApiKey?: string }>({});
 
   // Elapsed timer — ticks every second while loading
   useEffect(() => {
@@ -49,6 +52,7 @@ export default function Home() {
     setStatus(null);
     setJobId(null);
     setFinalElapsed(null);
+    keysRef.current = { apiKey, firecrawlApiKey };
 
     try {
       const response = await submitScrapeJob(url, productModel, apiKey, aiModel, reasoningEffort, firecrawlApiKey);
@@ -72,47 +76,78 @@ export default function Home() {
     }
   };
 
-  // Polling for job status — re-triggers on pollTrigger change
+  // Pushed job updates (SSE), falling back to polling — re-triggers on pollTrigger change
   useEffect(() => {
     if (!jobId || !isLoading) return;
 
     let failCount = 0;
     const maxFails = 5;
+    let interval: ReturnType<typeof setInterval> | null = null;
 
-    const interval = setInterval(async () => {
-      try {
-        const jobStatus = await getJobStatus(jobId);
-        failCount = 0; // reset on success
-        setStatus(jobStatus);
-
-        if (
-          jobStatus.status === "completed" ||
-          jobStatus.status === "failed" ||
-          jobStatus.status === "awaiting_review"
-        ) {
-          clearInterval(interval);
-          if (startTimeRef.current) {
-            setFinalElapsed(Math.floor((Date.now() - startTimeRef.current) / 1000));
-          }
-          setIsLoading(false);
+    const stop = () => {
+      unsubscribe();
+      if (interval) clearInterval(interval);
+    };
 
-          if (jobStatus.status === "failed") {
-            setError(jobStatus.error || "Scraping failed");
-          }
+    const handleStatus = (jobStatus: ScrapeStatus) => {
+      setStatus(jobStatus);
+
+      if (
+        jobStatus.status === "completed" ||
+        jobStatus.status === "failed" ||
+        jobStatus.status === "awaiting_review"
+      ) {
+        stop();
+        if (startTimeRef.current) {
+          setFinalElapsed(Math.floor((Date.now() - startTimeRef.current) / 1000));
         }
-      } catch {
-        failCount++;
-        if (failCount >= maxFails) {
-          clearInterval(interval);
-          setIsLoading(false);
-          setError("無法連接伺服器，請稍後重試");
+        setIsLoading(false);
+
+        if (jobStatus.status === "failed") {
+          setError(jobStatus.error || "Scraping failed");
         }
       }
-    }, 2000);
+    };
+
+    const startPolling = () => {
+      interval = setInterval(async () => {
+        try {
+          const jobStatus = await getJobStatus(jobId);
+          failCount = 0; // reset on success
+          handleStatus(jobStatus);
+        } catch {
+          failCount++;
+          if (failCount >= maxFails) {
+            stop();
+            setIsLoading(false);
+            setError("無法連接伺服器，請稍後重試");
+          }
+        }
+      }, 2000);
+    };
+
+    const unsubscribe = subscribeJobStatus(jobId, handleStatus, () => {
+      unsubscribe();
+      if (!interval) startPolling();
+    });
 
-    return () => clearInterval(interval);
+    return stop;
   }, [jobId, pollTrigger, isLoading]);
 
+  const handleResume = async () => {
+    if (!jobId) return;
+    setIsLoading(true);
+    setError(null);
+    try {
+      await resumeJob(jobId, keysRef.current.apiKey, keysRef.current.firecrawlApiKey);
+      setStatus((prev) => prev ? { ...prev, status: "processing", error: null, progress: "正在從上次完成的步驟繼續..." } : prev);
+      setPollTrigger((n) => n + 1);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : "繼續工作失敗");
+      setIsLoading(false);
+    }
+  };
+
   const handleConfirm = async (descriptionHtml?: string) => {
     if (!jobId) return;
     setIsLoading(true);
@@ -189,7 +224,9 @@ export default function Home() {
                   />
                 </svg>
                 <span className="text-sm font-medium">
-                  {status.progress || "處理中..."}
+                  {status.queue_position
+                    ? `排隊中：第 ${status.queue_position} 位${status.eta_seconds != null ? `，預計 ${formatTime(status.eta_seconds)} 後完成` : ""}`
+                    : status.progress || "處理中..."}
                 </span>
                 <span className="text-sm tabular-nums text-muted-foreground">
                   {formatTime(elapsed)}
@@ -208,7 +245,17 @@ export default function Home() {
         {/* Error */}
         {error && (
           <div className="mb-6 rounded-lg border border-destructive/50 bg-destructive/10 p-4">
-            <p className="text-sm text-destructive">{error}</p>
+            <div className="flex items-center justify-between gap-3">
+              <p className="text-sm text-destructive">{error}</p>
+              {status?.status === "failed" && jobId && (
+                <button
+                  onClick={handleResume}
+                  className="shrink-0 text-sm text-muted-foreground hover:text-foreground transition-colors"
+                >
+                  從中斷處繼續
+                </button>
+              )}
+            </div>
           </div>
         )}
 
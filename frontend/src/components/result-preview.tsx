@@ -14,7 +14,7 @@ import {
   CollapsibleTrigger,
 } from "@/components/ui/collapsible";
 import type { ProductResult } from "@/lib/api";
-import { translateResult, type TranslateResponse } from "@/lib/api";
+import { getImageUrl, translateResult, type TranslateResponse } from "@/lib/api";
 
 function htmlToText(html: string): string {
   const doc = new DOMParser().parseFromString(html, "text/html");
@@ -290,6 +290,20 @@ export function ResultPreview({ result, downloadUrl, jobId }: ResultPreviewProps
               {result.source_url}
             </a>
           </div>
+          {result.images?.length > 0 && (
+            <div className="grid grid-cols-4 gap-2 pt-2">
+              {result.images.map((image) => (
+                <a key={image.filename} href={getImageUrl(jobId, image.filename)} target="_blank" rel="noopener noreferrer"
+                  className="relative block aspect-square overflow-hidden rounded-md border bg-muted">
+                  <img src={getImageUrl(jobId, image.filename)} alt={image.filename} loading="lazy"
+                    className="h-full w-full object-contain" />
+                  <span className="absolute left-1 top-1 rounded bg-background/80 px-1 text-xs text-muted-foreground">
+                    {image.kind === "main" ? "主圖" : "圖庫"}
+                  </span>
+                </a>
+              ))}
+            </div>
+          )}
           <div className="pt-2">
             <a
               href={downloadUrl}
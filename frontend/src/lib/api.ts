@@ -8,6 +8,15 @@ async function extractErrorDetail(res: Response, fallback: string): Promise<stri
   return `${fallback}: ${res.statusText}`;
 }
 
+export interface ProductImage {
+  filename: string;
+  kind: "main" | "gallery";
+  width: number;
+  height: number;
+  source_url: string;
+  asset: string;
+}
+
 export interface ProductResult {
   product_name: string;
   product_model: string;
@@ -16,6 +25,7 @@ export interface ProductResult {
   description_html: string;
   description_shopline: string;
   source_url: string;
+  images: ProductImage[];
 }
 
 export interface ScrapeStatus {
@@ -24,6 +34,10 @@ export interface ScrapeStatus {
   progress: string | null;
   result: ProductResult | null;
   error: string | null;
+  queue_position: number | null;
+  eta_seconds: number | null;
+  cached_at: string | null;
+  version: number;
 }
 
 export async function submitScrapeJob(
@@ -53,6 +67,42 @@ export async function getJobStatus(jobId: string): Promise<ScrapeStatus> {
   return res.json();
 }
 
+/**
+ * Subscribe to pushed job updates (SSE). Deltas are applied to the last known
+ * status; onError fires if the stream is closed for good (caller may fall back to polling).
+ */
+export function subscribeJobStatus(
+  jobId: string,
+  onStatus: (status: ScrapeStatus) => void,
+  onError: () => void
+): () => void {
+  const source = new EventSource(`${API_BASE}/api/scrape/${jobId}/events`);
+  let current: ScrapeStatus | null = null;
+
+  source.addEventListener("snapshot", (e) => {
+    current = JSON.parse((e as MessageEvent).data) as ScrapeStatus;
+    onStatus(current);
+  });
+  source.addEventListener("update", (e) => {
+    if (!current) return;
+    const { result, ...rest } = JSON.parse((e as MessageEvent).data);
+    const next: ScrapeStatus = { ...current, ...rest };
+    if (result !== undefined) {
+      next.result = result === null ? null : ({ ...(current.result ?? {}), ...result } as ProductResult);
+    }
+    current = next;
+    onStatus(next);
+  });
+  source.addEventListener("gone", () => {
+    source.close();
+    onError();
+  });
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED) onError();
+  };
+  return () => source.close();
+}
+
 export async function submitReview(
   jobId: string,
   action: "confirm" | "refine",
@@ -73,6 +123,10 @@ export function getDownloadUrl(jobId: string): string {
   return `${API_BASE}/api/scrape/${jobId}/download`;
 }
 
+export function getImageUrl(jobId: string, filename: string): string {
+  return `${API_BASE}/api/scrape/${jobId}/images/${filename}`;
+}
+
 export async function cancelJob(jobId: string): Promise<void> {
   const res = await fetch(`${API_BASE}/api/scrape/${jobId}/cancel`, {
     method: "POST",
@@ -82,6 +136,17 @@ export async function cancelJob(jobId: string): Promise<void> {
   }
 }
 
+export async function resumeJob(jobId: string, apiKey?: string, firecrawlApiKey?: string): Promise<void> {
+  const res = await fetch(`${API_BASE}/api/scrape/${jobId}/resume`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ api_key: apiKey || null, firecrawl_api_key: firecrawlApiKey || null }),
+  });
+  if (!res.ok) {
+    throw new Error(await extractErrorDetail(res, "繼續工作失敗"));
+  }
+}
+
 export interface TranslateResponse {
   description_html: string;
   description_shopline: string;